@@ -1,5 +1,6 @@
 import os
 import sys
+import multiprocessing
 import logging
 from model import Model
 from view import View
@@ -7,6 +8,7 @@ from tkinter import messagebox
 
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 import helper.constants as CNST
+from helper.preview import RulePreview
 
 if getattr(sys, 'frozen', False):
     import pyi_splash  # type: ignore
@@ -70,6 +72,18 @@ class Controller:
             messagebox.showinfo("Error", f"An error occurred: {e}")
             
 
+    def start_rule_preview(self, project_resources_dir):
+        """Start the warm pipeline of the rule preview tab.
+
+        Args:
+            project_resources_dir (str): Directory containing project resources.
+
+        Returns:
+            RulePreview: The preview, see `helper.preview`.
+        """
+        settings = self.model.load_settings(project_resources_dir)
+        return RulePreview(self.model, project_resources_dir, settings)
+
 # Main function to run the application
 def main():
     """Initialize and start the application."""
@@ -85,4 +99,7 @@ def main():
 
 
 if __name__ == "__main__":
+    # In the frozen app the worker processes start the executable again, which must then run the worker
+    # instead of opening another window
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -4,16 +4,22 @@ import os
 import sys
 import argparse
 import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import pandas as pd
 
 import tkinter as tk
-from tkinter import messagebox
+from tkinter import ttk, messagebox
 import tkinter.font as tkfont
 
 # importing custom modules
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 import helper.constants as CNST
+import helper.search_index as search_index
+import helper.offsets as offsets
+import helper.packed as packed
 
 # Setting up logging
 logging.basicConfig(level=logging.DEBUG,
@@ -27,14 +33,17 @@ class AnnotationViewer:
         Args:
             master (tk.Tk): The root window of the Tkinter application.
             output_data (str): The path to the output directory containing annotated files.
-            notes_dir (str): The directory containing clinical notes.
+            notes_dir (str): The directory containing clinical notes, or their packed corpora.
             csv_file_chk (bool): Flag indicating whether to process CSV files.
         """
         self.master = master
         self.master.title(f"Annotation Viewer - {output_data}")
+        self.logger = logging.getLogger(__name__)
         
         self.notes_dir = notes_dir
         self.csv_file_chk = csv_file_chk
+        # The notes are read from the packed corpora of the notes folder when there are some
+        self.packed_notes = [packed.PackedCorpus(pack_path) for pack_path in packed.pack_files(notes_dir)]
         
         # Screen width and height for responsive sizing
         screen_width = self.master.winfo_screenwidth()
@@ -101,9 +110,27 @@ class AnnotationViewer:
         self.annotation_text.config(state="disabled")
         
         # Added vertical scrollbar for annotation text
-        scrollbar = tk.Scrollbar(self.right_frame, orient="vertical", command=self.annotation_text.yview)
-        scrollbar.grid(row=0, column=1, sticky="ns")
-        self.annotation_text.config(yscrollcommand=scrollbar.set)
+        self.text_scrollbar = tk.Scrollbar(self.right_frame, orient="vertical", command=self.annotation_text.yview)
+        self.text_scrollbar.grid(row=0, column=1, sticky="ns")
+        self.annotation_text.config(yscrollcommand=self.text_scrollbar.set)
+
+        # Bounded cache of prepared documents (note text and span positions), filled in the background
+        # with the neighbours of the selected document
+        self.prefetch_cache = OrderedDict()
+        self.prefetch_futures = {}
+        self.prefetch_lock = threading.Lock()
+        self.prefetch_executor = ThreadPoolExecutor(max_workers=CNST.PREFETCH_WORKERS)
+        self.master.bind("<Destroy>", self.stop_prefetching)
+
+        # Note texts of the input CSV files, read once on first use
+        self.csv_notes = None
+        self.csv_notes_lock = threading.Lock()
+
+        # Virtualized rendering state for very long notes, the widget then only holds a window of lines
+        self.virtual_mode = False
+        self.doc_lines = []
+        self.window_start = 0
+        self.window_shift_pending = False
         
         # Added horizontal scrollbar for annotation text
         scrollbar_x = tk.Scrollbar(self.right_frame, orient="horizontal")
@@ -120,6 +147,11 @@ class AnnotationViewer:
         # Load data from output directory
         self.load_data_in_folder(output_data)
 
+        # Added filter panel when the run has a search index over all its annotations
+        self.search_index_path = search_index.find_search_index(output_data)
+        if self.search_index_path:
+            self.create_filter_panel(label_font)
+
         # Configuration of main grid to resize dynamically
         self.master.columnconfigure(0, weight=1)
         self.master.columnconfigure(1, weight=3)
@@ -135,14 +167,106 @@ class AnnotationViewer:
         self.annotation_text.bind("<Motion>", self.show_additional_info)
         
         # Tp process annotation data and extract unique concepts
-        self.concept_dict = self.create_concept_dict(self.annotation_data)
+        if self.search_index_path:
+            self.concept_dict = search_index.fetch_concept_dict(self.search_index_path)
+        else:
+            self.concept_dict = self.create_concept_dict(self.annotation_data)
         self.concept_colors = self.assign_colors(self.concept_dict)
         
         # Crated a placeholder for storing annotation data for current selection
         self.annotation_row = pd.DataFrame()
         self.current_page = 0
 
-        self.logger = logging.getLogger(__name__) 
+    def create_filter_panel(self, label_font):
+        """
+        Adds a panel below the file list to filter documents across all annotations of the run.
+        
+        Args:
+            label_font (tkfont.Font): The font used for the panel title.
+        """
+        self.filter_frame = tk.Frame(self.left_frame)
+        self.filter_frame.grid(row=3, column=0, columnspan=2, sticky="we", pady=(5, 0))
+        self.filter_frame.columnconfigure(1, weight=1)
+
+        tk.Label(self.filter_frame, text="Filter Documents:", font=label_font).grid(row=0, column=0, columnspan=2, sticky="w")
+
+        tk.Label(self.filter_frame, text="Concept").grid(row=1, column=0, sticky="w")
+        self.filter_concept = ttk.Combobox(self.filter_frame, values=[""] + search_index.distinct_values(self.search_index_path, "concept"))
+        self.filter_concept.grid(row=1, column=1, sticky="we")
+
+        tk.Label(self.filter_frame, text="Section").grid(row=2, column=0, sticky="w")
+        self.filter_section = ttk.Combobox(self.filter_frame, values=[""] + search_index.distinct_values(self.search_index_path, "section_id"))
+        self.filter_section.grid(row=2, column=1, sticky="we")
+
+        tk.Label(self.filter_frame, text="Matched text").grid(row=3, column=0, sticky="w")
+        self.filter_text = tk.Entry(self.filter_frame)
+        self.filter_text.grid(row=3, column=1, sticky="we")
+        self.filter_text.bind("<Return>", lambda event: self.apply_filter())
+
+        # One checkbox per ConText flag, a checked flag must be set on the matching annotation
+        flags_frame = tk.Frame(self.filter_frame)
+        flags_frame.grid(row=4, column=0, columnspan=2, sticky="w")
+        self.filter_flags = {}
+        for i, flag in enumerate(CNST.CONTEXT_FLAGS):
+            self.filter_flags[flag] = tk.BooleanVar()
+            tk.Checkbutton(flags_frame, text=flag[len("is_"):].capitalize(), variable=self.filter_flags[flag]).grid(row=i // 3, column=i % 3, sticky="w")
+
+        tk.Button(self.filter_frame, text="Apply", command=self.apply_filter).grid(row=5, column=0, sticky="w", padx=5, pady=5)
+        tk.Button(self.filter_frame, text="Clear", command=self.clear_filter).grid(row=5, column=1, sticky="e", padx=5, pady=5)
+
+        self.filter_status_label = tk.Label(self.filter_frame, text="")
+        self.filter_status_label.grid(row=6, column=0, columnspan=2, sticky="w")
+
+    def apply_filter(self):
+        """
+        Replaces the file list with the documents matching the filter panel, across all part files.
+        """
+        flags = [flag for flag, var in self.filter_flags.items() if var.get()]
+        try:
+            doc_names = search_index.query_documents(self.search_index_path,
+                                                     concept=self.filter_concept.get().strip(),
+                                                     section_id=self.filter_section.get().strip(),
+                                                     flags=flags,
+                                                     text=self.filter_text.get().strip())
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not filter the documents: {e}")
+            self.logger.error(f"Error filtering documents : {e}")
+            return
+
+        self.file_list = doc_names
+        self.current_page = 0
+        self.update_file_list_display()
+        self.filter_status_label.config(text=f"{len(doc_names)} matching documents")
+
+    def clear_filter(self):
+        """
+        Resets the filter panel and restores the file list of the current part file.
+        """
+        self.filter_concept.set("")
+        self.filter_section.set("")
+        self.filter_text.delete(0, tk.END)
+        for var in self.filter_flags.values():
+            var.set(False)
+
+        self.file_list = self.annotation_data['doc_name'].unique().tolist()
+        self.current_page = 0
+        self.update_file_list_display()
+        self.filter_status_label.config(text="")
+
+    def get_annotation_rows(self, doc_name):
+        """
+        Returns the annotation rows of a document, from the loaded part file or else from the search index.
+        
+        Args:
+            doc_name (str): The document name.
+        
+        Returns:
+            pd.DataFrame: The annotation rows of the document.
+        """
+        rows = self.annotation_data[self.annotation_data["doc_name"] == doc_name]
+        if rows.empty and self.search_index_path:
+            rows = search_index.fetch_annotations(self.search_index_path, doc_name)
+        return rows.copy()
 
     def load_data_in_folder(self, output_data):
         """
@@ -322,6 +446,10 @@ class AnnotationViewer:
         # Extracted startline and start values
         start_sentenct, start_in_sent = map(int, start.split('.'))
         end_sentence,end_in_sent=map(int, end.split('.'))
+
+        # Widget lines are shifted by the first rendered line in virtualized mode
+        start_sentenct += self.window_start
+        end_sentence += self.window_start
         
       
         # Filter rows based on the conditions
@@ -435,6 +563,63 @@ class AnnotationViewer:
         return final_df
 
 
+    def load_note_text(self, doc_name):
+        """
+        Loads the text of a note from the packed corpora, the input CSV files or its .txt file.
+        
+        Args:
+            doc_name (str): The document name.
+        
+        Returns:
+            str: The note text, padded with trailing newlines for display.
+        """
+        if self.packed_notes:
+            file_content = next((note_text for note_text in (corpus.note_text(doc_name) for corpus in self.packed_notes)
+                                 if note_text is not None), "")
+        elif self.csv_file_chk:
+            with self.csv_notes_lock:
+                if self.csv_notes is None:
+                    file_data = self.load_csv_files(self.notes_dir)
+                    self.csv_notes = {}
+                    for csv_doc_name, note_text in zip(file_data["doc_name"], file_data["note_text"]):
+                        self.csv_notes.setdefault(csv_doc_name, note_text)
+            file_content = self.csv_notes.get(doc_name, "")
+        else:
+            # Load content of the .txt file
+            with open(os.path.join(self.notes_dir, doc_name), 'r', encoding='utf-8') as file:
+                file_content = file.read()
+
+        return file_content + "\n\n\n\n"
+
+    def compute_annotation_positions(self, rows, file_content):
+        """
+        Adds the Tk `line.column` positions of every annotation span to the annotation rows.
+        
+        Args:
+            rows (pd.DataFrame): The annotation rows of the document.
+            file_content (str): The note text.
+        
+        Returns:
+            pd.DataFrame: The rows with the start/end line and column of each span.
+        """
+        # Runs with emit_offsets set already carry the positions
+        if all(col in rows.columns for col in CNST.OUTPUT_OFFSET_HEADERS) and not rows[CNST.OUTPUT_OFFSET_HEADERS].isnull().values.any():
+            rows['start_sentenct'] = rows['start_line'].astype(int)
+            rows['start_in_sent'] = rows['start_col'].astype(int)
+            rows['end_sentence'] = rows['end_line'].astype(int)
+            rows['end_in_sent'] = rows['end_col'].astype(int)
+            return rows
+
+        starts = offsets.line_starts(file_content)
+        start_positions = [offsets.char_to_line_col(starts, char_index) for char_index in rows["concept_start"]]
+        end_positions = [offsets.char_to_line_col(starts, char_index) for char_index in rows["concept_end"]]
+
+        rows['start_sentenct'] = [line for line, _ in start_positions]
+        rows['start_in_sent'] = [col for _, col in start_positions]
+        rows['end_sentence'] = [line for line, _ in end_positions]
+        rows['end_in_sent'] = [col for _, col in end_positions]
+        return rows
+
     def load_annotation(self, event):
         """
         Loads annotation data for the selected file and displays it in the text widget.
@@ -446,66 +631,256 @@ class AnnotationViewer:
 
         if selected_file_index:
             selected_file_index = int(selected_file_index[0])
-            selected_file = self.file_list[selected_file_index]
-            self.annotation_row = self.annotation_data[self.annotation_data["doc_name"] == selected_file]
-            
-            # Save some inforamtion for later extraction
-            self.annotation_row['start_in_sent']=np.nan
-            self.annotation_row['start_sentenct']=np.nan
-            self.annotation_row['end_in_sent']=np.nan
-            self.annotation_row['end_sentence']=np.nan
-
-            if self.csv_file_chk:
-                file_data = self.load_csv_files(self.notes_dir)
-                content = file_data.loc[file_data["doc_name"] == selected_file, "note_text"].values
-                if content.size > 0:
-                    file_content = content[0]
-                else:
-                    file_content = ""
+            list_index = self.current_page * self.files_per_page + selected_file_index
+            selected_file = self.file_list[list_index]
+
+            file_content, self.annotation_row = self.get_prepared_document(selected_file)
+            self.render_document(file_content)
+
+            # Reviewers step through the list in order, so the neighbours are prepared ahead of time
+            for neighbour_index in (list_index + 1, list_index - 1):
+                if 0 <= neighbour_index < len(self.file_list):
+                    self.prefetch_document(self.file_list[neighbour_index])
+
+    def prepare_document(self, doc_name):
+        """
+        Loads a note and computes the positions of its annotations, without touching any widget.
+        
+        Args:
+            doc_name (str): The document name.
+        
+        Returns:
+            tuple: (note text, annotation rows with span positions).
+        """
+        file_content = self.load_note_text(doc_name)
+        rows = self.compute_annotation_positions(self.get_annotation_rows(doc_name), file_content)
+        return file_content, rows
+
+    def store_prepared_document(self, doc_name, prepared):
+        """
+        Adds a prepared document to the cache, evicting the least recently used ones beyond its size.
+        
+        Args:
+            doc_name (str): The document name.
+            prepared (tuple): The prepared document, see `prepare_document`.
+        """
+        with self.prefetch_lock:
+            self.prefetch_cache[doc_name] = prepared
+            self.prefetch_cache.move_to_end(doc_name)
+            while len(self.prefetch_cache) > CNST.PREFETCH_CACHE_SIZE:
+                self.prefetch_cache.popitem(last=False)
+
+    def get_prepared_document(self, doc_name):
+        """
+        Returns a prepared document from the cache, waiting for its prefetch or preparing it on the spot.
+        
+        Args:
+            doc_name (str): The document name.
+        
+        Returns:
+            tuple: (note text, annotation rows with span positions).
+        """
+        with self.prefetch_lock:
+            if doc_name in self.prefetch_cache:
+                self.prefetch_cache.move_to_end(doc_name)
+                return self.prefetch_cache[doc_name]
+            future = self.prefetch_futures.get(doc_name)
+
+        if future is not None:
+            try:
+                return future.result()
+            except Exception as e:
+                self.logger.error(f"Error prefetching {doc_name}, loading it again : {e}")
+
+        prepared = self.prepare_document(doc_name)
+        self.store_prepared_document(doc_name, prepared)
+        return prepared
+
+    def prefetch_document(self, doc_name):
+        """
+        Prepares a document on the background thread pool unless it is already cached or pending.
+        
+        Args:
+            doc_name (str): The document name.
+        """
+        with self.prefetch_lock:
+            if doc_name in self.prefetch_cache or doc_name in self.prefetch_futures:
+                return
+            try:
+                self.prefetch_futures[doc_name] = self.prefetch_executor.submit(self.run_prefetch, doc_name)
+            except RuntimeError:
+                # The executor is already shut down because the viewer is closing
+                pass
+
+    def run_prefetch(self, doc_name):
+        """
+        Background task preparing a document and storing it in the cache.
+        
+        Args:
+            doc_name (str): The document name.
+        
+        Returns:
+            tuple: The prepared document, see `prepare_document`.
+        """
+        try:
+            prepared = self.prepare_document(doc_name)
+            self.store_prepared_document(doc_name, prepared)
+            return prepared
+        finally:
+            with self.prefetch_lock:
+                self.prefetch_futures.pop(doc_name, None)
+
+    def stop_prefetching(self, event):
+        """
+        Stops the background prefetching and closes the packed corpora when the viewer window is closed.
+        
+        Args:
+            event (tk.Event): The destroy event of a widget of the viewer.
+        """
+        if event.widget is self.master:
+            # The note being prefetched may still be read from a corpus, it is waited for before unmapping them
+            self.prefetch_executor.shutdown(wait=True, cancel_futures=True)
+            for corpus in self.packed_notes:
+                corpus.close()
+            self.packed_notes = []
+
+    def render_document(self, file_content):
+        """
+        Displays a note and its highlighted annotations, switching to virtualized rendering for very long notes.
+        
+        Args:
+            file_content (str): The note text.
+        """
+        self.virtual_mode = len(file_content) > CNST.VIRTUAL_RENDER_MIN_CHARS
+        self.window_start = 0
+
+        if self.virtual_mode:
+            self.doc_lines = file_content.split("\n")
+            self.annotation_text.config(yscrollcommand=self.on_virtual_yscroll)
+            self.text_scrollbar.config(command=self.on_virtual_scrollbar)
+            self.render_window(0)
+            return
+
+        self.doc_lines = []
+        self.annotation_text.config(yscrollcommand=self.text_scrollbar.set)
+        self.text_scrollbar.config(command=self.annotation_text.yview)
+
+        # Display content of the file in the text widget
+        self.annotation_text.config(state="normal")
+        self.annotation_text.delete(1.0, tk.END)
+        self.annotation_text.insert(tk.END, file_content)
+        self.highlight_annotations()
+        self.annotation_text.config(state="disabled")
+
+    def highlight_annotations(self, first_line=None, last_line=None):
+        """
+        Highlights the annotations of the current document, optionally only those within a range of lines.
+        
+        Args:
+            first_line (int, optional): First document line (1-based) held by the text widget.
+            last_line (int, optional): Last document line (1-based) held by the text widget.
+        """
+        rows = self.annotation_row
+        for start_line, start_col, end_line, end_col, matched_text in zip(rows['start_sentenct'], rows['start_in_sent'],
+                                                                          rows['end_sentence'], rows['end_in_sent'],
+                                                                          rows['matched_text']):
+            if first_line is not None and (end_line < first_line or start_line > last_line):
+                continue
+
+            # Spans cut by the window edges are highlighted up to the edge
+            if first_line is not None and start_line < first_line:
+                start = "1.0"
             else:
-                # Load content of the .txt file
-                with open(os.path.join(self.notes_dir, selected_file), 'r', encoding='utf-8') as file:
-                    file_content = file.read()
-            
-            file_content=file_content+"\n\n\n\n"
-    
-            # Display content of the file in the text widget
-            self.annotation_text.config(state="normal")
-            self.annotation_text.delete(1.0, tk.END)
-            self.annotation_text.insert(tk.END, file_content)
-    
-            # Print the length of the file content (last possible character index)
-            max_end_index = len(file_content)
+                start = f"{start_line - self.window_start}.{start_col}"
+            if last_line is not None and end_line > last_line:
+                end = tk.END
+            else:
+                end = f"{end_line - self.window_start}.{end_col}"
 
-            # Highlight annotations in a file
-            for index, row in self.annotation_row.iterrows():    
-                start_index = row["concept_start"]  # Adjust for line numbering starting from 1
-                end_index = row["concept_end"]  # Adjust for line numbering starting from 1 and to include the character
-                
-                # Find the sentence number and character count before, for the given span
-                start_sent_number, char_num_before_start = self.find_sentence_number(file_content, start_index)
-                end_sent_number, char_num_before_end = self.find_sentence_number(file_content, end_index)
-                
-                start_index_in_sent = start_index - char_num_before_start
-                end_index_in_sent = end_index - char_num_before_end
-                
-                self.annotation_row.at[index,'start_in_sent']=start_index_in_sent
-                self.annotation_row.at[index,'start_sentenct']=start_sent_number
-                self.annotation_row.at[index,'end_in_sent']=end_index_in_sent
-                self.annotation_row.at[index,'end_sentence']=end_sent_number
-                #self.annotation_row.at[index, 'section_id']=section_id
-
-                # Highlight annotation in the text widget
-                self.annotation_text.tag_add(f"highlight_{row['matched_text']}", f"{start_sent_number}.{start_index_in_sent}", f"{end_sent_number}.{end_index_in_sent}")  # Format indices as line.column
-                self.annotation_text.tag_config(f"highlight_{row['matched_text']}", background=self.concept_colors[row['matched_text']])
-                
-                # Bind event for showing additional info on highlight hover
-                self.bind_highlight_event()
-                
-                # Print the length of the file content (last possible character index)
-                max_end_index = len(file_content)
+            # Highlight annotation in the text widget
+            self.annotation_text.tag_add(f"highlight_{matched_text}", start, end)  # Format indices as line.column
+            self.annotation_text.tag_config(f"highlight_{matched_text}", background=self.concept_colors[matched_text])
+
+        # Bind event for showing additional info on highlight hover
+        self.bind_highlight_event()
+
+    def render_window(self, start_line):
+        """
+        Renders a window of lines of a long note into the text widget and highlights only the annotations within it.
         
-            self.annotation_text.config(state="disabled")
+        Args:
+            start_line (int): The 0-based document line to render first.
+        """
+        self.window_start = max(0, min(start_line, len(self.doc_lines) - CNST.VIRTUAL_WINDOW_LINES))
+        window_end = min(len(self.doc_lines), self.window_start + CNST.VIRTUAL_WINDOW_LINES)
+
+        self.annotation_text.config(state="normal")
+        self.annotation_text.delete(1.0, tk.END)
+        self.annotation_text.insert(tk.END, "\n".join(self.doc_lines[self.window_start:window_end]))
+        self.highlight_annotations(self.window_start + 1, window_end)
+        self.annotation_text.config(state="disabled")
+
+    def show_document_line(self, doc_line):
+        """
+        Scrolls a long note so that the given document line is at the top, re-rendering the window when needed.
+        
+        Args:
+            doc_line (int): The 0-based document line to show.
+        """
+        doc_line = max(0, min(doc_line, len(self.doc_lines) - 1))
+        window_end = self.window_start + CNST.VIRTUAL_WINDOW_LINES
+        margin = CNST.VIRTUAL_MARGIN_LINES
+
+        if (doc_line < self.window_start + margin and self.window_start > 0) or \
+                (doc_line > window_end - margin and window_end < len(self.doc_lines)) or \
+                not self.window_start <= doc_line < window_end:
+            self.render_window(doc_line - CNST.VIRTUAL_WINDOW_LINES // 2)
+        self.annotation_text.yview(f"{doc_line - self.window_start + 1}.0")
+
+    def on_virtual_yscroll(self, first, last):
+        """
+        Maps the text widget scroll position to the whole document for the scrollbar, and moves the
+        rendered window when the view comes close to its edges.
+        
+        Args:
+            first (str): Fraction of the widget content above the view.
+            last (str): Fraction of the widget content up to the bottom of the view.
+        """
+        top = int(self.annotation_text.index("@0,0").split(".")[0])
+        bottom = int(self.annotation_text.index(f"@0,{self.annotation_text.winfo_height()}").split(".")[0])
+        total = max(1, len(self.doc_lines))
+        self.text_scrollbar.set((self.window_start + top - 1) / total, (self.window_start + bottom) / total)
+
+        window_end = self.window_start + CNST.VIRTUAL_WINDOW_LINES
+        near_top = top <= CNST.VIRTUAL_MARGIN_LINES and self.window_start > 0
+        near_bottom = self.window_start + bottom >= window_end - CNST.VIRTUAL_MARGIN_LINES and window_end < len(self.doc_lines)
+        if (near_top or near_bottom) and not self.window_shift_pending:
+            # Re-rendering from within the scroll callback would recurse, so it is deferred
+            self.window_shift_pending = True
+            self.master.after_idle(self.shift_window, self.window_start + top - 1)
+
+    def shift_window(self, doc_line):
+        """
+        Re-renders the window around the given document line after scrolling.
+        
+        Args:
+            doc_line (int): The 0-based document line at the top of the view.
+        """
+        self.window_shift_pending = False
+        if self.virtual_mode:
+            self.show_document_line(doc_line)
+
+    def on_virtual_scrollbar(self, *args):
+        """
+        Handles scrollbar drags and clicks for a long note in virtualized mode.
+        
+        Args:
+            *args: The Tk scroll command, either ('moveto', fraction) or ('scroll', number, what).
+        """
+        if args[0] == "moveto":
+            self.show_document_line(int(float(args[1]) * len(self.doc_lines)))
+        else:
+            self.annotation_text.yview(*args)
 
 def main():
     parser = argparse.ArgumentParser(description="Run the Annotation Viewer Application.")
@@ -44,7 +44,115 @@ OUTPUT_HEADERS = [
 RESOURCE_SECTIONS_RULE = "section_rules.tsv"
 RESOURCE_SENTENCE_RULE = "sentence_rules.tsv"
 RESOURCE_CONCEPTS = "concepts.xlsx"
+# the concepts may also be listed in a Parquet, CSV or TSV file for very large concept sets
+RESOURCE_CONCEPTS_FILES = ("concepts.xlsx", "concepts.parquet", "concepts.csv", "concepts.tsv")
+# The parsed lexicons are cached per user, out of the (possibly shared) project folders, see helper/lexicon.py
+APP_CACHE_DIR = "medspacyV"
+LEXICON_CACHE_DIR = "lexicon_cache"
 RESOURCE_CONTEXT_RULES = "context_rules.json"
 RESOURCE_EXCLUDE_TERMS = "exclude_terms.txt"
+RESOURCE_SETTINGS = "settings.json"
 
-DEBUG_LOG_FILE = "debug.log"
\ No newline at end of file
+# Run settings, overridden per project by the optional settings.json resource
+DEFAULT_SETTINGS = {
+    "emit_offsets": False,
+    "compact_sentences": False,
+    "prescreen": False,
+    "stage_cache": False,
+    "long_note_chars": 0,
+    "include_sections": [],
+    "exclude_sections": [],
+    "lazy_context": False,
+    "workers": 1,
+    "batch_chars": 200000,
+    # seconds a note may run before it is quarantined, see helper/watchdog.py (0 for no limit)
+    "doc_time_limit": 0,
+    # table of the notes and its unique key column when the input is a database, see helper/database.py
+    "db_table": "notes",
+    "db_key": "rowid",
+    # SQLite database the annotations are also loaded into, see helper/result_sink.py ("" for none)
+    "result_db": "",
+    # set per run from the command line, see helper/sampling.py
+    "sample_notes": 0,
+    "sample_percent": 0,
+    "sample_seed": 0,
+    "sample_stratify": "",
+    # set per node from the command line, see helper/sharding.py
+    "shard_index": 0,
+    "shard_count": 1
+}
+
+# Stage cache of the tokenized, sentence-split and sectionized docs, stored in the project folder
+STAGE_CACHE_DIR = "stage_cache"
+STAGE_CACHE_SECTIONS_EXT = ".sections"
+STAGE_CACHE_SPLIT = "medspacy_target_matcher"
+TXT_SHARD_FILES = 500
+
+# Text notes are read by a pool of threads ahead of the pipeline, one shard of files at most, see helper/reader.py
+READER_THREADS = 4
+READER_QUEUE_FILES = TXT_SHARD_FILES
+
+# Packed corpus: the notes of a TXT folder or CSV export in one memory-mapped file, see helper/packed.py
+PACKED_CORPUS_EXT = ".mspack"
+PACKED_CORPUS_MAGIC = b"MSPACK01"
+
+# Database input: the notes of a table, read in pages by their key, see helper/database.py
+DATABASE_EXTS = (".db", ".sqlite", ".sqlite3")
+DB_PAGE_ROWS = TXT_SHARD_FILES
+DB_FETCH_ROWS = 100
+DB_POOL_SIZE = 2
+# doc names per query when only some notes are read, below the 999 parameters of older SQLite builds
+DB_SELECT_ROWS = 500
+
+# Database output: the annotation rows of every run loaded into one table, see helper/result_sink.py
+RESULT_SINK_TABLE = "annotations"
+RESULT_SINK_BATCH_ROWS = 10000
+
+# Notes longer than the long_note_chars setting are processed in chunks, cut at paragraph breaks when possible
+LONG_NOTE_MIN_CHUNK_RATIO = 0.5
+
+# Local annotation service, see helper/service.py
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
+SERVICE_MAX_BATCH_NOTES = 64
+SERVICE_MAX_WAIT_SECONDS = 0.01
+SERVICE_LATENCY_WINDOW = 1000
+
+# Watch mode, see helper/watch.py
+WATCH_POLL_SECONDS = 1.0
+WATCH_BATCH_SECONDS = 2.0
+WATCH_BATCH_FILES = 200
+
+# Per-note time limit, see helper/watchdog.py
+WATCHDOG_WARM_UP_TEXT = "Warming up the pipeline."
+WATCHDOG_SHUTDOWN_SECONDS = 5
+RETRY_LIST_FILE = "timed_out_notes.txt"
+
+# Rule preview tab, see helper/preview.py
+PREVIEW_RULE_POLL_SECONDS = 0.5
+PREVIEW_DEBOUNCE_MS = 150
+PREVIEW_POLL_MS = 30
+
+# ConText component that only scans the sentences holding entities, used when lazy_context is set
+LAZY_CONTEXT_FACTORY = "medspacy_lazy_context"
+
+# Tk line/column coordinates of the entities, added to the output when emit_offsets is set
+OUTPUT_OFFSET_HEADERS = ["start_line", "start_col", "end_line", "end_col"]
+
+DEBUG_LOG_FILE = "debug.log"
+# Run manifest written next to the output part files
+OUTPUT_MANIFEST = "manifest.json"
+MANIFEST_VERSION = 1
+
+# Search index over all the annotations of a run
+OUTPUT_SEARCH_INDEX = "annotations_index.sqlite"
+CONTEXT_FLAGS = ["is_negated", "is_family", "is_uncertain", "is_historical", "is_hypothetical"]
+
+# Virtualized rendering of very long notes in the annotation viewer
+VIRTUAL_RENDER_MIN_CHARS = 200000
+VIRTUAL_WINDOW_LINES = 600
+VIRTUAL_MARGIN_LINES = 150
+
+# Prefetching of the neighbouring documents in the annotation viewer
+PREFETCH_WORKERS = 2
+PREFETCH_CACHE_SIZE = 16
@@ -0,0 +1,253 @@
+# importing necessary libraries
+
+import os
+import re
+import queue
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+# importing custom modules
+import helper.constants as CNST
+
+logger = logging.getLogger(__name__)
+
+# Placeholder of the last key of a page, for every DB-API parameter style
+KEY_PLACEHOLDERS = {"qmark": "?", "numeric": ":1", "named": ":last_key", "format": "%s", "pyformat": "%(last_key)s"}
+
+IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)?$")
+
+
+def is_database(path):
+    """
+    Checks whether an input path is a SQLite database file rather than a folder of notes.
+    """
+    return os.path.isfile(path) and path.lower().endswith(CNST.DATABASE_EXTS)
+
+
+def sqlite_connect(db_path):
+    """
+    Returns a function opening read-only connections to a SQLite database, usable from any thread.
+    """
+    uri = f"{Path(db_path).resolve().as_uri()}?mode=ro"
+    return lambda: sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+
+class ConnectionPool:
+    """
+    Hands out at most `size` DB-API connections, opened when first needed and reused afterwards.
+    """
+
+    def __init__(self, connect, size=CNST.DB_POOL_SIZE):
+        """
+        Args:
+            connect (function): Opens a new DB-API connection.
+            size (int, optional): Maximum number of open connections.
+        """
+        self.connect = connect
+        self.size = size
+        self.idle = queue.LifoQueue()
+        self.opened = 0
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrows a connection, waiting for one to be returned when they are all in use.
+        """
+        try:
+            conn = self.idle.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                can_open = self.opened < self.size
+                if can_open:
+                    self.opened += 1
+            conn = self.connect() if can_open else self.idle.get()
+        try:
+            yield conn
+        finally:
+            self.idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class DatabaseSource:
+    """
+    Streams the notes of a database table: the 'doc_name' and 'note_text' columns, and the columns after
+    'note_text' as the extra columns of every note, like in the CSV inputs.
+
+    The table is read in pages of CNST.DB_PAGE_ROWS rows ordered by a unique key column, each page
+    starting after the last key of the previous one (keyset pagination), and every page is fetched in
+    batches of CNST.DB_FETCH_ROWS rows. The next page is fetched on a pooled connection while the
+    current one goes through the pipeline. The query uses LIMIT, supported by SQLite, PostgreSQL, MySQL
+    and DuckDB.
+    """
+
+    def __init__(self, connect, table, key_column, paramstyle="qmark"):
+        """
+        Args:
+            connect (function): Opens a new DB-API connection, e.g. `sqlite_connect(db_path)`.
+            table (str): The table (or view) of the notes.
+            key_column (str): A unique column to page on, e.g. 'rowid' on SQLite.
+            paramstyle (str, optional): The `paramstyle` of the DB-API driver.
+
+        Raises:
+            ValueError: If the table or key column is not a plain SQL identifier.
+        """
+        for identifier in (table, key_column):
+            if not IDENTIFIER.match(identifier):
+                raise ValueError(f"{identifier!r} is not a valid table or column name.")
+        self.pool = ConnectionPool(connect)
+        self.table = table
+        self.key_column = key_column
+        self.paramstyle = paramstyle
+
+    def count(self):
+        """
+        Returns the number of notes of the table.
+        """
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT COUNT(*) FROM {self.table}")
+            return cursor.fetchone()[0]
+
+    def inventory(self, stratum_column=None):
+        """
+        Returns the name, length and stratum of every note of the table.
+
+        The notes are skipped like in a run, when they are not text or blank by `str.strip`, which also
+        strips tabs, newlines and other whitespace that SQL's TRIM keeps, so the texts are read through.
+
+        Args:
+            stratum_column (str, optional): Column holding the stratum of the notes.
+
+        Raises:
+            ValueError: If the stratum column is not a plain SQL identifier.
+
+        Returns:
+            list: (doc_name, characters, stratum) of every note, the stratum being None without a stratum column.
+        """
+        if stratum_column and not IDENTIFIER.match(stratum_column):
+            raise ValueError(f"{stratum_column!r} is not a valid table or column name.")
+        stratum = stratum_column or "NULL"
+        notes = []
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT doc_name, note_text, {stratum} FROM {self.table}")
+            while True:
+                rows = cursor.fetchmany(CNST.DB_FETCH_ROWS)
+                if not rows:
+                    break
+                notes.extend((doc_name, len(note_text), stratum) for doc_name, note_text, stratum in rows
+                             if isinstance(note_text, str) and note_text.strip() != "")
+            cursor.close()
+        return notes
+
+    def placeholders(self, values):
+        """
+        Returns the placeholders of a list of query parameters and the parameters, in the `paramstyle` of the driver.
+        """
+        if self.paramstyle in ("named", "pyformat"):
+            names = [f"value{i}" for i in range(len(values))]
+            mark = ":{}" if self.paramstyle == "named" else "%({})s"
+            return ", ".join(mark.format(name) for name in names), dict(zip(names, values))
+        if self.paramstyle == "numeric":
+            return ", ".join(f":{i + 1}" for i in range(len(values))), tuple(values)
+        return ", ".join([KEY_PLACEHOLDERS[self.paramstyle]] * len(values)), tuple(values)
+
+    def fetch_notes(self, query, params):
+        """
+        Fetches the notes selected by a query of the form `SELECT <key column>, * FROM <table> ...`.
+
+        Raises:
+            ValueError: If the table misses the 'doc_name' or 'note_text' column.
+
+        Returns:
+            tuple: (notes, last key of the notes), each note a (doc_name, note text, extra columns) tuple.
+        """
+        last_key = None
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            columns = [description[0] for description in cursor.description][1:]
+            if 'doc_name' not in columns or 'note_text' not in columns:
+                raise ValueError("The notes table must contain 'doc_name' and 'note_text' columns.")
+            doc_col, text_col = columns.index('doc_name'), columns.index('note_text')
+            end_columns = columns[text_col + 1:]
+
+            notes = []
+            while True:
+                rows = cursor.fetchmany(CNST.DB_FETCH_ROWS)
+                if not rows:
+                    break
+                for row in rows:
+                    last_key = row[0]
+                    values = row[1:]
+                    notes.append((values[doc_col], values[text_col],
+                                  dict(zip(end_columns, values[text_col + 1:]))))
+            cursor.close()
+        return notes, last_key
+
+    def fetch_page(self, last_key):
+        """
+        Fetches the page of notes following a key.
+
+        Args:
+            last_key: The last key of the previous page, None for the first page.
+
+        Returns:
+            tuple: (notes, last key of the page), see `fetch_notes`.
+        """
+        query = f"SELECT {self.key_column}, * FROM {self.table}"
+        params = ()
+        if last_key is not None:
+            query += f" WHERE {self.key_column} > {KEY_PLACEHOLDERS[self.paramstyle]}"
+            params = {"last_key": last_key} if self.paramstyle in ("named", "pyformat") else (last_key,)
+        query += f" ORDER BY {self.key_column} LIMIT {int(CNST.DB_PAGE_ROWS)}"
+        return self.fetch_notes(query, params)
+
+    def fetch_named(self, doc_names):
+        """
+        Fetches the notes with the given doc names, in the order of the key column.
+
+        Returns:
+            list: (doc_name, note text, extra columns) of the notes.
+        """
+        marks, params = self.placeholders(doc_names)
+        query = f"SELECT {self.key_column}, * FROM {self.table} WHERE doc_name IN ({marks}) ORDER BY {self.key_column}"
+        return self.fetch_notes(query, params)[0]
+
+    def pages(self, doc_names=None):
+        """
+        Yields the pages of notes of the table, fetching the next page in the background.
+
+        Args:
+            doc_names (set, optional): Only reads the notes with these doc names, e.g. the notes of a sample,
+                CNST.DB_SELECT_ROWS names per page.
+
+        Yields:
+            list: (doc_name, note text, extra columns) of the notes of a page.
+        """
+        if doc_names is not None:
+            doc_names = sorted(doc_names, key=str)
+            for start in range(0, len(doc_names), CNST.DB_SELECT_ROWS):
+                yield self.fetch_named(doc_names[start:start + CNST.DB_SELECT_ROWS])
+            return
+
+        with ThreadPoolExecutor(max_workers=1) as fetcher:
+            notes, last_key = self.fetch_page(None)
+            while notes:
+                next_page = fetcher.submit(self.fetch_page, last_key) if len(notes) == CNST.DB_PAGE_ROWS else None
+                yield notes
+                notes, last_key = next_page.result() if next_page is not None else ([], None)
+
+    def close(self):
+        self.pool.close()
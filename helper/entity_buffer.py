@@ -0,0 +1,140 @@
+# importing necessary libraries
+
+from array import array
+import pandas as pd
+
+# importing custom modules
+import helper.constants as CNST
+
+
+class EntityBuffer:
+    """
+    Compact, column-oriented store of the entities extracted during a run.
+
+    Numbers are kept in typed arrays, concepts and sections as integer codes into a table of unique
+    values, the five ConText flags as one bit each, and the extra CSV columns once per document.
+    The output DataFrame is only materialized when the results are written.
+    """
+
+    def __init__(self):
+        """
+        Creates an empty buffer.
+        """
+        self.doc_ids = []
+        self.doc_metadata = []
+        self.metadata_columns = {}
+
+        self.doc_index = array('l')
+        self.concept_codes = array('l')
+        self.section_codes = array('l')
+        self.flags = array('B')
+        self.starts = array('q')
+        self.ends = array('q')
+        self.sentence_starts = array('q')
+        self.sentence_ends = array('q')
+        self.matched_texts = []
+        self.sentences = []
+        self.section_headers = []
+
+        self.categories = {}
+        self.category_values = []
+
+        self.offsets = {col: array('l') for col in CNST.OUTPUT_OFFSET_HEADERS}
+        self.has_offsets = False
+
+    def __len__(self):
+        return len(self.doc_index)
+
+    def encode(self, value):
+        """
+        Returns the integer code of a concept or section, adding it to the table of unique values.
+
+        Args:
+            value (str): The value to encode.
+
+        Returns:
+            int: Its code.
+        """
+        code = self.categories.get(value)
+        if code is None:
+            code = len(self.category_values)
+            self.categories[value] = code
+            self.category_values.append(value)
+        return code
+
+    def add_rows(self, rows, metadata=None):
+        """
+        Adds the entity rows of one document.
+
+        Args:
+            rows (list): Output rows of the document, see `Model.extract_entity_rows`.
+            metadata (dict, optional): Extra CSV columns of the document, joined to its rows on output.
+        """
+        if not rows:
+            return
+
+        doc_position = len(self.doc_ids)
+        self.doc_ids.append(rows[0][CNST.DOC_ID])
+        self.doc_metadata.append(metadata or {})
+        for col in metadata or {}:
+            self.metadata_columns.setdefault(col, None)
+
+        for row in rows:
+            self.doc_index.append(doc_position)
+            self.concept_codes.append(self.encode(row["concept"]))
+            self.section_codes.append(self.encode(row["section_id"]))
+            self.matched_texts.append(row["matched_text"])
+            self.starts.append(row["concept_start"])
+            self.ends.append(row["concept_end"])
+            self.sentences.append(row["sentence"])
+            self.sentence_starts.append(row["sentence_start"])
+            self.sentence_ends.append(row["sentence_end"])
+
+            # Header spans would keep their whole doc alive, only their text is written out
+            header = row["matched_section_header"]
+            self.section_headers.append(header if header is None or isinstance(header, str) else str(header))
+
+            bits = 0
+            for bit, flag in enumerate(CNST.CONTEXT_FLAGS):
+                if row[flag]:
+                    bits |= 1 << bit
+            self.flags.append(bits)
+
+            if "start_line" in row:
+                self.has_offsets = True
+                for col in CNST.OUTPUT_OFFSET_HEADERS:
+                    self.offsets[col].append(row[col])
+
+    def to_dataframe(self):
+        """
+        Materializes the output table, with the columns in the same order as the written part files.
+
+        Returns:
+            pd.DataFrame: One row per entity, empty if no entity was added.
+        """
+        if not len(self):
+            return pd.DataFrame()
+
+        categories = self.category_values
+        data = {
+            "doc_name": [self.doc_ids[i] for i in self.doc_index],
+            "concept": [categories[code] for code in self.concept_codes],
+            "matched_text": self.matched_texts,
+            "concept_start": self.starts,
+            "concept_end": self.ends,
+            "sentence": self.sentences,
+            "sentence_start": self.sentence_starts,
+            "sentence_end": self.sentence_ends,
+            "section_id": [categories[code] for code in self.section_codes],
+            "matched_section_header": self.section_headers
+        }
+        for bit, flag in enumerate(CNST.CONTEXT_FLAGS):
+            data[flag] = [bool(bits >> bit & 1) for bits in self.flags]
+        if self.has_offsets:
+            data.update(self.offsets)
+
+        df = pd.DataFrame({col: list(values) for col, values in data.items()})
+        for col in self.metadata_columns:
+            per_doc = [metadata.get(col) for metadata in self.doc_metadata]
+            df[col] = [per_doc[i] for i in self.doc_index]
+        return df
@@ -0,0 +1,96 @@
+# importing necessary libraries
+
+from spacy.language import Language
+from medspacy.context import ConText
+
+# importing custom modules
+import helper.constants as CNST
+from helper.sentences import entity_sentences
+
+
+@Language.factory(CNST.LAZY_CONTEXT_FACTORY, default_config={"rules": "default"})
+def create_lazy_context(nlp, name, rules):
+    return LazyConText(nlp, name, rules)
+
+
+class LazyConText:
+    """
+    ConText component that only looks for modifiers where they can change an entity.
+
+    A modifier only reaches the targets of its own sentence, so docs without entities are left as they
+    are and ConText runs on the sentences holding entities only, each stretch of neighbouring ones as a
+    doc of its own. The ConText attributes
+    (`is_negated`, `is_family`, ...) found there are then copied back to the entities of the doc.
+    The modifier spans and the context graph are not kept on the doc.
+    """
+
+    def __init__(self, nlp, name=CNST.LAZY_CONTEXT_FACTORY, rules="default"):
+        """
+        Creates the wrapped ConText component.
+
+        Args:
+            nlp (Language): The pipeline.
+            name (str): Name of the component.
+            rules (str, optional): ConText rules, as for the `medspacy_context` component.
+        """
+        self.name = name
+        self.context = ConText(nlp, name=name, rules=rules)
+
+    def add(self, rules):
+        """
+        Adds rules to the wrapped ConText component.
+
+        Args:
+            rules (list): The ConTextRule objects to add.
+        """
+        self.context.add(rules)
+
+    def entity_sentences(self, doc):
+        """
+        Lists the token ranges of the sentences holding entities, neighbouring sentences merged.
+
+        Args:
+            doc (Doc): A doc with entities and sentence boundaries.
+
+        Returns:
+            list: (start, end) token ranges, in text order.
+        """
+        sentences, ent_sentences = entity_sentences(doc)
+        ranges = []
+        for first, last in ent_sentences:
+            start, end = sentences[first].start, sentences[last].end
+            if ranges and start <= ranges[-1][1]:
+                ranges[-1] = (ranges[-1][0], max(ranges[-1][1], end))
+            else:
+                ranges.append((start, end))
+        return ranges
+
+    def __call__(self, doc):
+        if not doc.ents:
+            return doc
+
+        ranges = self.entity_sentences(doc)
+        if ranges == [(0, len(doc))]:
+            return self.context(doc)
+
+        attributes = {attr for mapping in (self.context.context_attributes_mapping or {}).values() for attr in mapping}
+        ents = list(doc.ents)
+        position = 0
+        # Each stretch of sentences is scanned as a doc of its own, so no modifier can reach across the
+        # sentences left out between two stretches
+        for start, end in ranges:
+            range_ents = []
+            while position < len(ents) and ents[position].end <= end:
+                range_ents.append(ents[position])
+                position += 1
+            excerpt = self.context(doc[start:end].as_doc())
+            if len(excerpt.ents) != len(range_ents):
+                # Entities that could not be carried over one to one, scanning the whole doc is always correct
+                return self.context(doc)
+
+            for excerpt_ent, ent in zip(excerpt.ents, range_ents):
+                for attr in attributes:
+                    value = getattr(excerpt_ent._, attr)
+                    if value != getattr(ent._, attr):
+                        setattr(ent._, attr, value)
+        return doc
@@ -0,0 +1,126 @@
+# importing necessary libraries
+
+import os
+import pickle
+import hashlib
+import logging
+import pandas as pd
+
+# importing custom modules
+import helper.constants as CNST
+
+logger = logging.getLogger(__name__)
+
+
+def find_lexicon(project_path_resources):
+    """
+    Locates the concepts lexicon of a project, which may be an .xlsx, .parquet, .csv or .tsv file.
+
+    Args:
+        project_path_resources (str): Path to the project resources.
+
+    Returns:
+        str: The path of the first lexicon found in the order of CNST.RESOURCE_CONCEPTS_FILES, or the
+            path of CNST.RESOURCE_CONCEPTS if there is none.
+    """
+    for file_name in CNST.RESOURCE_CONCEPTS_FILES:
+        path_of_resource = f"{project_path_resources}/{file_name}"
+        if os.path.exists(path_of_resource):
+            return path_of_resource
+    return f"{project_path_resources}/{CNST.RESOURCE_CONCEPTS}"
+
+
+def parse_lexicon(lex_file):
+    """
+    Parses a lexicon file, keeping its first five columns under the CNST.LEXICON_COLS names.
+
+    Raises:
+        ValueError: If the file type is not supported.
+    """
+    extension = os.path.splitext(lex_file)[1].lower()
+    if extension in (".xlsx", ".xls"):
+        lexicon = pd.read_excel(lex_file)
+    elif extension == ".csv":
+        lexicon = pd.read_csv(lex_file)
+    elif extension == ".tsv":
+        lexicon = pd.read_csv(lex_file, sep="\t")
+    elif extension == ".parquet":
+        # needs pyarrow or fastparquet
+        lexicon = pd.read_parquet(lex_file)
+    else:
+        raise ValueError(f"Unsupported lexicon file type: {lex_file}")
+
+    lexicon = lexicon.iloc[:, :5]
+    lexicon.columns = CNST.LEXICON_COLS[:len(lexicon.columns)]
+    return lexicon
+
+
+def cache_file_of(lex_file):
+    """
+    Returns the cache file of a lexicon, in the cache folder of the user (LOCALAPPDATA on Windows,
+    XDG_CACHE_HOME or ~/.cache elsewhere), named after the absolute path of the lexicon.
+
+    The cache is kept out of the project folder: a project may be shared, and a pickle written there by
+    someone else must not be loaded.
+    """
+    cache_root = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    lex_key = hashlib.sha1(os.path.normcase(os.path.abspath(lex_file)).encode("utf-8")).hexdigest()
+    return os.path.join(cache_root, CNST.APP_CACHE_DIR, CNST.LEXICON_CACHE_DIR, f"{lex_key}.pkl")
+
+
+def load_cache(cache_file):
+    """
+    Loads a lexicon cache, or returns None when it is missing, unreadable or written by another pandas version.
+    """
+    if not os.path.exists(cache_file):
+        return None
+    try:
+        with open(cache_file, "rb") as fh:
+            cached = pickle.load(fh)
+        if cached["pandas_version"] == pd.__version__ and isinstance(cached["lexicon"], pd.DataFrame):
+            return cached
+    except Exception as e:
+        logger.info(f"Ignoring the unreadable lexicon cache {cache_file}: {e}")
+    return None
+
+
+def read_lexicon(lex_file):
+    """
+    Reads a lexicon file through its cache.
+
+    The parsed lexicon is pickled in the cache folder of the user, see `cache_file_of`. The cache is used
+    while the file keeps its size and modification time, or its content hash when only the time changed,
+    and while pandas keeps its version, so the view validation, the model and every worker process parse
+    a large lexicon only once. Any cache that cannot be loaded is parsed again.
+
+    Args:
+        lex_file (str): Path to the lexicon file.
+
+    Returns:
+        pandas.DataFrame: The lexicon, not yet cleaned, see `Model.load_lexicon`.
+    """
+    cache_file = cache_file_of(lex_file)
+    stat = os.stat(lex_file)
+    cached = load_cache(cache_file)
+
+    if cached is not None and (cached["size"], cached["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns):
+        return cached["lexicon"]
+
+    with open(lex_file, "rb") as fh:
+        content_hash = hashlib.sha1(fh.read()).hexdigest()
+    if cached is not None and cached["sha1"] == content_hash:
+        lexicon = cached["lexicon"]
+    else:
+        lexicon = parse_lexicon(lex_file)
+
+    # Several worker processes may write the cache at once, each writes its own file and swaps it in
+    temp_file = f"{cache_file}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(temp_file, "wb") as fh:
+            pickle.dump({"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha1": content_hash,
+                         "pandas_version": pd.__version__, "lexicon": lexicon}, fh)
+        os.replace(temp_file, cache_file)
+    except OSError as e:
+        logger.info(f"Could not write the lexicon cache {cache_file}: {e}")
+    return lexicon
@@ -0,0 +1,69 @@
+# importing necessary libraries
+
+import re
+
+# importing custom modules
+import helper.constants as CNST
+
+PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n\s*")
+LINE_BREAK = re.compile(r"\n\s*")
+SENTENCE_END = re.compile(r"[.!?]\s+")
+WHITESPACE = re.compile(r"\s+")
+
+
+def _last_break(pattern, text, start, limit):
+    """
+    Returns the end of the last break matching the pattern in text[start:limit], or None.
+    """
+    cut = None
+    for match in pattern.finditer(text, start, limit):
+        cut = match.end()
+    return cut
+
+
+def chunk_starts(text, max_chars):
+    """
+    Computes where a long note is cut into chunks of at most `max_chars` characters.
+
+    Chunks are cut after a paragraph break when there is one in the second half of the chunk, so
+    that section headers (which start a line) open a chunk, then after a line break, then after
+    a sentence end, then after any whitespace, and only as a last resort in the middle of a word.
+
+    Args:
+        text (str): The note text.
+        max_chars (int): Maximum chunk length.
+
+    Returns:
+        list: Sorted start offsets of the chunks, the first is always 0.
+    """
+    starts = [0]
+    while len(text) - starts[-1] > max_chars:
+        start = starts[-1]
+        limit = start + max_chars
+        earliest = start + int(max_chars * CNST.LONG_NOTE_MIN_CHUNK_RATIO)
+
+        cut = None
+        for pattern in (PARAGRAPH_BREAK, LINE_BREAK, SENTENCE_END, WHITESPACE):
+            cut = _last_break(pattern, text, earliest, limit)
+            if cut is not None:
+                break
+        if cut is None or cut <= start:
+            cut = limit
+        starts.append(cut)
+    return starts
+
+
+def split_note(text, max_chars):
+    """
+    Cuts a long note into chunks, see `chunk_starts`.
+
+    Args:
+        text (str): The note text.
+        max_chars (int): Maximum chunk length.
+
+    Returns:
+        list: (start offset, chunk text) pairs covering the whole note.
+    """
+    starts = chunk_starts(text, max_chars)
+    ends = starts[1:] + [len(text)]
+    return [(start, text[start:end]) for start, end in zip(starts, ends)]
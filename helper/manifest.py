@@ -0,0 +1,156 @@
+# importing necessary libraries
+
+import os
+import json
+import time
+import logging
+
+from openpyxl import load_workbook
+
+# importing custom modules
+import helper.constants as CNST
+
+logger = logging.getLogger(__name__)
+
+
+def snapshot_input_files(input_dir, extension):
+    """
+    Records the size and modification time of every input file with the given extension.
+
+    Args:
+        input_dir (str): Directory containing the input files.
+        extension (str): File extension to include (e.g. '.csv').
+
+    Returns:
+        dict: Mapping of file name to [size, mtime].
+    """
+    snapshot = {}
+    with os.scandir(input_dir) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.lower().endswith(extension):
+                stat = entry.stat()
+                snapshot[entry.name] = [stat.st_size, int(stat.st_mtime)]
+    return snapshot
+
+
+def write_manifest(output_folder, input_kind, input_dir, input_files, columns, parts, report=None, shard=None, dtypes=None):
+    """
+    Writes the run manifest next to the output part files.
+
+    Args:
+        output_folder (str): Folder containing the .xlsx part files.
+        input_kind (str): Either 'csv' or 'text'.
+        input_dir (str): Directory the notes were read from.
+        input_files (dict): Snapshot of the input files, see `snapshot_input_files`.
+        columns (list): Column names written to every part file.
+        parts (dict): Mapping of part file name to a dict with 'rows' and 'doc_ids'.
+        report (dict, optional): Run statistics, e.g. the number of notes processed.
+        shard (dict, optional): 'index' and 'count' of a shard run.
+        dtypes (dict, optional): Column name to dtype name, which the merge of shard runs restores.
+
+    Returns:
+        str: The path of the manifest file.
+    """
+    manifest = {
+        "version": CNST.MANIFEST_VERSION,
+        "created": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+        "input_kind": input_kind,
+        "input_dir": input_dir,
+        "input_files": input_files,
+        "columns": list(columns),
+        "total_rows": sum(part["rows"] for part in parts.values()),
+        "parts": parts,
+        "report": report or {}
+    }
+    if shard is not None:
+        manifest["shard"] = shard
+    if dtypes is not None:
+        manifest["dtypes"] = dtypes
+    manifest_path = os.path.join(output_folder, CNST.OUTPUT_MANIFEST).replace("\\", "/")
+    with open(manifest_path, "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh)
+    return manifest_path
+
+
+def load_manifest(output_folder, xlsx_files):
+    """
+    Loads the run manifest if it exists and still describes the given part files.
+
+    Args:
+        output_folder (str): Folder containing the .xlsx part files.
+        xlsx_files (list): Names of the .xlsx files currently in the folder.
+
+    Returns:
+        dict or None: The manifest, or None when it is missing, unreadable or stale.
+    """
+    manifest_path = os.path.join(output_folder, CNST.OUTPUT_MANIFEST)
+    if not os.path.exists(manifest_path):
+        return None
+
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as fh:
+            manifest = json.load(fh)
+    except Exception as e:
+        logger.error(f"Could not read the run manifest {manifest_path}: {e}")
+        return None
+
+    if manifest.get("version") != CNST.MANIFEST_VERSION or set(manifest.get("parts", {})) != set(xlsx_files):
+        logger.info(f"Run manifest {manifest_path} does not match the output folder, ignoring it")
+        return None
+    return manifest
+
+
+def input_files_unchanged(manifest, input_dir, extension):
+    """
+    Checks whether the input files recorded in the manifest are still present and unmodified, in the same
+    input folder as the run.
+
+    Args:
+        manifest (dict): The run manifest.
+        input_dir (str): Directory containing the input files.
+        extension (str): File extension recorded in the manifest (e.g. '.csv').
+
+    Returns:
+        bool: True if the input folder is the one of the run and still holds exactly the recorded files.
+    """
+    recorded = manifest.get("input_files")
+    if not recorded or not manifest.get("input_dir"):
+        return False
+    if normalized_path(manifest["input_dir"]) != normalized_path(input_dir):
+        return False
+    return snapshot_input_files(input_dir, extension) == recorded
+
+
+def normalized_path(path):
+    """
+    Returns a path in a form that compares equal for the same folder (absolute, normalized, case-folded on Windows).
+    """
+    return os.path.normcase(os.path.abspath(os.path.normpath(path)))
+
+
+def read_xlsx_header_and_doc_ids(file_path):
+    """
+    Streams an output .xlsx part file, reading only the header row and the `doc_name` column.
+
+    Args:
+        file_path (str): Path to the .xlsx file.
+
+    Returns:
+        tuple: (list of column headers, set of non-empty doc_name values as strings).
+    """
+    workbook = load_workbook(file_path, read_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        columns = ["" if col is None else str(col) for col in header] if header else []
+
+        doc_ids = set()
+        if CNST.DOC_ID in columns:
+            doc_col = columns.index(CNST.DOC_ID) + 1
+            for (value,) in sheet.iter_rows(min_row=2, min_col=doc_col, max_col=doc_col, values_only=True):
+                if value is not None and str(value).strip():
+                    doc_ids.add(str(value))
+    finally:
+        workbook.close()
+    return columns, doc_ids
@@ -0,0 +1,36 @@
+# importing necessary libraries
+
+from bisect import bisect_right
+
+
+def line_starts(text):
+    """
+    Computes the character offset at which every line of a text starts.
+
+    Args:
+        text (str): The full document text.
+
+    Returns:
+        list: Sorted start offsets, one per line (the first is always 0).
+    """
+    starts = [0]
+    index = text.find("\n")
+    while index != -1:
+        starts.append(index + 1)
+        index = text.find("\n", index + 1)
+    return starts
+
+
+def char_to_line_col(starts, char_index):
+    """
+    Converts a character offset into a Tk `line.column` position.
+
+    Args:
+        starts (list): Line start offsets, see `line_starts`.
+        char_index (int): The character offset to convert.
+
+    Returns:
+        tuple: (1-based line number, 0-based column).
+    """
+    line = bisect_right(starts, char_index) - 1
+    return line + 1, char_index - starts[line]
@@ -0,0 +1,191 @@
+# importing necessary libraries
+
+import os
+import json
+import mmap
+import struct
+import logging
+import pandas as pd
+
+# importing custom modules
+import helper.constants as CNST
+from helper.reader import scan_notes, prefetch_notes
+
+logger = logging.getLogger(__name__)
+
+# magic, offset and length of the index
+HEADER = struct.Struct("<8sQQ")
+
+
+def pack_notes(notes, pack_path, kind):
+    """
+    Writes notes into a packed corpus: the UTF-8 texts one after the other, followed by a JSON index
+    of the document names with the offset and length of their text.
+
+    Args:
+        notes (iterable): (doc_name, note text, extra CSV columns) of every note.
+        pack_path (str): The packed corpus file to write.
+        kind (str): Either 'csv' or 'text', the kind of input the notes come from.
+
+    Returns:
+        int: The number of notes packed.
+    """
+    docs = []
+    temp_path = f"{pack_path}.tmp"
+    with open(temp_path, "wb") as fh:
+        fh.write(HEADER.pack(CNST.PACKED_CORPUS_MAGIC, 0, 0))
+        offset = HEADER.size
+        for doc_name, note_text, metadata in notes:
+            data = note_text.encode("utf-8") if isinstance(note_text, str) else b""
+            fh.write(data)
+            docs.append([doc_name, offset, len(data), metadata])
+            offset += len(data)
+
+        # numpy values of the CSV columns are written as plain numbers
+        index = json.dumps({"kind": kind, "docs": docs},
+                           default=lambda value: value.item() if hasattr(value, "item") else str(value)).encode("utf-8")
+        fh.write(index)
+        fh.seek(0)
+        fh.write(HEADER.pack(CNST.PACKED_CORPUS_MAGIC, offset, len(index)))
+    os.replace(temp_path, pack_path)
+    return len(docs)
+
+
+def pack_folder(input_dir, pack_path, csv_input):
+    """
+    Packs the .txt notes or the CSV exports of a folder into one packed corpus file.
+
+    Args:
+        input_dir (str): The folder of the notes.
+        pack_path (str): The packed corpus file to write.
+        csv_input (bool): Whether the notes are in CSV files with 'doc_name' and 'note_text' columns.
+
+    Raises:
+        ValueError: If there is no note file in the folder, or a CSV file misses the required columns.
+
+    Returns:
+        int: The number of notes packed.
+    """
+    if csv_input:
+        csv_files = scan_notes(input_dir, ".csv")
+        if not csv_files:
+            raise ValueError("No CSV files found in the directory.")
+
+        def notes():
+            for csv_file in csv_files:
+                input_csv_file = pd.read_csv(os.path.join(input_dir, csv_file))
+                if 'doc_name' not in input_csv_file.columns or 'note_text' not in input_csv_file.columns:
+                    raise ValueError("CSV file must contain 'doc_name' and 'note_text' columns.")
+                end_columns = input_csv_file.columns[input_csv_file.columns.get_loc("note_text") + 1:].tolist()
+                for _, row in input_csv_file.iterrows():
+                    yield row["doc_name"], row["note_text"], {col: row[col] for col in end_columns}
+
+        return pack_notes(notes(), pack_path, "csv")
+
+    txt_files = scan_notes(input_dir)
+    if not txt_files:
+        raise ValueError("No TXT files found in the directory.")
+
+    def notes():
+        for f, note_txt, error in prefetch_notes(input_dir, txt_files):
+            if error is not None:
+                logger.error(f"The program was not able to pack the following file:{f} with errror: {error}")
+                continue
+            yield f, note_txt, {}
+
+    return pack_notes(notes(), pack_path, "text")
+
+
+def pack_files(folder):
+    """
+    Lists the packed corpus files of an input folder.
+
+    Returns:
+        list: Their paths, sorted by name.
+    """
+    if not os.path.isdir(folder):
+        return []
+    return [os.path.join(folder, f).replace("\\", "/") for f in sorted(scan_notes(folder, CNST.PACKED_CORPUS_EXT))]
+
+
+class PackedCorpus:
+    """
+    Read-only view of a packed corpus file, see `pack_notes`.
+
+    The file is memory-mapped: a note is decoded straight from the mapped pages when it is asked for,
+    so opening a corpus of millions of notes only reads its index.
+    """
+
+    def __init__(self, pack_path):
+        """
+        Opens a packed corpus.
+
+        Args:
+            pack_path (str): The packed corpus file.
+
+        Raises:
+            ValueError: If the file is not a packed corpus.
+        """
+        self.path = pack_path
+        self.fh = open(pack_path, "rb")
+        self.data = mmap.mmap(self.fh.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.data)
+
+        magic, index_offset, index_length = HEADER.unpack_from(self.data, 0)
+        if magic != CNST.PACKED_CORPUS_MAGIC:
+            self.close()
+            raise ValueError(f"{pack_path} is not a packed corpus.")
+        index = json.loads(str(self.view[index_offset:index_offset + index_length], "utf-8"))
+        self.kind = index["kind"]
+        self.docs = index["docs"]
+
+        # The first note of a document name is the one shown in the viewer, as with CSV inputs
+        self.positions = {}
+        for position, doc in enumerate(self.docs):
+            self.positions.setdefault(str(doc[0]), position)
+
+    def __len__(self):
+        return len(self.docs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """
+        Unmaps and closes the file, which can then be replaced or deleted (Windows locks mapped files).
+        Closing a corpus again does nothing.
+        """
+        if self.data.closed:
+            return
+        self.view.release()
+        self.data.close()
+        self.fh.close()
+
+    def doc_name(self, position):
+        return self.docs[position][0]
+
+    def metadata(self, position):
+        return self.docs[position][3]
+
+    def size(self, position):
+        """
+        Returns the size in bytes of the note at a position of the corpus, without reading it.
+        """
+        return self.docs[position][2]
+
+    def text(self, position):
+        """
+        Returns the text of the note at a position of the corpus.
+        """
+        _, offset, length, _ = self.docs[position]
+        return str(self.view[offset:offset + length], "utf-8")
+
+    def note_text(self, doc_name):
+        """
+        Returns the text of a document, or None if the corpus does not hold it.
+        """
+        position = self.positions.get(str(doc_name))
+        return None if position is None else self.text(position)
@@ -0,0 +1,102 @@
+# importing necessary libraries
+
+import re
+import logging
+
+# Aho-Corasick automaton for the literal terms, a regex alternation is used when it is not installed
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# importing custom modules
+import helper.constants as CNST
+
+logger = logging.getLogger(__name__)
+
+REGEX_METACHARS = set(".^$*+?{}[]\\|()")
+CHAR_CLASS = re.compile(r"\[(?:\\.|[^\]])*\]")
+POSITIONAL = re.compile(r"\^|\$|\\A|\\Z|\\b|\\B|\(\?<|\(\?=|\(\?!")
+BACKREFERENCE = re.compile(r"\\[1-9]|\(\?P=")
+
+
+class ConceptPrescreen:
+    """
+    Cheap test that tells whether a note can contain any concept of the lexicon, so that notes which
+    cannot match are dropped before the full NLP pipeline.
+
+    The test never rejects a note the target matcher would match: literal terms are searched as
+    lowercase substrings and regular expressions without their word boundaries, case-insensitively.
+    """
+
+    def __init__(self, lexicon):
+        """
+        Compiles the pre-screen from the lexicon.
+
+        Args:
+            lexicon (pd.DataFrame): The inclusion lexicon, see `Model.load_lexicon`.
+        """
+        self.always_match = False
+        literals = set()
+        patterns = []
+        # terms referring to their own groups by number, which an alternation of all the terms renumbers
+        separate_patterns = []
+
+        for term, case_sensitive in zip(lexicon[CNST.LEXICON_COLS[2]], lexicon[CNST.LEXICON_COLS[3]]):
+            term = str(term)
+            if not REGEX_METACHARS.intersection(term):
+                literals.add(term.lower())
+                continue
+
+            # Case sensitive terms are matched token by token, where anchors, word boundaries and lookarounds
+            # see the token boundaries rather than the note, so they cannot be screened on the whole text
+            if case_sensitive == "YES" and POSITIONAL.search(CHAR_CLASS.sub("", term)):
+                logger.info(f"Pre-screen disabled, the term {term} cannot be screened on the whole note")
+                self.always_match = True
+            (separate_patterns if BACKREFERENCE.search(term) else patterns).append(f"(?:{term})")
+
+        self.automaton = None
+        self.literal_regex = None
+        if literals and ahocorasick is not None:
+            self.automaton = ahocorasick.Automaton()
+            for literal in literals:
+                self.automaton.add_word(literal, literal)
+            self.automaton.make_automaton()
+        elif literals:
+            alternation = "|".join(re.escape(literal) for literal in sorted(literals, key=len, reverse=True))
+            self.literal_regex = re.compile(alternation)
+
+        self.regexes = []
+        if patterns:
+            try:
+                self.regexes.append(re.compile("|".join(patterns), re.IGNORECASE))
+            except re.error as e:
+                # e.g. two terms with the same group name
+                logger.info(f"The lexicon regular expressions do not compile together, screening them one by one: {e}")
+                separate_patterns.extend(patterns)
+        for pattern in separate_patterns:
+            try:
+                self.regexes.append(re.compile(pattern, re.IGNORECASE))
+            except re.error as e:
+                logger.error(f"Pre-screen disabled, the term {pattern} does not compile: {e}")
+                self.always_match = True
+
+    def may_match(self, text):
+        """
+        Tells whether a note may contain a concept of the lexicon.
+
+        Args:
+            text (str): The note text.
+
+        Returns:
+            bool: False only if no concept can match the note.
+        """
+        if self.always_match:
+            return True
+
+        lowered = text.lower()
+        if self.automaton is not None and next(self.automaton.iter(lowered), None) is not None:
+            return True
+        if self.literal_regex is not None and self.literal_regex.search(lowered):
+            return True
+        return any(regex.search(text) is not None for regex in self.regexes)
@@ -0,0 +1,193 @@
+# importing necessary libraries
+
+import os
+import time
+import queue
+import logging
+import threading
+
+# importing custom modules
+import helper.constants as CNST
+import helper.lexicon as lexicon
+
+logger = logging.getLogger(__name__)
+
+
+class RulePreview:
+    """
+    Annotates preview texts on a pipeline kept warm on a background thread.
+
+    Texts are submitted from the interface and only the latest one waiting is annotated. The rule files
+    and the settings of the project are checked between requests: when a rule file is saved, its changes
+    are applied to the pipeline (see `Model.update_rules`), when the settings are saved the pipeline is
+    rebuilt, and the last text is annotated again. Results are posted to the
+    `results` queue, which the interface polls, as tuples:
+
+    - ("status", message) while the pipeline loads or the rules are reloaded,
+    - ("result", request id, rows, milliseconds) for an annotated text,
+    - ("error", message) when the pipeline or the rules could not be loaded.
+    """
+
+    def __init__(self, model, project_path_resources, settings):
+        """
+        Starts loading the pipeline of a project in the background.
+
+        Args:
+            model (Model): The model, see `model.Model`.
+            project_path_resources (str): Path to the project resources.
+            settings (dict): Run settings, see `Model.load_settings`.
+        """
+        self.model = model
+        self.project_path_resources = project_path_resources
+        self.settings = settings
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.the_pipeline = None
+        self.last_request = None
+
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+
+    def rule_files(self):
+        """
+        Returns the paths of the rule files and of the settings of the project.
+        """
+        return [f"{self.project_path_resources}/{CNST.RESOURCE_SENTENCE_RULE}",
+                f"{self.project_path_resources}/{CNST.RESOURCE_SECTIONS_RULE}",
+                lexicon.find_lexicon(self.project_path_resources),
+                f"{self.project_path_resources}/{CNST.RESOURCE_CONTEXT_RULES}",
+                f"{self.project_path_resources}/{CNST.RESOURCE_SETTINGS}"]
+
+    def rule_snapshot(self):
+        """
+        Returns the modification time of every rule file.
+        """
+        snapshot = {}
+        for path in self.rule_files():
+            try:
+                snapshot[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                snapshot[path] = None
+        return snapshot
+
+    def submit(self, request_id, text):
+        """
+        Asks for a text to be annotated.
+
+        Args:
+            request_id (int): Id returned with the result, to recognize the answer to the latest request.
+            text (str): The text to annotate.
+        """
+        self.requests.put((request_id, text))
+
+    def close(self):
+        self.requests.put(None)
+
+    def annotate(self, request_id, text):
+        start = time.perf_counter()
+        rows = list(self.model.annotated_rows(self.the_pipeline, [("preview", text)], None, None,
+                                              self.settings, self.section_filter))[0] or []
+        self.results.put(("result", request_id, rows, (time.perf_counter() - start) * 1000))
+
+    def load_pipeline(self):
+        """
+        Builds the pipeline and the section filter from the rule files and the settings.
+        """
+        self.the_pipeline = None
+        self.section_filter = self.model.section_filter(self.settings)
+        self.the_pipeline, _ = self.model.init_nlp_pipeline(self.project_path_resources, self.settings)
+        if self.the_pipeline not in self.model.loaded_rules:
+            # a rule file that cannot be read is replaced by the default rules when the pipeline is built
+            self.results.put(("error", "Some rules could not be loaded, see the log: the pipeline uses default rules"))
+
+    def reload_rules(self, settings_changed):
+        """
+        Applies the changes of the rule files to the pipeline, rebuilding it when they cannot be applied in place
+        or when the settings changed.
+
+        Args:
+            settings_changed (bool): Whether the settings file changed, in which case the settings are read again.
+
+        Returns:
+            bool: Whether the pipeline now holds the rules of the files. When False, the error has been posted
+            and the pipeline is None until the files are saved again.
+        """
+        if settings_changed:
+            self.settings = self.model.load_settings(self.project_path_resources)
+        elif self.the_pipeline is not None:
+            try:
+                updated = self.model.update_rules(self.the_pipeline, self.project_path_resources)
+            except Exception as e:
+                # a change applied halfway leaves the pipeline inconsistent, so it is rebuilt
+                logger.error(f"Error applying the rule changes to the preview pipeline: {e}")
+                self.results.put(("error", f"Could not apply the rule changes: {e}"))
+                updated = None
+            if updated is not None:
+                changes = updated[0]
+                added = sum(change["added"] for change in changes.values())
+                removed = sum(change["removed"] for change in changes.values())
+                self.results.put(("status", f"Rules reloaded: {added} added, {removed} removed"))
+                return True
+
+        self.results.put(("status", "Rebuilding the pipeline..."))
+        try:
+            self.load_pipeline()
+        except Exception as e:
+            logger.error(f"Error rebuilding the preview pipeline: {e}")
+            self.results.put(("error", f"Could not load the pipeline: {e}"))
+            return False
+        self.results.put(("status", "Pipeline rebuilt"))
+        return True
+
+    def run(self):
+        """
+        Loads the pipeline, then serves the requests and watches the rule files until closed.
+
+        The rule snapshot only advances once the pipeline holds the rules of the files, and a version of the
+        files that could not be loaded is not tried again until one of them is saved.
+        """
+        self.results.put(("status", "Loading the pipeline..."))
+        rules = self.rule_snapshot()
+        try:
+            self.load_pipeline()
+        except Exception as e:
+            logger.error(f"Error loading the preview pipeline: {e}")
+            self.results.put(("error", f"Could not load the pipeline: {e}"))
+            failed_rules = rules
+            rules = None
+        else:
+            failed_rules = None
+            self.results.put(("status", "Pipeline ready"))
+
+        while True:
+            try:
+                request = self.requests.get(timeout=CNST.PREVIEW_RULE_POLL_SECONDS)
+            except queue.Empty:
+                request = False
+            # only the latest text waiting is annotated
+            while request is not None:
+                try:
+                    request = self.requests.get_nowait()
+                except queue.Empty:
+                    break
+            if request is None:
+                return
+
+            current_rules = self.rule_snapshot()
+            rules_changed = current_rules != rules and current_rules != failed_rules
+            if rules_changed:
+                settings_file = f"{self.project_path_resources}/{CNST.RESOURCE_SETTINGS}"
+                settings_changed = rules is None or current_rules[settings_file] != rules[settings_file]
+                if self.reload_rules(settings_changed):
+                    rules, failed_rules = current_rules, None
+                else:
+                    failed_rules = current_rules
+
+            if request:
+                self.last_request = request
+            if self.the_pipeline is not None and self.last_request is not None and (request or rules_changed):
+                try:
+                    self.annotate(*self.last_request)
+                except Exception as e:
+                    logger.error(f"Error annotating the preview text: {e}")
+                    self.results.put(("error", f"Could not annotate the text: {e}"))
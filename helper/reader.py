@@ -0,0 +1,69 @@
+# importing necessary libraries
+
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# importing custom modules
+import helper.constants as CNST
+
+
+def scan_notes(folder, extension=".txt"):
+    """
+    Lists the note files of a folder in a single pass over the directory.
+
+    Args:
+        folder (str): The folder of the notes.
+        extension (str, optional): Extension of the note files.
+
+    Returns:
+        list: The file names, in directory order.
+    """
+    with os.scandir(folder) as entries:
+        return [entry.name for entry in entries if entry.name.endswith(extension) and entry.is_file()]
+
+
+def read_note(path):
+    """
+    Reads a note file.
+
+    Returns:
+        tuple: (text, None) or (None, the exception) if the file could not be read.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as fh:
+            return fh.read(), None
+    except Exception as e:
+        return None, e
+
+
+def prefetch_notes(folder, file_names, threads=CNST.READER_THREADS, depth=CNST.READER_QUEUE_FILES):
+    """
+    Reads note files ahead of their processing on a pool of threads.
+
+    At most `depth` files are read ahead of the consumer, so the files of the next shard are read
+    while the current one goes through the pipeline, without holding the whole folder in memory.
+
+    Args:
+        folder (str): The folder of the notes.
+        file_names (list): The files to read.
+        threads (int, optional): Number of reader threads.
+        depth (int, optional): Maximum number of files read ahead.
+
+    Yields:
+        tuple: (file name, text, error) in the order of `file_names`, see `read_note`.
+    """
+    names = iter(file_names)
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        window = deque()
+        for name in names:
+            window.append((name, pool.submit(read_note, os.path.join(folder, name))))
+            if len(window) >= depth:
+                break
+        while window:
+            name, future = window.popleft()
+            next_name = next(names, None)
+            if next_name is not None:
+                window.append((next_name, pool.submit(read_note, os.path.join(folder, next_name))))
+            text, error = future.result()
+            yield name, text, error
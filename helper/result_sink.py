@@ -0,0 +1,86 @@
+# importing necessary libraries
+
+import math
+import sqlite3
+import logging
+
+# importing custom modules
+import helper.constants as CNST
+
+logger = logging.getLogger(__name__)
+
+
+def sql_value(value):
+    """
+    Converts an output cell to a value SQLite can store: numpy numbers become Python numbers, missing
+    values NULL, and other objects (e.g. the section header spans) their text, as in the xlsx parts.
+    """
+    if value is None or isinstance(value, (str, int, bool)):
+        return value
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float):
+        return None if math.isnan(value) else value
+    return value if isinstance(value, (str, int, bool)) else str(value)
+
+
+def quote(name):
+    """
+    Quotes a table or column name.
+    """
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def write_results(db_path, df, doc_ids, table=CNST.RESULT_SINK_TABLE):
+    """
+    Loads the annotations of a run into a SQLite database, replacing those of the same documents.
+
+    The rows already stored for every processed document are deleted first, including the documents
+    without annotations this time, so a document processed again is never stored twice. The rows are
+    inserted with `executemany` in batches of CNST.RESULT_SINK_BATCH_ROWS, all in one transaction, and
+    the indexes on `doc_name` and `concept` are created once the first load is in. Columns missing from
+    the table (e.g. the offsets or extra CSV columns of a later run) are added to it.
+
+    Args:
+        db_path (str): The SQLite database, created when missing.
+        df (pd.DataFrame): The annotation rows of the run.
+        doc_ids (list): All the documents processed by the run.
+        table (str, optional): The table of the annotations.
+
+    Returns:
+        int: The number of rows inserted.
+    """
+    columns = [str(col) for col in df.columns]
+    column_list = ", ".join(quote(col) for col in columns)
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {quote(table)} ({column_list or quote(CNST.DOC_ID)})")
+            stored_columns = {row[1] for row in conn.execute(f'PRAGMA table_info({quote(table)})')}
+            for col in columns:
+                if col not in stored_columns:
+                    conn.execute(f"ALTER TABLE {quote(table)} ADD COLUMN {quote(col)}")
+
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS run_docs (doc_name PRIMARY KEY)")
+            conn.execute("DELETE FROM run_docs")
+            conn.executemany("INSERT OR IGNORE INTO run_docs VALUES (?)", ((sql_value(doc_id),) for doc_id in doc_ids))
+            deleted = conn.execute(f"DELETE FROM {quote(table)} WHERE {quote(CNST.DOC_ID)} IN (SELECT doc_name FROM run_docs)").rowcount
+
+            insert = f"INSERT INTO {quote(table)} ({column_list}) VALUES ({', '.join('?' * len(columns))})"
+            rows = df.itertuples(index=False, name=None)
+            inserted = 0
+            while columns:
+                batch = [tuple(sql_value(value) for value in row) for _, row in zip(range(CNST.RESULT_SINK_BATCH_ROWS), rows)]
+                if not batch:
+                    break
+                conn.executemany(insert, batch)
+                inserted += len(batch)
+
+            for col in (CNST.DOC_ID, "concept"):
+                if col in columns:
+                    conn.execute(f"CREATE INDEX IF NOT EXISTS {quote(f'idx_{table}_{col}')} ON {quote(table)} ({quote(col)})")
+    finally:
+        conn.close()
+
+    logger.info(f"Stored {inserted} annotation rows in {db_path}, replacing {deleted} rows of the same documents")
+    return inserted
@@ -0,0 +1,93 @@
+# importing necessary libraries
+
+import json
+import hashlib
+import logging
+from collections import Counter
+
+from medspacy.context import ConTextRule
+
+logger = logging.getLogger(__name__)
+
+
+class LoadedRules:
+    """
+    The rules loaded in the components of a pipeline, each under a key made from its line or row in
+    the resource file, so that a new version of the file can be compared to them.
+    """
+
+    def __init__(self, sentence_rules_hash):
+        """
+        Args:
+            sentence_rules_hash (str): Hash of the sentence rules, which are loaded with the sentence splitter.
+        """
+        self.sentence_rules_hash = sentence_rules_hash
+        self.keys = {}  # component name: list of rule keys
+        self.configs = {}  # component name: config the component was created with
+
+    def track(self, component_name, keyed_rules, config):
+        self.keys[component_name] = [key for key, _ in keyed_rules]
+        self.configs[component_name] = config
+
+
+def file_hash(path):
+    """
+    Returns the SHA-1 of a file, or '' when it does not exist.
+    """
+    try:
+        with open(path, "rb") as fh:
+            return hashlib.sha1(fh.read()).hexdigest()
+    except OSError:
+        return ""
+
+
+def concept_key(row):
+    """
+    Returns the key of a concept rule: the values of its lexicon row.
+    """
+    return tuple(str(value) for value in row)
+
+
+def read_context_rules(rules_file):
+    """
+    Reads the ConText rules of a JSON rules file.
+
+    Returns:
+        list: (key, ConTextRule) of every rule, the key being the rule JSON.
+    """
+    with open(rules_file, "r") as fh:
+        rule_data = json.load(fh)["context_rules"]
+    return [(json.dumps(data, sort_keys=True), ConTextRule.from_dict(data)) for data in rule_data]
+
+
+def rule_changes(loaded_keys, new_keys):
+    """
+    Counts the rules added and removed between two versions of a rule file.
+
+    Returns:
+        dict: The number of rules "added" and "removed".
+    """
+    loaded, new = Counter(loaded_keys), Counter(new_keys)
+    return {"added": sum((new - loaded).values()), "removed": sum((loaded - new).values())}
+
+
+def replace_component(nlp, component_name, config, rules):
+    """
+    Replaces a component of a pipeline by a new one of the same factory holding the given rules.
+
+    The other components are kept, so only the rule file that changed is loaded again, and the new component
+    finds what the component of a pipeline built from the new files would.
+
+    Args:
+        nlp (Language): The pipeline.
+        component_name (str): Name of the component, e.g. 'medspacy_target_matcher'.
+        config (dict): Config the component was created with.
+        rules (list): The rules of the new component.
+
+    Returns:
+        The new component.
+    """
+    factory = nlp.get_pipe_meta(component_name).factory
+    component = nlp.replace_pipe(component_name, factory, config=config)
+    component.add(rules)
+    return component
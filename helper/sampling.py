@@ -0,0 +1,135 @@
+# importing necessary libraries
+
+import time
+import hashlib
+import logging
+
+# importing custom modules
+import helper.constants as CNST
+
+logger = logging.getLogger(__name__)
+
+
+def sample_key(doc_name, seed):
+    """
+    Returns a stable pseudo-random number in [0, 1) for a document, the same on every run with the same seed.
+    """
+    digest = hashlib.sha1(f"{seed}:{doc_name}".encode("utf-8")).hexdigest()
+    return int(digest[:15], 16) / 16 ** 15
+
+
+def sample_size(total, sample_notes=0, sample_percent=0.0):
+    """
+    Returns the number of notes to sample: sample_notes when set, else sample_percent of the total.
+    """
+    if sample_notes > 0:
+        return min(sample_notes, total)
+    return min(total, max(1, round(total * sample_percent / 100))) if total and sample_percent > 0 else 0
+
+
+def choose_sample(inventory, sample_notes=0, sample_percent=0.0, seed=0):
+    """
+    Draws a reproducible sample of the notes of an input.
+
+    The notes with the smallest `sample_key` are taken, so the sample only depends on the document names and
+    the seed, not on the order the input is read in, and a larger sample contains the smaller ones. When the
+    notes have a stratum, every stratum gets its share of the sample in proportion to its size (largest
+    remainders first).
+
+    Args:
+        inventory (list): (doc_name, characters, stratum) of every note of the input, the stratum being None
+            for a simple random sample.
+        sample_notes (int, optional): Number of notes to sample.
+        sample_percent (float, optional): Percentage of the notes to sample, when sample_notes is 0.
+        seed (int, optional): Seed of the sample.
+
+    Returns:
+        set: The doc names of the sampled notes.
+    """
+    if not inventory:
+        return set()
+    size = sample_size(len(inventory), sample_notes, sample_percent)
+    strata = {}
+    for doc_name, _, stratum in inventory:
+        strata.setdefault(stratum, []).append(doc_name)
+
+    shares = {stratum: size * len(names) / len(inventory) for stratum, names in strata.items()}
+    counts = {stratum: int(share) for stratum, share in shares.items()}
+    by_remainder = sorted(strata, key=lambda stratum: (counts[stratum] - shares[stratum], str(stratum)))
+    for stratum in by_remainder[:size - sum(counts.values())]:
+        counts[stratum] += 1
+
+    sample = set()
+    for stratum, names in strata.items():
+        sample.update(sorted(names, key=lambda doc_name: sample_key(doc_name, seed))[:counts[stratum]])
+    return sample
+
+
+class PipelineTimer:
+    """
+    Measures the time spent producing the rows of the notes, leaving out the reading of the input.
+    """
+
+    def __init__(self):
+        self.seconds = 0.0
+
+    def timed(self, rows):
+        """
+        Passes the rows of the notes through, adding the time taken by each of them.
+        """
+        rows = iter(rows)
+        while True:
+            start = time.perf_counter()
+            try:
+                note_rows = next(rows)
+            except StopIteration:
+                self.seconds += time.perf_counter() - start
+                return
+            self.seconds += time.perf_counter() - start
+            yield note_rows
+
+
+def project_run(inventory, sample, df, run_report, seconds):
+    """
+    Projects the yield and runtime of a full run from the run of a sample.
+
+    The runtime is projected from the characters processed per second, as the pipeline time grows with the
+    length of the notes, and the output size from the average size of an output row in the CSV output. Only the
+    pipeline time of the sample is projected, not the reading of the whole input, which the sample run skips.
+
+    Args:
+        inventory (list): (doc_name, characters, stratum) of every note of the input, see `choose_sample`.
+        sample (set): The doc names of the sample.
+        df (pd.DataFrame): The annotation rows of the sample run.
+        run_report (dict): Run statistics of the sample run.
+        seconds (float): Pipeline time of the sample run, see `PipelineTimer`.
+
+    Returns:
+        dict: The sample statistics and the projections for the whole input.
+    """
+    notes_total = len(inventory)
+    chars_total = sum(chars for _, chars, _ in inventory)
+    notes_sampled = run_report["notes_processed"]
+    chars_sampled = sum(chars for doc_name, chars, _ in inventory if doc_name in sample)
+    scale = notes_total / notes_sampled if notes_sampled else 0
+
+    entities = len(df)
+    concept_counts = df["concept"].value_counts().to_dict() if entities else {}
+    csv_bytes = len(df.to_csv(index=False, sep='|').encode("utf-8")) if entities else 0
+
+    report = {
+        "notes_total": notes_total,
+        "notes_sampled": notes_sampled,
+        "entities": entities,
+        "entities_per_note": entities / notes_sampled if notes_sampled else 0,
+        "notes_with_entities": int(df[CNST.DOC_ID].nunique()) if entities else 0,
+        "concept_counts": {str(concept): int(count) for concept, count in concept_counts.items()},
+        "seconds": seconds,
+        "docs_per_second": notes_sampled / seconds if seconds else 0,
+        "projected_entities": round(entities * scale),
+        "projected_concept_counts": {str(concept): round(count * scale) for concept, count in concept_counts.items()},
+        "projected_seconds": seconds * chars_total / chars_sampled if chars_sampled else seconds * scale,
+        "projected_csv_bytes": round(csv_bytes * scale),
+    }
+    report.update({key: value for key, value in run_report.items() if key != "notes_processed"})
+    return report
@@ -0,0 +1,131 @@
+# importing necessary libraries
+
+import logging
+from concurrent.futures import as_completed
+
+logger = logging.getLogger(__name__)
+
+# State of a worker process, set once by `init_worker`
+_worker = {}
+
+
+def plan_batches(lengths, batch_chars):
+    """
+    Groups notes into batches of about `batch_chars` characters, the longest notes first.
+
+    Handing out the longest work first keeps a giant note from starting last and leaving the other
+    workers idle. A note longer than the budget is a batch on its own.
+
+    Args:
+        lengths (list): Length of every note.
+        batch_chars (int): Character budget of a batch.
+
+    Returns:
+        list: Batches, each a list of note indexes, longest batches first.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: (-lengths[i], i))
+    batches = []
+    batch, size = [], 0
+    for i in order:
+        if batch and size + lengths[i] > batch_chars:
+            batches.append(batch)
+            batch, size = [], 0
+        batch.append(i)
+        size += lengths[i]
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def init_worker(project_path_resources, settings):
+    """
+    Loads the NLP pipeline once in a worker process.
+
+    Args:
+        project_path_resources (str): Path to the project resources.
+        settings (dict): Run settings, see `Model.load_settings`.
+    """
+    from model import Model
+
+    model = Model()
+    the_pipeline, _ = model.init_nlp_pipeline(project_path_resources, settings)
+    _worker.update(model=model, pipeline=the_pipeline, settings=settings,
+                   section_filter=model.section_filter(settings))
+
+
+def annotate_batch(batch):
+    """
+    Processes a batch of notes in a worker process.
+
+    Args:
+        batch (list): (index, doc_id, note text) of every note of the batch.
+
+    Returns:
+        list: (index, output rows) of every note of the batch.
+    """
+    model, settings = _worker["model"], _worker["settings"]
+    docs = model.annotate_notes(_worker["pipeline"], [text for _, _, text in batch],
+                                long_note_chars=settings["long_note_chars"],
+                                section_filter=_worker["section_filter"])
+    results = []
+    for doc, (index, doc_id, text) in zip(docs, batch):
+        rows = model.note_rows(doc, doc_id, text, settings)
+        # The header spans cannot leave the worker, only their text is written out
+        for row in rows:
+            header = row["matched_section_header"]
+            row["matched_section_header"] = header if header is None or isinstance(header, str) else str(header)
+        results.append((index, rows))
+    return results
+
+
+def scheduled_rows(executor, notes, batch_chars):
+    """
+    Processes notes on the worker processes, longest batches first.
+
+    The batches are submitted right away and their rows collected as the returned iterator is read, so
+    that the batches of several shards can wait in the pool together.
+
+    Args:
+        executor (ProcessPoolExecutor): Pool started with `init_worker`.
+        notes (list): (doc_id, note text) of every note.
+        batch_chars (int): Character budget of a batch, see `plan_batches`.
+
+    Returns:
+        iterator: The output rows of every note, in the order of `notes`.
+    """
+    batches = plan_batches([len(text) for _, text in notes], batch_chars)
+    logger.info(f"Scheduling {len(notes)} notes in {len(batches)} batches")
+    futures = [executor.submit(annotate_batch, [(i, notes[i][0], notes[i][1]) for i in batch]) for batch in batches]
+    return collected_rows(futures)
+
+
+def collected_rows(futures):
+    """
+    Yields the rows of submitted batches in note order, see `scheduled_rows`.
+    """
+    # Results arrive in completion order and are held back until all the notes before them are done
+    done = {}
+    next_index = 0
+    for future in as_completed(futures):
+        for index, rows in future.result():
+            done[index] = rows
+        while next_index in done:
+            yield done.pop(next_index)
+            next_index += 1
+
+
+def prescreened_rows(kept, rows):
+    """
+    Puts the notes dropped by the pre-screen back among the rows of the notes sent to the workers.
+
+    Args:
+        kept (list): Whether every note was kept by the pre-screen.
+        rows (iterator): The output rows of the kept notes.
+
+    Yields:
+        list or None: The output rows of every note, None for the dropped notes.
+    """
+    for keep in kept:
+        yield next(rows) if keep else None
+    # Running the generator to its end lets it collect the last batches
+    next(rows, None)
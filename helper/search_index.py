@@ -0,0 +1,183 @@
+# importing necessary libraries
+
+import os
+import sqlite3
+import logging
+import pandas as pd
+
+# importing custom modules
+import helper.constants as CNST
+
+logger = logging.getLogger(__name__)
+
+TABLE = "annotations"
+FTS_TABLE = "annotations_fts"
+
+
+def build_search_index(df, output_folder):
+    """
+    Builds a queryable SQLite index over all the annotations of a run.
+
+    The table holds every output column, with indexes on the columns reviewers filter on and,
+    when SQLite has the FTS5 trigram tokenizer, a full-text index over the matched text, which can
+    find substrings like the LIKE fallback.
+
+    Args:
+        df (pd.DataFrame): All the annotation rows of the run.
+        output_folder (str): Folder containing the .xlsx part files.
+
+    Returns:
+        str: The path of the index file.
+    """
+    index_path = os.path.join(output_folder, CNST.OUTPUT_SEARCH_INDEX).replace("\\", "/")
+    if os.path.exists(index_path):
+        os.remove(index_path)
+
+    # Non-scalar cells (e.g. the section header spans) are stored as their text, as in the xlsx parts
+    df = df.copy()
+    for col in df.columns[df.dtypes == object]:
+        df[col] = df[col].map(lambda value: value if value is None or isinstance(value, (str, int, float, bool)) else str(value))
+
+    conn = sqlite3.connect(index_path)
+    try:
+        df.to_sql(TABLE, conn, index=False)
+        for col in [CNST.DOC_ID, "concept", "section_id"] + CNST.CONTEXT_FLAGS:
+            conn.execute(f'CREATE INDEX "idx_{col}" ON {TABLE} ("{col}")')
+        try:
+            conn.execute(f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(matched_text, content='{TABLE}', tokenize='trigram')")
+            conn.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES('rebuild')")
+        except sqlite3.OperationalError as e:
+            logger.info(f"FTS5 is not available, matched text search falls back to LIKE: {e}")
+        conn.commit()
+    except Exception:
+        # A partial index would make the viewer filter on incomplete data
+        conn.close()
+        os.remove(index_path)
+        raise
+    conn.close()
+    return index_path
+
+
+def find_search_index(output_folder):
+    """
+    Returns the search index of a run output folder if it exists.
+
+    Args:
+        output_folder (str): Folder containing the .xlsx part files.
+
+    Returns:
+        str or None: The path of the index file, or None if the run has no index.
+    """
+    index_path = os.path.join(output_folder, CNST.OUTPUT_SEARCH_INDEX)
+    return index_path if os.path.exists(index_path) else None
+
+
+def _has_fts(conn):
+    # the full-text index is only built when SQLite has the trigram tokenizer
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (FTS_TABLE,)).fetchone() is not None
+
+
+def distinct_values(index_path, column):
+    """
+    Lists the distinct non-empty values of a column, e.g. to fill a filter drop-down.
+
+    Args:
+        index_path (str): Path of the index file.
+        column (str): Column name.
+
+    Returns:
+        list: Sorted distinct values.
+    """
+    conn = sqlite3.connect(index_path)
+    try:
+        rows = conn.execute(f'SELECT DISTINCT "{column}" FROM {TABLE} WHERE "{column}" IS NOT NULL AND "{column}" != \'\' ORDER BY 1').fetchall()
+    finally:
+        conn.close()
+    return [row[0] for row in rows]
+
+
+def fetch_concept_dict(index_path):
+    """
+    Creates a dictionary mapping each concept to its matched texts across the whole run.
+
+    Args:
+        index_path (str): Path of the index file.
+
+    Returns:
+        dict: Concepts as keys and lists of unique matched texts as values.
+    """
+    conn = sqlite3.connect(index_path)
+    try:
+        rows = conn.execute(f"SELECT DISTINCT concept, matched_text FROM {TABLE} ORDER BY concept").fetchall()
+    finally:
+        conn.close()
+    concept_dict = {}
+    for concept, matched_text in rows:
+        concept_dict.setdefault(concept, []).append(matched_text)
+    return concept_dict
+
+
+def query_documents(index_path, concept=None, section_id=None, flags=None, text=None):
+    """
+    Finds the documents having at least one annotation that satisfies all the given filters.
+
+    Args:
+        index_path (str): Path of the index file.
+        concept (str, optional): Concept the annotation must have.
+        section_id (str, optional): Section the annotation must be in.
+        flags (list, optional): ConText flags (e.g. 'is_negated') that must all be set.
+        text (str, optional): Phrase the matched text must contain, ignoring the case of ASCII letters.
+
+    Returns:
+        list: Sorted document names.
+    """
+    clauses, params = [], []
+    if concept:
+        clauses.append("concept = ?")
+        params.append(concept)
+    if section_id:
+        clauses.append("section_id = ?")
+        params.append(section_id)
+    for flag in flags or []:
+        if flag not in CNST.CONTEXT_FLAGS:
+            raise ValueError(f"Unknown ConText flag: {flag}")
+        clauses.append(f'"{flag}" = 1')
+
+    conn = sqlite3.connect(index_path)
+    try:
+        if text:
+            # The trigram index only narrows down the rows (it needs 3 characters), LIKE decides the match
+            # either way so the results do not depend on FTS5 being available
+            if _has_fts(conn) and len(text) >= 3:
+                clauses.append(f"rowid IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ?)")
+                params.append('"' + text.replace('"', '""') + '"')
+            clauses.append("matched_text LIKE ? ESCAPE '\\'")
+            params.append("%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = conn.execute(f"SELECT DISTINCT {CNST.DOC_ID} FROM {TABLE} {where} ORDER BY {CNST.DOC_ID}", params).fetchall()
+    finally:
+        conn.close()
+    return [row[0] for row in rows]
+
+
+def fetch_annotations(index_path, doc_name):
+    """
+    Loads all the annotation rows of one document from the index.
+
+    Args:
+        index_path (str): Path of the index file.
+        doc_name (str): The document name.
+
+    Returns:
+        pd.DataFrame: The annotation rows of the document.
+    """
+    conn = sqlite3.connect(index_path)
+    try:
+        df = pd.read_sql_query(f"SELECT * FROM {TABLE} WHERE {CNST.DOC_ID} = ?", conn, params=(doc_name,))
+    finally:
+        conn.close()
+    # SQLite stores the flags as 0/1
+    for flag in CNST.CONTEXT_FLAGS:
+        if flag in df.columns:
+            df[flag] = df[flag].astype(bool)
+    return df
@@ -0,0 +1,34 @@
+# importing necessary libraries
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def entity_sentences(doc):
+    """
+    Finds the sentences of all the entities of a doc in one pass.
+
+    The sentence boundaries are collected once and the entities, which are sorted, are walked along with
+    the sentence starts, instead of looking up `ent.sent` (which scans token by token) for every entity.
+
+    Args:
+        doc (Doc): A doc with entities and sentence boundaries.
+
+    Returns:
+        tuple: (the sentences of the doc, (first, last) of every entity), first and last being the indexes of
+            the sentences holding the first and the last token of the entity. Like `ent.sent`, an entity
+            belongs to the sentence of its first token.
+    """
+    sentences = list(doc.sents)
+    sent_starts = [sent.start for sent in sentences]
+    indexes = []
+    first = last = 0
+    for ent in doc.ents:
+        while first + 1 < len(sentences) and sent_starts[first + 1] <= ent.start:
+            first += 1
+        last = max(last, first)
+        while last + 1 < len(sentences) and sent_starts[last + 1] <= ent.end - 1:
+            last += 1
+        indexes.append((first, last))
+    return sentences, indexes
@@ -0,0 +1,267 @@
+# importing necessary libraries
+
+import json
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# importing custom modules
+import helper.constants as CNST
+from helper.prescreen import ConceptPrescreen
+
+logger = logging.getLogger(__name__)
+
+
+class AnnotationJob:
+    """
+    The notes of one request, waiting for their rows.
+    """
+
+    def __init__(self, notes):
+        self.notes = notes
+        self.rows = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class NoteService:
+    """
+    Keeps a warm NLP pipeline and annotates the notes of concurrent requests in micro-batches.
+
+    The pipeline is only used by the batching thread: requests queue their notes, which are
+    gathered for up to CNST.SERVICE_MAX_WAIT_SECONDS (or CNST.SERVICE_MAX_BATCH_NOTES notes) and
+    processed together through `nlp.pipe`.
+    """
+
+    def __init__(self, model, project_path_resources, settings):
+        """
+        Loads the project pipeline once.
+
+        Args:
+            model (Model): The model, see `model.Model`.
+            project_path_resources (str): Path to the project resources.
+            settings (dict): Run settings, see `Model.load_settings`.
+        """
+        self.model = model
+        self.settings = settings
+        self.project_path_resources = project_path_resources
+        self.the_pipeline, inclusion_lexicon = model.init_nlp_pipeline(project_path_resources, settings)
+        self.set_prescreen(inclusion_lexicon)
+        self.section_filter = model.section_filter(settings)
+        # held by the batching thread while it runs the pipeline, and while the rules are reloaded
+        self.pipeline_lock = threading.Lock()
+
+        self.jobs = queue.Queue()
+        self.metrics_lock = threading.Lock()
+        self.latencies = deque(maxlen=CNST.SERVICE_LATENCY_WINDOW)
+        self.requests = 0
+        self.notes = 0
+        self.batches = 0
+
+        self.batcher = threading.Thread(target=self.run_batches, daemon=True)
+        self.batcher.start()
+
+    def set_prescreen(self, inclusion_lexicon):
+        self.prescreen = None
+        if self.settings["prescreen"] and inclusion_lexicon is not None:
+            self.prescreen = ConceptPrescreen(inclusion_lexicon)
+
+    def reload_rules(self):
+        """
+        Applies the changes of the project rule files to the warm pipeline, see `Model.update_rules`.
+
+        Returns:
+            dict: Number of rules added and removed per component, or {"rebuilt": True} if the pipeline had
+                to be rebuilt.
+        """
+        with self.pipeline_lock:
+            updated = self.model.update_rules(self.the_pipeline, self.project_path_resources)
+            if updated is None:
+                self.the_pipeline, inclusion_lexicon = self.model.init_nlp_pipeline(self.project_path_resources, self.settings)
+                changes = {"rebuilt": True}
+            else:
+                changes, inclusion_lexicon = updated
+            self.set_prescreen(inclusion_lexicon)
+        return changes
+
+    def annotate(self, notes):
+        """
+        Annotates notes, blocking until their batch is processed.
+
+        Args:
+            notes (list): (doc_id, note text) of every note.
+
+        Raises:
+            RuntimeError: If the pipeline failed on the batch.
+
+        Returns:
+            list: The output rows of all the notes.
+        """
+        start = time.perf_counter()
+        job = AnnotationJob(notes)
+        self.jobs.put(job)
+        job.done.wait()
+        if job.error is not None:
+            raise RuntimeError(job.error)
+
+        with self.metrics_lock:
+            self.latencies.append((time.perf_counter() - start) * 1000)
+            self.requests += 1
+            self.notes += len(notes)
+        return job.rows
+
+    def next_batch(self):
+        """
+        Waits for a job, then gathers the jobs arriving shortly after it.
+
+        Returns:
+            list: The jobs of the batch.
+        """
+        batch = [self.jobs.get()]
+        size = len(batch[0].notes)
+        deadline = time.monotonic() + CNST.SERVICE_MAX_WAIT_SECONDS
+        while size < CNST.SERVICE_MAX_BATCH_NOTES:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                job = self.jobs.get(timeout=timeout)
+            except queue.Empty:
+                break
+            batch.append(job)
+            size += len(job.notes)
+        return batch
+
+    def run_batches(self):
+        """
+        Processes the queued jobs batch after batch, for the life of the service.
+        """
+        while True:
+            batch = self.next_batch()
+            notes = [note for job in batch for note in job.notes]
+            try:
+                with self.pipeline_lock:
+                    note_rows = list(self.model.annotated_rows(self.the_pipeline, notes, self.prescreen, None,
+                                                               self.settings, self.section_filter))
+            except Exception as e:
+                logger.error(f"Error annotating a batch of {len(notes)} notes: {e}")
+                for job in batch:
+                    job.error = str(e)
+                    job.done.set()
+                continue
+
+            with self.metrics_lock:
+                self.batches += 1
+            for job in batch:
+                job_rows, note_rows = note_rows[:len(job.notes)], note_rows[len(job.notes):]
+                job.rows = [self.serializable(row) for rows in job_rows if rows for row in rows]
+                job.done.set()
+
+    def serializable(self, row):
+        """
+        Converts an output row to plain JSON values.
+        """
+        row = dict(row)
+        header = row["matched_section_header"]
+        row["matched_section_header"] = header if header is None or isinstance(header, str) else str(header)
+        return row
+
+    def metrics(self):
+        """
+        Reports the request latencies and batching of the service.
+
+        Returns:
+            dict: Counters and the p50/p99 latencies (ms) of the last CNST.SERVICE_LATENCY_WINDOW requests.
+        """
+        with self.metrics_lock:
+            latencies = sorted(self.latencies)
+            metrics = {"requests": self.requests, "notes": self.notes, "batches": self.batches,
+                       "mean_batch_notes": round(self.notes / self.batches, 2) if self.batches else 0}
+        for name, percentile in (("p50_ms", 50), ("p99_ms", 99)):
+            # nearest-rank percentile
+            metrics[name] = round(latencies[max(0, -(-percentile * len(latencies) // 100) - 1)], 2) if latencies else None
+        return metrics
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP interface of the `NoteService`:
+
+    - POST /annotate with {"doc_name": ..., "note_text": ...} or {"notes": [{...}, ...]} returns the
+      entity rows in the output schema.
+    - POST /reload_rules applies the changes of the project rule files to the pipeline.
+    - GET /metrics returns the latency metrics, GET /health returns {"status": "ok"}.
+    """
+
+    service = None
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.send_json(200, {"status": "ok"})
+        elif self.path == "/metrics":
+            self.send_json(200, self.service.metrics())
+        else:
+            self.send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path == "/reload_rules":
+            try:
+                self.send_json(200, self.service.reload_rules())
+            except Exception as e:
+                self.send_json(500, {"error": f"Could not reload the rules: {e}"})
+            return
+        if self.path != "/annotate":
+            self.send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            notes = payload["notes"] if "notes" in payload else [payload]
+            notes = [(note.get(CNST.DOC_ID, f"note_{i + 1}"), note["note_text"]) for i, note in enumerate(notes)]
+            if not all(isinstance(text, str) for _, text in notes):
+                raise ValueError("note_text must be a string")
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            self.send_json(400, {"error": f"Expected note_text or a list of notes: {e}"})
+            return
+
+        start = time.perf_counter()
+        try:
+            rows = self.service.annotate(notes)
+        except RuntimeError as e:
+            self.send_json(500, {"error": str(e)})
+            return
+        self.send_json(200, {"rows": rows, "latency_ms": round((time.perf_counter() - start) * 1000, 2)})
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+def serve(model, project_path_resources, settings, port=CNST.SERVICE_PORT):
+    """
+    Runs the annotation service on localhost until interrupted.
+
+    Args:
+        model (Model): The model, see `model.Model`.
+        project_path_resources (str): Path to the project resources.
+        settings (dict): Run settings, see `Model.load_settings`.
+        port (int, optional): Port to listen on.
+    """
+    ServiceRequestHandler.service = NoteService(model, project_path_resources, settings)
+    server = ThreadingHTTPServer((CNST.SERVICE_HOST, port), ServiceRequestHandler)
+    logger.info(f"Annotation service listening on http://{CNST.SERVICE_HOST}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,101 @@
+# importing necessary libraries
+
+import os
+import json
+import hashlib
+import logging
+import pandas as pd
+
+# importing custom modules
+import helper.constants as CNST
+
+logger = logging.getLogger(__name__)
+
+
+def shard_of(doc_name, shard_count):
+    """
+    Assigns a document to a shard from a stable hash of its name, the same on every node and run.
+
+    Args:
+        doc_name (str): The document name.
+        shard_count (int): Number of shards.
+
+    Returns:
+        int: The shard index, from 0 to shard_count - 1.
+    """
+    digest = hashlib.sha1(str(doc_name).encode("utf-8")).hexdigest()
+    return int(digest[:8], 16) % shard_count
+
+
+def shard_tag(shard_index, shard_count):
+    """
+    Returns the tag added to the part file names of a shard run.
+    """
+    return f"shard{shard_index + 1}of{shard_count}"
+
+
+def load_shard_manifests(shard_folders):
+    """
+    Reads and checks the manifests of the shard runs to merge.
+
+    Args:
+        shard_folders (list): The .xlsx output folders of the shard runs.
+
+    Raises:
+        ValueError: If a folder has no manifest, is not a shard run or has no recorded column types, or the
+            shards do not make up one complete run.
+
+    Returns:
+        list: (folder, manifest) pairs, in shard order.
+    """
+    shards = []
+    for folder in shard_folders:
+        manifest_path = os.path.join(folder, CNST.OUTPUT_MANIFEST)
+        if not os.path.exists(manifest_path):
+            raise ValueError(f"{folder} has no run manifest, it is not the .xlsx output folder of a shard run.")
+        with open(manifest_path, "r", encoding="utf-8") as fh:
+            run_manifest = json.load(fh)
+        if "shard" not in run_manifest:
+            raise ValueError(f"{folder} is not the output of a shard run.")
+        if "dtypes" not in run_manifest:
+            raise ValueError(f"{folder} has no column types in its manifest, run the shard again to merge it.")
+        shards.append((folder, run_manifest))
+
+    shard_count = shards[0][1]["shard"]["count"]
+    indexes = sorted(run_manifest["shard"]["index"] for _, run_manifest in shards)
+    if any(run_manifest["shard"]["count"] != shard_count for _, run_manifest in shards):
+        raise ValueError("The shard runs were made with different shard counts.")
+    if indexes != list(range(shard_count)):
+        raise ValueError(f"Expected the shards 0 to {shard_count - 1} once each, got {indexes}.")
+    if len({run_manifest["input_kind"] for _, run_manifest in shards}) > 1:
+        raise ValueError("The shard runs mix CSV and text inputs.")
+
+    return sorted(shards, key=lambda shard: shard[1]["shard"]["index"])
+
+
+def read_shard_part(folder, part, dtypes):
+    """
+    Reads the rows of a part file of a shard run as they were before it was written.
+
+    The CSV twin of the .xlsx part is read as text, so empty cells stay empty strings and nothing is
+    re-inferred, and the columns get back the types recorded in the manifest.
+
+    Args:
+        folder (str): The .xlsx output folder of the shard run.
+        part (str): Name of the .xlsx part file.
+        dtypes (dict): Column name to dtype name, see `helper.manifest.write_manifest`.
+
+    Returns:
+        pd.DataFrame: The rows of the part file.
+    """
+    csv_part = os.path.join(os.path.dirname(os.path.normpath(folder)), "csv", os.path.splitext(part)[0] + ".csv")
+    df = pd.read_csv(csv_part, sep="|", dtype=str, keep_default_na=False, na_values=[])
+    for col, dtype in dtypes.items():
+        if col not in df.columns:
+            continue
+        if dtype == "bool":
+            df[col] = df[col].map({"True": True, "False": False})
+        elif dtype.startswith(("int", "uint", "float")):
+            # the missing values of a float column were written as empty cells
+            df[col] = df[col].replace("", "nan").astype(dtype)
+    return df
@@ -0,0 +1,217 @@
+# importing necessary libraries
+
+import os
+import time
+import logging
+import pandas as pd
+
+# inotify is used on Linux when installed, the folder is polled otherwise
+try:
+    from inotify_simple import INotify, flags
+except ImportError:
+    INotify = None
+
+# importing custom modules
+import helper.constants as CNST
+import helper.manifest as manifest
+
+logger = logging.getLogger(__name__)
+
+
+class FolderWatcher:
+    """
+    Reports the note files created or modified in a folder.
+
+    With inotify a file is reported once it is closed after writing or moved into the folder. When
+    polling, a file is reported once its size and modification time stay the same for one poll, so
+    that files still being copied are not read half-written.
+    """
+
+    def __init__(self, folder, extension=".txt"):
+        """
+        Starts watching a folder. The files already in it are reported by the first `changes` call.
+
+        Args:
+            folder (str): The folder to watch.
+            extension (str, optional): Extension of the note files.
+        """
+        self.folder = folder
+        self.extension = extension
+        self.reported = {}
+        self.last_seen = {}
+
+        self.inotify = None
+        if INotify is not None:
+            try:
+                self.inotify = INotify()
+                self.inotify.add_watch(folder, flags.CLOSE_WRITE | flags.MOVED_TO)
+            except OSError as e:
+                logger.info(f"inotify is not available, polling {folder} instead: {e}")
+                self.inotify = None
+        self.pending = set(self.scan()) if self.inotify is not None else set()
+
+    def scan(self):
+        """
+        Lists the note files of the folder with their size and modification time.
+        """
+        snapshot = {}
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(self.extension):
+                    stat = entry.stat()
+                    snapshot[entry.name] = (stat.st_size, stat.st_mtime)
+        return snapshot
+
+    def changes(self, timeout):
+        """
+        Waits up to `timeout` seconds for new or modified note files.
+
+        Args:
+            timeout (float): Seconds to wait.
+
+        Returns:
+            set: Names of the files to (re)process.
+        """
+        if self.inotify is not None:
+            changed, self.pending = self.pending, set()
+            if not changed:
+                for event in self.inotify.read(timeout=int(timeout * 1000)):
+                    if event.name.endswith(self.extension):
+                        changed.add(event.name)
+            return changed
+
+        time.sleep(timeout)
+        snapshot = self.scan()
+        changed = {name for name, stat in snapshot.items()
+                   if stat == self.last_seen.get(name) and stat != self.reported.get(name)}
+        for name in changed:
+            self.reported[name] = snapshot[name]
+        self.last_seen = snapshot
+        return changed
+
+
+class RollingParts:
+    """
+    Output part files of a watch session, filled as annotations arrive.
+
+    Documents are added to the last part until it holds CNST.MAX_DOCS documents, then a new part is
+    started. A document processed again has its rows replaced in the part that holds it, and the parts
+    left without documents are dropped. The notes deleted from the watched folder keep their rows.
+    """
+
+    def __init__(self, output_folder, project_name, input_dir):
+        """
+        Creates the csv/xlsx folders of the session.
+
+        Args:
+            output_folder (str): The timestamped output folder of the session.
+            project_name (str): Project name, used in the part file names.
+            input_dir (str): The watched folder.
+        """
+        self.csv_folder = os.path.join(output_folder, "csv").replace("\\", "/")
+        self.xlsx_folder = os.path.join(output_folder, "xlsx").replace("\\", "/")
+        os.makedirs(self.csv_folder, exist_ok=True)
+        os.makedirs(self.xlsx_folder, exist_ok=True)
+        self.file_prefix = f"{project_name}_{os.path.basename(output_folder)}_text"
+        self.input_dir = input_dir
+
+        self.parts = []  # document ids of every part
+        self.part_rows = []
+        self.doc_part = {}
+        self.current_df = None
+        self.columns = None
+        self.notes_processed = 0
+
+    def part_name(self, part, extension):
+        return f"{self.file_prefix}_part{part + 1}{extension}"
+
+    def load_part(self, part):
+        """
+        Returns the rows of a part, from memory for the last part, from its xlsx file otherwise.
+        """
+        if part == len(self.parts) - 1 and self.current_df is not None:
+            return self.current_df
+        return pd.read_excel(f"{self.xlsx_folder}/{self.part_name(part, '.xlsx')}", keep_default_na=False, na_values=[])
+
+    def write(self, df, doc_ids):
+        """
+        Adds the annotations of a batch of processed documents.
+
+        Args:
+            df (pd.DataFrame): The annotation rows of the batch.
+            doc_ids (list): All the documents of the batch, including those without annotations.
+        """
+        self.notes_processed += len(doc_ids)
+        if not df.empty and self.columns is None:
+            self.columns = list(df.columns)
+
+        touched = {self.doc_part[doc_id] for doc_id in doc_ids if doc_id in self.doc_part}
+        written_parts = len(self.parts)
+        for doc_id in (df[CNST.DOC_ID].unique() if not df.empty else []):
+            if doc_id in self.doc_part:
+                continue
+            if not self.parts or len(self.parts[-1]) >= CNST.MAX_DOCS:
+                self.parts.append([])
+                self.part_rows.append(0)
+                self.current_df = None
+            self.parts[-1].append(doc_id)
+            self.doc_part[doc_id] = len(self.parts) - 1
+            touched.add(len(self.parts) - 1)
+
+        for part in sorted(touched):
+            # the parts started by this batch have no rows yet
+            previous = self.load_part(part) if part < written_parts else None
+            if previous is not None:
+                previous = previous[~previous[CNST.DOC_ID].isin(doc_ids)]
+            new_rows = df[df[CNST.DOC_ID].map(self.doc_part.get) == part] if not df.empty else df
+            part_df = pd.concat([previous, new_rows], ignore_index=True) if previous is not None else new_rows.reset_index(drop=True)
+
+            # A document processed again without annotations leaves its part
+            present = set(part_df[CNST.DOC_ID]) if not part_df.empty else set()
+            for doc_id in [doc_id for doc_id in self.parts[part] if doc_id not in present]:
+                self.parts[part].remove(doc_id)
+                del self.doc_part[doc_id]
+
+            part_df.to_csv(f"{self.csv_folder}/{self.part_name(part, '.csv')}", index=False, sep='|')
+            part_df.to_excel(f"{self.xlsx_folder}/{self.part_name(part, '.xlsx')}", index=False)
+            self.part_rows[part] = len(part_df)
+            if part == len(self.parts) - 1:
+                self.current_df = part_df
+
+        if not all(self.parts):
+            self.drop_empty_parts()
+        self.write_manifest()
+
+    def drop_empty_parts(self):
+        """
+        Removes the part files left without documents and renumbers the parts after them, so that every part
+        of the output holds annotations, as in the output of a run.
+        """
+        if not self.parts[-1]:
+            self.current_df = None
+        kept = []
+        for part, doc_ids in enumerate(self.parts):
+            for extension, folder in ((".csv", self.csv_folder), (".xlsx", self.xlsx_folder)):
+                path = f"{folder}/{self.part_name(part, extension)}"
+                if not doc_ids:
+                    os.remove(path)
+                elif part != len(kept):
+                    os.replace(path, f"{folder}/{self.part_name(len(kept), extension)}")
+            if doc_ids:
+                kept.append(part)
+
+        self.parts = [self.parts[part] for part in kept]
+        self.part_rows = [self.part_rows[part] for part in kept]
+        self.doc_part = {doc_id: part for part, doc_ids in enumerate(self.parts) for doc_id in doc_ids}
+
+    def write_manifest(self):
+        """
+        Updates the manifest of the session with the part files written so far.
+        """
+        parts = {self.part_name(part, ".xlsx"): {"rows": rows, "doc_ids": [str(doc_id) for doc_id in doc_ids]}
+                 for part, (doc_ids, rows) in enumerate(zip(self.parts, self.part_rows))}
+        try:
+            manifest.write_manifest(self.xlsx_folder, "text", self.input_dir, {}, self.columns or CNST.OUTPUT_HEADERS,
+                                    parts, {"notes_processed": self.notes_processed})
+        except Exception as e:
+            logger.error(f"Could not write the run manifest: {e}")
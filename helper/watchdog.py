@@ -0,0 +1,155 @@
+# importing necessary libraries
+
+import time
+import logging
+import traceback
+import multiprocessing
+from collections import deque
+from multiprocessing.connection import wait
+
+# importing custom modules
+import helper.constants as CNST
+import helper.scheduler as scheduler
+
+logger = logging.getLogger(__name__)
+
+
+def guarded_worker(project_path_resources, settings, conn):
+    """
+    Processes notes one at a time in a worker process, sending back each note's rows as soon as it is done.
+
+    The pipeline is loaded and run once on a short text before the worker reports ready, so the time limit
+    of the first note does not include the loading.
+
+    Args:
+        project_path_resources (str): Path to the project resources.
+        settings (dict): Run settings, see `Model.load_settings`.
+        conn (Connection): The worker end of the pipe to the run.
+    """
+    try:
+        scheduler.init_worker(project_path_resources, settings)
+        scheduler.annotate_batch([(0, "warm up", CNST.WATCHDOG_WARM_UP_TEXT)])
+        conn.send(("ready",))
+        while True:
+            task = conn.recv()
+            if task is None:
+                return
+            [(_, rows)] = scheduler.annotate_batch([task])
+            conn.send(("done", rows))
+    except Exception:
+        conn.send(("error", traceback.format_exc()))
+
+
+class GuardedWorkers:
+    """
+    Worker processes that give every note a time limit.
+
+    A note that makes the pipeline hang, e.g. a regex rule backtracking without end, cannot be interrupted
+    inside the process running it. Every worker is given one note at a time and the run waits for its rows
+    at most `doc_time_limit` seconds; past that, the worker is killed, the note is quarantined without
+    annotations and a new worker is started for the next notes.
+    """
+
+    def __init__(self, project_path_resources, settings):
+        """
+        Starts the worker processes, `settings["workers"]` of them and at least one.
+
+        Args:
+            project_path_resources (str): Path to the project resources.
+            settings (dict): Run settings, see `Model.load_settings`.
+        """
+        self.project_path_resources = project_path_resources
+        self.settings = settings
+        self.time_limit = settings["doc_time_limit"]
+        self.quarantined = []
+        self.slots = [self.start_worker() for _ in range(max(1, settings["workers"]))]
+
+    def start_worker(self):
+        parent_conn, child_conn = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=guarded_worker, args=(self.project_path_resources, self.settings, child_conn),
+                                          daemon=True)
+        process.start()
+        child_conn.close()
+        return {"process": process, "conn": parent_conn, "ready": False, "task": None, "deadline": None}
+
+    def stop_worker(self, slot):
+        slot["process"].kill()
+        slot["process"].join()
+        slot["conn"].close()
+
+    def receive(self, slot, done):
+        """
+        Handles a message of a worker.
+
+        Raises:
+            RuntimeError: If the worker failed or stopped.
+        """
+        try:
+            message = slot["conn"].recv()
+        except EOFError:
+            raise RuntimeError("A worker process stopped unexpectedly.")
+        if message[0] == "error":
+            raise RuntimeError(f"A worker process failed: {message[1]}")
+        if message[0] == "done":
+            done[slot["task"][0]] = message[1]
+        slot["ready"], slot["task"], slot["deadline"] = True, None, None
+
+    def rows(self, notes):
+        """
+        Processes notes on the workers, each within the time limit.
+
+        Args:
+            notes (list): (doc_id, note text) of every note.
+
+        Yields:
+            list: The output rows of every note in the order of `notes`, no rows for the quarantined notes.
+        """
+        pending = deque((index, doc_id, text) for index, (doc_id, text) in enumerate(notes))
+        done = {}
+        next_index = 0
+        while next_index < len(notes):
+            for slot in self.slots:
+                if slot["ready"] and slot["task"] is None and pending:
+                    slot["task"] = pending.popleft()
+                    slot["conn"].send(slot["task"])
+                    slot["deadline"] = time.monotonic() + self.time_limit
+
+            deadlines = [slot["deadline"] for slot in self.slots if slot["deadline"] is not None]
+            timeout = max(0, min(deadlines) - time.monotonic()) if deadlines else None
+            for conn in wait([slot["conn"] for slot in self.slots], timeout):
+                self.receive(next(slot for slot in self.slots if slot["conn"] is conn), done)
+
+            now = time.monotonic()
+            for position, slot in enumerate(self.slots):
+                # rows that arrived right at the limit are taken on the next turn
+                if slot["deadline"] is not None and now >= slot["deadline"] and not slot["conn"].poll():
+                    index, doc_id, text = slot["task"]
+                    logger.warning(f"Quarantining the note {doc_id} ({len(text)} characters), still running after {self.time_limit} s")
+                    self.quarantined.append(doc_id)
+                    done[index] = []
+                    self.stop_worker(slot)
+                    self.slots[position] = self.start_worker()
+
+            while next_index in done:
+                yield done.pop(next_index)
+                next_index += 1
+
+    def take_quarantined(self):
+        """
+        Returns the doc names of the notes quarantined since the last call.
+        """
+        quarantined, self.quarantined = self.quarantined, []
+        return quarantined
+
+    def shutdown(self, cancel_futures=False):
+        """
+        Stops the workers, the same way as `ProcessPoolExecutor.shutdown` for the parallel runs.
+        """
+        for slot in self.slots:
+            if slot["task"] is None:
+                try:
+                    slot["conn"].send(None)
+                except OSError:
+                    pass
+                slot["process"].join(CNST.WATCHDOG_SHUTDOWN_SECONDS)
+            self.stop_worker(slot)
@@ -2,27 +2,53 @@
 
 import os
 import sys
+import multiprocessing
 import pandas as pd
 import time
 import re
 import json
 import logging
 import argparse
-#import spacy
+import hashlib
+import itertools
+import weakref
+import shutil
+import srsly
+import spacy
 import medspacy
 from medspacy.sentence_splitting import PyRuSHSentencizer
-from medspacy.section_detection import SectionRule
+from medspacy.section_detection import Section, SectionRule
 from medspacy.section_detection import Sectionizer
 #from clinical_sectionizer import TextSectionizer
 from medspacy.ner import TargetRule
 from medspacy.context import ConText, ConTextRule
 #from medspacy.visualization import visualize_ent
 #from spacy import displacy
-from spacy.tokens import Span
+from spacy.tokens import Doc, Span, DocBin
+from concurrent.futures import ProcessPoolExecutor
 #from google.cloud import bigquery
 
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 import helper.constants as CNST
+import helper.manifest as manifest
+import helper.search_index as search_index
+import helper.offsets as offsets
+from helper.prescreen import ConceptPrescreen
+from helper.entity_buffer import EntityBuffer
+from helper.long_notes import split_note
+import helper.lazy_context  # registers the lazy ConText component
+import helper.scheduler as scheduler
+import helper.sharding as sharding
+import helper.watch as watch
+import helper.packed as packed
+import helper.database as database
+import helper.result_sink as result_sink
+import helper.lexicon as lexicon
+import helper.rule_diff as rule_diff
+import helper.sampling as sampling
+import helper.watchdog as watchdog
+from helper.reader import scan_notes, prefetch_notes
+from helper.sentences import entity_sentences
 
 # Setting up logging
 logging.basicConfig(level=logging.DEBUG,
@@ -36,14 +62,21 @@ class Model:
         """setting logging
         """
         self.logger = logging.getLogger(__name__)
+        # rules loaded in every pipeline, see `update_rules`
+        self.loaded_rules = weakref.WeakKeyDictionary()
+        # pipeline kept between runs, see `warm_pipeline`
+        self.last_pipeline = None
     
-    def load_sections(self,sec_file, the_sectionizer):
-        """Load sections from the provided file and add them to the sectionizer.
+    def read_section_rules(self, sec_file):
+        """Read the section rules of the provided file.
 
         Args:
             sec_file (str): Path to the section file that contains section information.
-            the_sectionizer (object): The sectionizer object where the section rules will be added.
+
+        Returns:
+            list: (key, SectionRule) of every rule, the key being its section id and synonym.
         """
+        section_rules = []
         with open(sec_file, 'r') as fh:
             for line in fh:
                 columns = line.strip().split('\t')
@@ -53,23 +86,36 @@ class Model:
                     continue 
                 entry = {CNST.LITERAL : synonym,
                          CNST.CATEGORY : sec_id}
-                the_sectionizer.add(SectionRule.from_dict(entry)) # load one rule in a dictionary format
+                section_rules.append(((sec_id, synonym), SectionRule.from_dict(entry))) # load one rule in a dictionary format
+        return section_rules
+
+    def load_sections(self,sec_file, the_sectionizer):
+        """Load sections from the provided file and add them to the sectionizer.
+
+        Args:
+            sec_file (str): Path to the section file that contains section information.
+            the_sectionizer (object): The sectionizer object where the section rules will be added.
+
+        Returns:
+            list: (key, SectionRule) of the rules added, see `read_section_rules`.
+        """
+        section_rules = self.read_section_rules(sec_file)
+        for _, rule in section_rules:
+            the_sectionizer.add(rule)
+        return section_rules
 
     def load_lexicon(self,lex_file):
         """Load the inclusion lexicon from the provided file and return it as a pandas DataFrame.
 
         Args:
-            lex_file (str): Path to the lexicon file (Excel format).
+            lex_file (str): Path to the lexicon file (Excel, Parquet, CSV or TSV format), see `helper.lexicon`.
 
         Returns:
             pandas.DataFrame: A cleaned lexicon containing the concepts and their respective categories.
         """
         result = dict()
-        inclusion_lexicon = pd.read_excel(lex_file)
+        inclusion_lexicon = lexicon.read_lexicon(lex_file)
         self.logger.info("Read the concept")
-                
-        inclusion_lexicon = inclusion_lexicon.iloc[:, :5]
-        inclusion_lexicon.columns = CNST.LEXICON_COLS
 
         inclusion_lexicon = inclusion_lexicon[~inclusion_lexicon[CNST.LEXICON_COLS[1]].isnull()]
         inclusion_lexicon = inclusion_lexicon[~inclusion_lexicon[CNST.LEXICON_COLS[2]].isnull()]
@@ -147,197 +193,1086 @@ class Model:
                 rule = TargetRule(literal=term, category=norm, pattern=token_patterns, attributes=id_attr)
         return rule
 
-    def process_notes_on_disk(self,the_pipeline, the_input_path, tho_output_path,project_path_resources, inclusion_concepts, project_path, csv_file_chk, progress_callback=None):
+    def load_settings(self, project_path_resources):
+        """Load the optional run settings of the project, falling back to the defaults for anything not set.
+
+        Args:
+            project_path_resources (str): Path to the project resources.
+
+        Returns:
+            dict: The run settings.
+        """
+        settings = dict(CNST.DEFAULT_SETTINGS)
+        path_of_resource = f"{project_path_resources}/{CNST.RESOURCE_SETTINGS}"
+        if os.path.exists(path_of_resource):
+            try:
+                with open(path_of_resource, 'r', encoding='utf-8') as fh:
+                    settings.update(json.load(fh))
+            except Exception as e:
+                self.logger.error(f"Exception loading the project settings, using the defaults: {e}")
+        return settings
+
+    def extract_entity_rows(self, doc, doc_id, line_starts=None, compact_sentences=False):
+        """Build the output rows of all the entities of a doc.
+
+        The sentence boundaries are collected once per doc and the entities, which are sorted, are assigned to
+        their sentence in a single merge pass, instead of looking up `ent.sent` for every entity.
+
+        Args:
+            doc (Doc): The processed doc.
+            doc_id (str): The document name.
+            line_starts (list, optional): Line start offsets of the note. When given, the Tk line/column
+                coordinates of every entity are added to its row.
+            compact_sentences (bool, optional): Leave the sentence text out, keeping only its offsets.
+
+        Returns:
+            list: One output row (dict) per entity.
+        """
+        rows = []
+        if not doc.ents:
+            return rows
+
+        sentences, ent_sentences = entity_sentences(doc)
+        sent_texts = {}
+
+        for ent, (i, _) in zip(doc.ents, ent_sentences):
+            sent = sentences[i]
+
+            if compact_sentences:
+                sentence = ""
+            else:
+                if i not in sent_texts:
+                    sent_texts[i] = sent.text
+                sentence = sent_texts[i]
+
+            result_entry = {
+                "doc_name": doc_id,
+                "concept": ent.label_,
+                "matched_text": ent.text,
+                "concept_start": ent.start_char,  # is prefered
+                "concept_end": ent.end_char,
+                "sentence": sentence,
+                "sentence_start": sent.start_char,
+                "sentence_end" : sent.end_char,
+                "section_id": "" if pd.isna(ent._.section_category) else ent._.section_category,
+                "matched_section_header" : ent._.section_title,
+                "is_negated": ent._.is_negated,
+                "is_family": ent._.is_family,
+                "is_uncertain": ent._.is_uncertain,
+                "is_historical": ent._.is_historical,
+                "is_hypothetical": ent._.is_hypothetical
+            }
+
+            if line_starts is not None:
+                start_line, start_col = offsets.char_to_line_col(line_starts, ent.start_char)
+                end_line, end_col = offsets.char_to_line_col(line_starts, ent.end_char)
+                result_entry.update({"start_line": start_line, "start_col": start_col,
+                                     "end_line": end_line, "end_col": end_col})
+            rows.append(result_entry)
+        return rows
+
+    def file_fingerprint(self, file_path):
+        """Identify a file by its name, size and modification time.
+
+        Args:
+            file_path (str): Path to the file.
+
+        Returns:
+            list: [file name, size, modification time].
+        """
+        stat = os.stat(file_path)
+        return [os.path.basename(file_path), stat.st_size, int(stat.st_mtime)]
+
+    def stage_cache_file(self, project_path, project_path_resources, fingerprints):
+        """Locate the stage cache of one input shard.
+
+        The cache folder is keyed by the sentence and section rules (and the spaCy/medspacy versions), so any
+        change to them starts a new cache; caches of older rule sets are removed.
+
+        Args:
+            project_path (str): Path to the project.
+            project_path_resources (str): Path to the project resources.
+            fingerprints (list): Fingerprints of the input files making up the shard, see `file_fingerprint`.
+
+        Returns:
+            str: Path of the shard cache file (which may not exist yet).
+        """
+        rules_hash = hashlib.sha1(f"{spacy.__version__}|{medspacy.__version__}".encode("utf-8"))
+        for rule_file in (CNST.RESOURCE_SENTENCE_RULE, CNST.RESOURCE_SECTIONS_RULE):
+            path_of_resource = f"{project_path_resources}/{rule_file}"
+            if os.path.exists(path_of_resource):
+                with open(path_of_resource, 'rb') as fh:
+                    rules_hash.update(fh.read())
+            rules_hash.update(b"|")
+        rules_key = rules_hash.hexdigest()[:16]
+
+        cache_root = os.path.join(project_path, CNST.STAGE_CACHE_DIR).replace("\\", "/")
+        cache_folder = f"{cache_root}/{rules_key}"
+        if not os.path.exists(cache_folder):
+            if os.path.exists(cache_root):
+                for stale in os.listdir(cache_root):
+                    shutil.rmtree(os.path.join(cache_root, stale), ignore_errors=True)
+            os.makedirs(cache_folder, exist_ok=True)
+
+        shard_key = hashlib.sha1(json.dumps(fingerprints).encode("utf-8")).hexdigest()
+        return f"{cache_folder}/{shard_key}.spacy"
+
+    def staged_docs(self, the_pipeline, texts, cache_file):
+        """Yield the docs of a shard after the tokenizer, sentence splitter and sectionizer, from the stage cache
+        when it holds the shard, otherwise running those stages and saving their output to the cache.
+
+        Args:
+            the_pipeline (object): The NLP pipeline.
+            texts (list): The note texts of the shard.
+            cache_file (str): Path of the shard cache file, see `stage_cache_file`.
+
+        Yields:
+            Doc: The docs in the order of `texts`, not yet processed by the concept stages.
+        """
+        sections_file = cache_file + CNST.STAGE_CACHE_SECTIONS_EXT
+        if os.path.exists(cache_file) and os.path.exists(sections_file):
+            doc_bin = DocBin().from_disk(cache_file)
+            all_sections = srsly.read_msgpack(sections_file)
+            if len(doc_bin) == len(texts):
+                for doc, sections in zip(doc_bin.get_docs(the_pipeline.vocab), all_sections):
+                    self.restore_sections(doc, sections)
+                    yield doc
+                return
+            self.logger.info(f"Stage cache {cache_file} does not match its shard, rebuilding it")
+
+        doc_bin = DocBin(store_user_data=False)
+        all_sections = []
+        for text in texts:
+            doc = self.early_doc(the_pipeline, text)
+            doc_bin.add(doc)
+            all_sections.append([section.serialized_representation() for section in doc._.sections])
+            yield doc
+
+        doc_bin.to_disk(cache_file)
+        srsly.write_msgpack(sections_file, all_sections)
+
+    def early_doc(self, the_pipeline, text):
+        """Run only the tokenizer, sentence splitter and sectionizer over a note.
+
+        The stages are called directly rather than through `select_pipes`, which would leave the other stages
+        disabled for the whole pipeline while a caller generator is suspended.
+
+        Args:
+            the_pipeline (object): The NLP pipeline.
+            text (str): The note text.
+
+        Returns:
+            Doc: The doc, not yet processed by the concept stages.
+        """
+        doc = the_pipeline.make_doc(text)
+        for _, component in the_pipeline.pipeline[:the_pipeline.pipe_names.index(CNST.STAGE_CACHE_SPLIT)]:
+            doc = component(doc)
+        return doc
+
+    def section_filter(self, settings):
+        """Build the test of the sections the concepts are searched in, from the include_sections and
+        exclude_sections settings. The text before the first header of a note is the section "".
+
+        Args:
+            settings (dict): Run settings, see `load_settings`.
+
+        Returns:
+            function or None: Tells whether a section category is searched, None when every section is.
+        """
+        include = set(settings["include_sections"])
+        exclude = set(settings["exclude_sections"])
+        if not include and not exclude:
+            return None
+        return lambda category: (not include or (category or "") in include) and (category or "") not in exclude
+
+    def chunk_sections(self, doc, mid_line=False):
+        """List the sections of a doc that start with a header.
+
+        Args:
+            doc (Doc): The doc of a note or of a chunk of a long note.
+            mid_line (bool, optional): The chunk was cut in the middle of a line. Headers must start a line,
+                so a header found at the start of such a chunk is not one.
+
+        Returns:
+            list: The sections, in text order.
+        """
+        return [section for section in doc._.sections
+                if section.category is not None and not (mid_line and section.title_start == 0)]
+
+    def annotate_sections(self, doc, concept_stages, section_filter, offset=0, carried_section=("", ""), mid_line=False):
+        """Run the concept stages (target matcher and ConText) only over the sections kept by the section filter.
+
+        Every kept section is copied into its own doc, so the text of the other sections is never matched.
+
+        Args:
+            doc (Doc): The doc after the early stages, see `early_doc`.
+            concept_stages (list): The (name, component) concept stages of the pipeline.
+            section_filter (function): Tells whether a section category is searched, see `section_filter`.
+            offset (int, optional): Offset of the doc in its note, for the chunks of a long note.
+            carried_section (tuple, optional): (category, header) of the section the text before the first
+                header continues, for the chunks of a long note.
+            mid_line (bool, optional): The doc is a chunk cut in the middle of a line, see `chunk_sections`.
+
+        Yields:
+            tuple: (offset of the section in the note, processed Doc of the section, (category, header)).
+        """
+        sections = self.chunk_sections(doc, mid_line)
+        bounds = [section.title_start for section in sections] + [len(doc)]
+        parts = []
+        if bounds[0] > 0:
+            parts.append((0, bounds[0], carried_section))
+        for section, end in zip(sections, bounds[1:]):
+            parts.append((section.title_start, end, (section.category, doc[section.title_start:section.title_end].text)))
+
+        for start, end, section in parts:
+            if not section_filter(section[0]):
+                continue
+            span = doc[start:end]
+            section_doc = span.as_doc()
+            for _, component in concept_stages:
+                section_doc = component(section_doc)
+            yield offset + span.start_char, section_doc, section
+
+    def restore_sections(self, doc, sections):
+        """Restore the sections found by the sectionizer on a doc loaded from the stage cache.
+
+        Args:
+            doc (Doc): The doc loaded from the cache.
+            sections (list): The serialized sections of the doc.
+        """
+        doc._.sections = []
+        for section in sections:
+            rule = SectionRule.from_dict(section["rule"]) if section["rule"] else None
+            section = Section(section["category"], section["title_start"], section["title_end"],
+                              section["body_start"], section["body_end"], section["parent"], rule)
+            doc._.sections.append(section)
+            for token in doc[section.title_start:section.body_end]:
+                token._.section = section
+
+    def annotate_notes(self, the_pipeline, texts, prescreen=None, cache_file=None, long_note_chars=0, section_filter=None):
+        """Run the NLP pipeline over the notes of a shard.
+
+        Args:
+            the_pipeline (object): The NLP pipeline.
+            texts (list): The note texts.
+            prescreen (ConceptPrescreen, optional): Drops the notes that cannot match any concept.
+            cache_file (str, optional): Stage cache file of the shard. When given, only the concept stages
+                (target matcher and ConText) run on docs found in the cache, and the pre-screen is applied
+                between the cached and the concept stages.
+            long_note_chars (int, optional): Notes longer than this are processed in chunks, see
+                `annotate_long_note`. Long notes are not stage cached. 0 disables the long-note mode.
+            section_filter (function, optional): Searches the concepts only in the kept sections, see
+                `annotate_sections`.
+
+        Yields:
+            Doc, generator or None: The processed doc of every note, a generator of (offset, Doc, section)
+                pieces for the long notes and the section-scoped notes, None for the notes dropped by the
+                pre-screen.
+        """
+        is_long = [long_note_chars > 0 and len(text) > long_note_chars for text in texts]
+        concept_stages = the_pipeline.pipeline[the_pipeline.pipe_names.index(CNST.STAGE_CACHE_SPLIT):]
+
+        is_skipped = [prescreen is not None and not prescreen.may_match(text) for text in texts]
+
+        staged = None
+        plain_docs = None
+        if cache_file is not None:
+            staged = self.staged_docs(the_pipeline, [text for text, long in zip(texts, is_long) if not long], cache_file)
+        elif section_filter is None:
+            # The notes needing the whole pipeline go through nlp.pipe, which streams them in order
+            plain_docs = the_pipeline.pipe(text for text, long, skip in zip(texts, is_long, is_skipped) if not long and not skip)
+
+        for text, long, skip in zip(texts, is_long, is_skipped):
+            if long:
+                yield None if skip else self.annotate_long_note(the_pipeline, text, long_note_chars, section_filter)
+                continue
+
+            if staged is not None:
+                # The cached stages run for every short note so that the whole shard gets cached
+                doc = next(staged)
+            elif skip:
+                yield None
+                continue
+            elif plain_docs is not None:
+                yield next(plain_docs)
+                continue
+            else:
+                doc = self.early_doc(the_pipeline, text)
+
+            if skip:
+                yield None
+            elif section_filter is not None:
+                yield self.annotate_sections(doc, concept_stages, section_filter)
+            else:
+                for _, component in concept_stages:
+                    doc = component(doc)
+                yield doc
+
+        if staged is not None:
+            # Running the generator to its end saves the cache
+            next(staged, None)
+
+    def annotate_long_note(self, the_pipeline, text, max_chars, section_filter=None):
+        """Run the NLP pipeline over a long note chunk by chunk, so that only one chunk is held in memory.
+
+        Args:
+            the_pipeline (object): The NLP pipeline.
+            text (str): The note text.
+            max_chars (int): Maximum chunk length, see `helper.long_notes.split_note`.
+            section_filter (function, optional): Searches the concepts only in the kept sections, see
+                `annotate_sections`.
+
+        Yields:
+            tuple: (offset in the note, processed Doc, section) pieces. The section is None for whole chunks,
+                whose sections are read from the doc, or the (category, header) of a section-scoped piece.
+        """
+        chunks = split_note(text, max_chars)
+        self.logger.info(f"Processing a note of {len(text)} characters in {len(chunks)} chunks")
+        if section_filter is None:
+            for (start, _), doc in zip(chunks, the_pipeline.pipe(chunk for _, chunk in chunks)):
+                yield start, doc, None
+            return
+
+        concept_stages = the_pipeline.pipeline[the_pipeline.pipe_names.index(CNST.STAGE_CACHE_SPLIT):]
+        carried_section = ("", "")
+        for start, chunk in chunks:
+            doc = self.early_doc(the_pipeline, chunk)
+            mid_line = start > 0 and text[start - 1] != "\n"
+            yield from self.annotate_sections(doc, concept_stages, section_filter, start, carried_section, mid_line)
+
+            sections = self.chunk_sections(doc, mid_line)
+            if sections:
+                carried_section = (sections[-1].category, doc[sections[-1].title_start:sections[-1].title_end].text)
+
+    def extract_chunked_rows(self, chunks, doc_id, note_text, line_starts=None, compact_sentences=False):
+        """Build the output rows of a note processed in pieces, with the offsets remapped to the whole note.
+
+        For the chunks of a long note, the text before the first section header of a chunk continues the last
+        section of the previous chunk, so its entities are given that section.
+
+        Args:
+            chunks (generator): (offset, Doc, section) pieces of the note, see `annotate_long_note` and
+                `annotate_sections`.
+            doc_id (str): The document name.
+            note_text (str): The note text.
+            line_starts (list, optional): Line start offsets of the whole note, see `extract_entity_rows`.
+            compact_sentences (bool, optional): Leave the sentence text out, keeping only its offsets.
+
+        Returns:
+            list: One output row (dict) per entity.
+        """
+        rows = []
+        carried_section = ("", "")
+        for chunk_start, doc, section in chunks:
+            if section is None:
+                mid_line = chunk_start > 0 and note_text[chunk_start - 1] != "\n"
+                sections = self.chunk_sections(doc, mid_line)
+                first_header = doc[sections[0].title_start].idx if sections else len(doc.text)
+
+            for row in self.extract_entity_rows(doc, doc_id, None, compact_sentences):
+                if section is not None:
+                    row["section_id"], row["matched_section_header"] = section
+                elif row["concept_start"] < first_header:
+                    row["section_id"], row["matched_section_header"] = carried_section
+                for col in ("concept_start", "concept_end", "sentence_start", "sentence_end"):
+                    row[col] += chunk_start
+
+                if line_starts is not None:
+                    start_line, start_col = offsets.char_to_line_col(line_starts, row["concept_start"])
+                    end_line, end_col = offsets.char_to_line_col(line_starts, row["concept_end"])
+                    row.update({"start_line": start_line, "start_col": start_col,
+                                "end_line": end_line, "end_col": end_col})
+                rows.append(row)
+
+            if section is None and sections:
+                carried_section = (sections[-1].category, doc[sections[-1].title_start:sections[-1].title_end].text)
+        return rows
+
+    def note_rows(self, doc, doc_id, note_text, settings):
+        """Build the output rows of one processed note.
+
+        Args:
+            doc (Doc or generator): The processed doc, or the pieces of a long or section-scoped note, see
+                `annotate_notes`.
+            doc_id (str): The document name.
+            note_text (str): The note text.
+            settings (dict): Run settings, see `load_settings`.
+
+        Returns:
+            list: One output row (dict) per entity.
+        """
+        line_starts = offsets.line_starts(note_text) if settings["emit_offsets"] else None
+        if isinstance(doc, Doc):
+            return self.extract_entity_rows(doc, doc_id, line_starts, settings["compact_sentences"])
+        return self.extract_chunked_rows(doc, doc_id, note_text, line_starts, settings["compact_sentences"])
+
+    def annotated_rows(self, the_pipeline, notes, prescreen, cache_file, settings, section_filter, executor=None):
+        """Process the notes of a shard and build their output rows.
+
+        On a worker pool, the notes are submitted when this is called and their rows collected as the returned
+        iterator is read, so that the next shard can be queued while the rows of a shard are collected, see
+        `shard_rows`.
+
+        Args:
+            the_pipeline (object): The NLP pipeline.
+            notes (list): (doc_id, note text) of every note.
+            prescreen (ConceptPrescreen): Drops the notes that cannot match any concept, or None.
+            cache_file (str): Stage cache file of the shard, or None, see `annotate_notes`.
+            settings (dict): Run settings, see `load_settings`.
+            section_filter (function): Searches the concepts only in the kept sections, or None.
+            executor (ProcessPoolExecutor or GuardedWorkers, optional): Worker pool, see `start_workers`. When
+                given, the notes are processed on the workers and the stage cache is not used.
+
+        Returns:
+            iterator: The output rows (list) of every note in the order of `notes`, None for the notes dropped
+                by the pre-screen. The notes quarantined by the time limit have no rows.
+        """
+        if executor is None:
+            return self.pipeline_rows(the_pipeline, notes, prescreen, cache_file, settings, section_filter)
+
+        # The pre-screen is cheap, the dropped notes are not sent to the workers
+        kept = [prescreen is None or prescreen.may_match(text) for _, text in notes]
+        kept_notes = [note for note, keep in zip(notes, kept) if keep]
+        if isinstance(executor, watchdog.GuardedWorkers):
+            rows = executor.rows(kept_notes)
+        else:
+            rows = scheduler.scheduled_rows(executor, kept_notes, settings["batch_chars"])
+        return scheduler.prescreened_rows(kept, rows)
+
+    def pipeline_rows(self, the_pipeline, notes, prescreen, cache_file, settings, section_filter):
+        """Process the notes of a shard in this process, see `annotated_rows`.
+
+        Yields:
+            list or None: The output rows of every note in the order of `notes`, None for the notes dropped
+                by the pre-screen.
+        """
+        docs = self.annotate_notes(the_pipeline, [text for _, text in notes], prescreen, cache_file,
+                                   settings["long_note_chars"], section_filter)
+        # The generator comes first in zip so that it runs to its end and saves the cache
+        for doc, (doc_id, text) in zip(docs, notes):
+            yield None if doc is None else self.note_rows(doc, doc_id, text, settings)
+
+    def shard_rows(self, shards, annotate, executor=None):
+        """Pair the shards of a run with their output rows.
+
+        On a worker pool, the next shard is submitted before the rows of a shard are collected: the workers
+        that finish the batches of a shard take those of the next one, instead of waiting for the last, longest
+        batches of the shard to be done.
+
+        Args:
+            shards (iterable): The shards of the run, read one ahead on a worker pool.
+            annotate (function): Returns the output rows of a shard, see `annotated_rows`.
+            executor (ProcessPoolExecutor or GuardedWorkers, optional): Worker pool, see `start_workers`.
+
+        Yields:
+            tuple: (shard, output rows of its notes).
+        """
+        pending = None
+        for shard in shards:
+            rows = annotate(shard)
+            if executor is None:
+                yield shard, rows
+                continue
+            if pending is not None:
+                yield pending
+            pending = (shard, rows)
+        if pending is not None:
+            yield pending
+
+    def start_workers(self, project_path_resources, settings):
+        """Start the worker processes of a parallel run, each loading its own NLP pipeline.
+
+        With a per-note time limit (the settings' doc_time_limit), the notes always go to worker processes,
+        which can be killed when a note runs over it, see `helper.watchdog.GuardedWorkers`.
+
+        Args:
+            project_path_resources (str): Path to the project resources.
+            settings (dict): Run settings, see `load_settings`.
+
+        Returns:
+            ProcessPoolExecutor, GuardedWorkers or None: The worker pool, None when the run is not parallel
+                and has no time limit.
+        """
+        if settings["workers"] <= 1 and settings["doc_time_limit"] <= 0:
+            return None
+        if settings["stage_cache"]:
+            self.logger.info("The stage cache is not used by runs on worker processes")
+        if settings["doc_time_limit"] > 0:
+            self.logger.info(f"Starting {max(1, settings['workers'])} worker processes with a limit of {settings['doc_time_limit']} s per note")
+            return watchdog.GuardedWorkers(project_path_resources, settings)
+        self.logger.info(f"Starting {settings['workers']} worker processes")
+        return ProcessPoolExecutor(max_workers=settings["workers"], initializer=scheduler.init_worker,
+                                   initargs=(project_path_resources, settings))
+
+    def report_progress(self, files_processed, total, progress_callback=None):
+        """
+        Reports the progress of a run every tenth of the notes.
+
+        Args:
+            files_processed (int): Number of notes processed so far.
+            total (int): Number of notes of the run.
+            progress_callback (function, optional): Callback function to update the progress.
+        """
+        if total > 0:
+            divisor = max(1, total // 10)
+
+            if (files_processed % divisor == 0 or files_processed == total) and progress_callback:
+                progress_percent = (files_processed / total) * 100
+                progress_callback(progress_percent, f"{files_processed}/{total}")
+            else:
+                self.logger.info(f"Processed : {(files_processed / total) * 100}% of files")
+        else:
+            self.logger.info("No files to process.")
+
+    def process_notes_on_disk(self,the_pipeline, the_input_path, tho_output_path,project_path_resources, inclusion_concepts, project_path, csv_file_chk, progress_callback=None, settings=None, executor=None, sample=None):
         """Process notes stored on disk, either in CSV or text files, and extract entities using the NLP pipeline.
 
         Args:
             the_pipeline (object): The NLP pipeline used to process the notes.
-            the_input_path (str): Path to the input directory containing the notes.
+            the_input_path (str): Path to the input directory containing the notes, as CSV files, text files or
+                packed corpora (see `pack_input`), which are used when present. It can also be a SQLite database
+                holding the notes in the settings' db_table, see `helper.database.DatabaseSource`.
             tho_output_path (str): Path to the output directory where results will be saved.
             project_path_resources (str): Path to the project resources.
             inclusion_concepts (pandas.DataFrame): DataFrame containing the inclusion concepts for entity extraction.
             project_path (str): Path to the project.
             csv_file_chk (bool): Flag to indicate whether CSV files are being processed.
             progress_callback (function, optional): Callback function to update the progress. Defaults to None.
+            settings (dict, optional): Run settings, see `load_settings`. Defaults to CNST.DEFAULT_SETTINGS.
+            executor (ProcessPoolExecutor, optional): Worker pool of a parallel run, see `start_workers`.
+            sample (set, optional): Doc names of the notes of a sample run, see `sample_run`. Only these notes
+                are processed and no output is written.
 
         Raises:
             ValueError: If no CSV files are found in the directory.
         
         Returns:
-            str: The path to the folder containing the output files.
+            str: The path to the folder containing the output files, or (annotation rows, run report) for a
+                sample run.
         """
         self.logger.info("In process notes on disk")
         self.logger.info(f"the_input_path, tho_output_path,project_path_resources,  inclusion_concepts, project_path, {the_input_path}, {tho_output_path},{project_path_resources},  {inclusion_concepts}, {project_path}\n")
 
+        if settings is None:
+            settings = dict(CNST.DEFAULT_SETTINGS)
+
         the_input_path = the_input_path.replace("\\", "/")
         tho_output_path = tho_output_path.replace("\\", "/")
         project_path_resources = project_path_resources.replace("\\", "/")
 
-        results=[]
+        results = EntityBuffer()
+        processed_docs = []
         file_flag = ""
         files_processed = 0
-        if csv_file_chk:
+
+        # Dropping the notes that cannot match any concept before they reach the pipeline
+        prescreen = None
+        notes_skipped = 0
+        if settings["prescreen"] and inclusion_concepts is not None:
+            prescreen = ConceptPrescreen(inclusion_concepts)
+
+        # Searching the concepts only in the sections the project is interested in
+        section_filter = self.section_filter(settings)
+
+        # A shard run only processes the documents whose name hashes to its shard
+        shard = None
+        if settings["shard_count"] > 1:
+            if not 0 <= settings["shard_index"] < settings["shard_count"]:
+                raise ValueError(f"The shard index must be between 0 and {settings['shard_count'] - 1}.")
+            shard = {"index": settings["shard_index"], "count": settings["shard_count"]}
+            self.logger.info(f"Processing the shard {shard['index']} of {shard['count']}")
+        in_shard = lambda doc_name: shard is None or sharding.shard_of(doc_name, shard["count"]) == shard["index"]
+        in_run = lambda doc_name: in_shard(doc_name) and (sample is None or doc_name in sample)
+        # The pipeline time of a sample run is measured apart from the reading of the input
+        timer = sampling.PipelineTimer()
+
+        packs = packed.pack_files(the_input_path)
+        if packs:
+            corpora = [packed.PackedCorpus(pack_path) for pack_path in packs]
+            try:
+                if len({corpus.kind for corpus in corpora}) > 1:
+                    raise ValueError("The packed corpora of the input folder mix CSV and text inputs.")
+                file_flag = corpora[0].kind
+                self.logger.info(f"Processing the packed corpus input...")
+
+                selected = [[position for position in range(len(corpus)) if in_run(corpus.doc_name(position))] for corpus in corpora]
+                total_notes = sum(len(positions) for positions in selected)
+
+                def packed_shards():
+                    for pack_path, corpus, positions in zip(packs, corpora, selected):
+                        self.logger.info(f"Processing the file: {pack_path}")
+                        # The notes are processed in shards like the text files, each shard is one unit of the stage cache
+                        for shard_start in range(0, len(positions), CNST.TXT_SHARD_FILES):
+                            notes = []
+                            for position in positions[shard_start:shard_start + CNST.TXT_SHARD_FILES]:
+                                note_text = corpus.text(position)
+                                # the notes of a CSV export are skipped when blank, the text files only when empty
+                                if note_text if file_flag == "text" else note_text.strip():
+                                    notes.append((position, note_text))
+
+                            cache_file = None
+                            if settings["stage_cache"] and executor is None:
+                                fingerprints = [self.file_fingerprint(pack_path), shard_start, settings["long_note_chars"],
+                                                settings["shard_index"], settings["shard_count"]]
+                                cache_file = self.stage_cache_file(project_path, project_path_resources, fingerprints)
+                            yield corpus, notes, cache_file
+
+                annotate = lambda shard: timer.timed(self.annotated_rows(the_pipeline, [(shard[0].doc_name(position), note_text) for position, note_text in shard[1]],
+                                                                         prescreen, shard[2], settings, section_filter, executor))
+                for (corpus, notes, _), note_rows in self.shard_rows(packed_shards(), annotate, executor):
+                    for rows, (position, note_text) in zip(note_rows, notes):
+                        if rows is None:
+                            notes_skipped += 1
+                        else:
+                            results.add_rows(rows, corpus.metadata(position) if file_flag == "csv" else None)
+                        processed_docs.append(corpus.doc_name(position))
+                        files_processed += 1
+                        self.report_progress(files_processed, total_notes, progress_callback)
+            finally:
+                # the corpora are closed once the run is done with their shards, or when a note fails
+                for corpus in corpora:
+                    corpus.close()
+
+        elif database.is_database(the_input_path):
+            # The notes of a database keep their extra columns, like the notes of a CSV export
+            file_flag = "csv"
+            self.logger.info(f"Processing the notes of the table {settings['db_table']} of {the_input_path}...")
+            source = database.DatabaseSource(database.sqlite_connect(the_input_path), settings["db_table"], settings["db_key"])
+            try:
+                # a sample run only reads the notes of the sample
+                total_rows = source.count() if sample is None else len(sample)
+                rows_read = 0
+
+                def page_shards():
+                    for page in source.pages(sample):
+                        notes = [(doc_name, note_text, metadata) for doc_name, note_text, metadata in page
+                                 if isinstance(note_text, str) and note_text.strip() != "" and in_run(doc_name)]
+                        yield len(page), notes
+
+                # Each page is one batch of the pipeline, the stage cache is not used as the table cannot be fingerprinted cheaply
+                annotate = lambda shard: timer.timed(self.annotated_rows(the_pipeline, [(doc_name, note_text) for doc_name, note_text, _ in shard[1]],
+                                                                         prescreen, None, settings, section_filter, executor))
+                for (page_rows, notes), note_rows in self.shard_rows(page_shards(), annotate, executor):
+                    rows_read += page_rows
+                    for rows, (doc_name, note_text, metadata) in zip(note_rows, notes):
+                        if rows is None:
+                            notes_skipped += 1
+                        else:
+                            results.add_rows(rows, metadata)
+                        processed_docs.append(doc_name)
+                        files_processed += 1
+                    if total_rows > 0 and progress_callback:
+                        progress_callback((rows_read / total_rows) * 100, f"{rows_read}/{total_rows}")
+            finally:
+                source.close()
+        elif csv_file_chk:
             file_flag = "csv"
             csv_files = [f for f in os.listdir(the_input_path) if f.endswith('.csv')]
             if not csv_files:
                 raise ValueError("No CSV files found in the directory.")
             self.logger.info(f"Processing the CSV file input...")
 
-            total_texts = sum(len(pd.read_csv(os.path.join(the_input_path, file))) for file in csv_files)
-            
-            for csv_file in csv_files:
-                csv_path = os.path.join(the_input_path, csv_file)
-                csv_path = os.path.normpath(csv_path)
-                self.logger.info(f"Processing the file: {csv_path}")
-                input_csv_file = pd.read_csv(csv_path)
+            if shard is None and sample is None:
+                total_texts = sum(len(pd.read_csv(os.path.join(the_input_path, file))) for file in csv_files)
+            else:
+                total_texts = sum(sum(1 for doc_name in pd.read_csv(os.path.join(the_input_path, file), usecols=["doc_name"])["doc_name"] if in_run(doc_name))
+                                  for file in csv_files)
+
+            def csv_shards():
+                for csv_file in csv_files:
+                    csv_path = os.path.join(the_input_path, csv_file)
+                    csv_path = os.path.normpath(csv_path)
+                    self.logger.info(f"Processing the file: {csv_path}")
+                    input_csv_file = pd.read_csv(csv_path)
+
+                    # making sure that the required columns exist
+                    if 'doc_name' not in input_csv_file.columns or 'note_text' not in input_csv_file.columns:
+                        raise ValueError("CSV file must contain 'doc_name' and 'note_text' columns.")
+
+                    # getting the last remaining columns
+                    end_columns = input_csv_file.loc[:, input_csv_file.columns[input_csv_file.columns.get_loc("note_text") + 1:]].columns.tolist()
+
+                    # skipping the empty notes and the notes of the other shards, before going through the rows
+                    kept = [isinstance(note_text, str) and note_text.strip() != "" and in_run(doc_name)
+                            for doc_name, note_text in zip(input_csv_file["doc_name"], input_csv_file["note_text"])]
+                    notes = [(row, row["note_text"]) for idx, row in input_csv_file.loc[kept].iterrows()]
+
+                    # Each CSV file is one shard of the stage cache
+                    cache_file = None
+                    if settings["stage_cache"] and executor is None:
+                        # the long notes are left out of the cache and a shard run only caches its own notes,
+                        # so the threshold and the shard are part of the shard key
+                        fingerprints = [self.file_fingerprint(csv_path), settings["long_note_chars"],
+                                        settings["shard_index"], settings["shard_count"]]
+                        cache_file = self.stage_cache_file(project_path, project_path_resources, fingerprints)
+                    yield notes, end_columns, cache_file
+
+            # Initiating the text processing through the NLP pipeline
+            annotate = lambda shard: timer.timed(self.annotated_rows(the_pipeline, [(row["doc_name"], note_text) for row, note_text in shard[0]],
+                                                                     prescreen, shard[2], settings, section_filter, executor))
+            for (notes, end_columns, _), note_rows in self.shard_rows(csv_shards(), annotate, executor):
+                for rows, (row, note_text) in zip(note_rows, notes):
+                    if rows is None:
+                        notes_skipped += 1
+                    else:
+                        # extracting the processed annotations
+                        # the extra columns are stored once per document and joined when writing the output
+                        results.add_rows(rows, {el: row[el] for el in end_columns})
 
-                # making sure that the required columns exist
-                if 'doc_name' not in input_csv_file.columns or 'note_text' not in input_csv_file.columns:
-                    raise ValueError("CSV file must contain 'doc_name' and 'note_text' columns.")
+                    processed_docs.append(row["doc_name"])
+                    files_processed += 1
+                    self.report_progress(files_processed, total_texts, progress_callback)
+        else:
+            file_flag = "text"
+            self.logger.info(f"Processing the Text files input...")
+            txt_files = [f for f in scan_notes(the_input_path) if in_run(f)]
+            total_files = len(txt_files)
+
+            # The files are read on a thread pool while the previous shard goes through the pipeline
+            reader = prefetch_notes(the_input_path, txt_files)
+
+            def text_shards():
+                # The text files are read and processed in shards, each shard is one unit of the stage cache
+                for shard_start in range(0, total_files, CNST.TXT_SHARD_FILES):
+                    shard_files = txt_files[shard_start:shard_start + CNST.TXT_SHARD_FILES]
+
+                    notes = []
+                    for f, note_txt, error in itertools.islice(reader, len(shard_files)):
+                        if error is not None:
+                            self.logger.error(f"The program was not able to process the following file:{f} with errror: {error}")
+                            continue
+
+                        if not note_txt:
+                            #print(f + ' has empty text!')
+                            continue
+                        notes.append((f, note_txt))
+
+                    cache_file = None
+                    if settings["stage_cache"] and executor is None:
+                        fingerprints = [self.file_fingerprint(os.path.join(the_input_path, f)) for f in shard_files]
+                        fingerprints.append(settings["long_note_chars"])
+                        cache_file = self.stage_cache_file(project_path, project_path_resources, fingerprints)
+                    yield notes, cache_file
+
+            annotate = lambda shard: timer.timed(self.annotated_rows(the_pipeline, shard[0], prescreen, shard[1], settings, section_filter, executor))
+            for (notes, _), note_rows in self.shard_rows(text_shards(), annotate, executor):
+                for rows, (f, note_txt) in zip(note_rows, notes):
+                    if rows is None:
+                        notes_skipped += 1
+                    else:
+                        results.add_rows(rows)
+                    processed_docs.append(f)
+                    files_processed += 1
+                    self.report_progress(files_processed, total_files, progress_callback)
+
+        run_report = {"notes_processed": files_processed}
+        if prescreen is not None:
+            run_report["notes_skipped_by_prescreen"] = notes_skipped
+            self.logger.info(f"Keyword pre-screen skipped {notes_skipped} of {files_processed} notes")
+        if isinstance(executor, watchdog.GuardedWorkers):
+            run_report["notes_timed_out"] = executor.take_quarantined()
+            if run_report["notes_timed_out"]:
+                self.logger.warning(f"{len(run_report['notes_timed_out'])} notes ran over the time limit and were quarantined")
+
+        df = results.to_dataframe()
+        if sample is not None:
+            run_report["pipeline_seconds"] = timer.seconds
+            return df, run_report
+        if settings["result_db"]:
+            result_sink.write_results(settings["result_db"], df, processed_docs)
+        # A shard without annotations still writes its manifest, so that the merge knows it was run
+        if df.empty and shard is None:
+            return "EMPTY"
+        if packs:
+            input_files = manifest.snapshot_input_files(the_input_path, CNST.PACKED_CORPUS_EXT)
+        elif database.is_database(the_input_path):
+            input_files = {}
+        else:
+            input_files = manifest.snapshot_input_files(the_input_path, ".csv") if csv_file_chk else {}
+        return self.write_output(df, tho_output_path, project_path, file_flag, the_input_path, input_files, run_report, shard)
 
-                # getting the last remaining columns
-                end_columns = input_csv_file.loc[:, input_csv_file.columns[input_csv_file.columns.get_loc("note_text") + 1:]].columns.tolist()
+    def write_output(self, df, tho_output_path, project_path, file_flag, the_input_path, input_files, run_report, shard=None):
+        """Write the annotations of a run as part files of CSV.MAX_DOCS documents, with its search index and manifest.
 
-                for idx, row in input_csv_file.iterrows():
-                    doc_id = row["doc_name"]
-                    note_text = row["note_text"]
+        Args:
+            df (pd.DataFrame): All the annotation rows of the run.
+            tho_output_path (str): Path to the output directory, the files are written in a timestamped folder.
+            project_path (str): Path to the project.
+            file_flag (str): Either 'csv' or 'text', the kind of input.
+            the_input_path (str): Path to the input directory.
+            input_files (dict): Snapshot of the input files, see `helper.manifest.snapshot_input_files`.
+            run_report (dict): Run statistics.
+            shard (dict, optional): 'index' and 'count' of a shard run, which tags the part file names.
 
-                    # skipping the empty notes
-                    if not isinstance(note_text, str) or note_text.strip() == "":
-                        continue
-                    
-                    # Initiating the text processing through the NLP pipeline
-                    doc = the_pipeline(note_text)
-
-                    # extracting the processed annotations
-                    for ent in doc.ents:
-                        result_entry = {
-                            "doc_name": doc_id,
-                            "concept": ent.label_,
-                            "matched_text": ent.text,
-                            "concept_start": ent.start_char,  # is prefered
-                            "concept_end": ent.end_char,
-                            "sentence": ent.sent.text,
-                            "sentence_start": ent.sent.start_char,
-                            "sentence_end" : ent.sent.end_char,
-                            "section_id": "" if pd.isna(ent._.section_category) else ent._.section_category,
-                            "matched_section_header" : ent._.section_title,
-                            "is_negated": ent._.is_negated,
-                            "is_family": ent._.is_family,
-                            "is_uncertain": ent._.is_uncertain,
-                            "is_historical": ent._.is_historical,
-                            "is_hypothetical": ent._.is_hypothetical
-                        }
-
-                        for el in end_columns:
-                            result_entry.update({el: row[el]})
-
-                        results.append(result_entry)
+        Returns:
+            str: The path to the folder containing the .xlsx output files.
+        """
+        project_name = os.path.basename(project_path)
+        name_flag = file_flag
+        if shard is not None:
+            name_flag = f"{file_flag}_{sharding.shard_tag(shard['index'], shard['count'])}"
+
+        # Get the current date and time
+        current_datetime = time.localtime()
+
+        # Format the current date and time as desired
+        formatted_datetime = time.strftime("%Y-%m-%d_%H-%M-%S", current_datetime)
+        timestamped_output_folder = f"{tho_output_path}/{formatted_datetime}"
+        csv_folder = os.path.join(timestamped_output_folder, 'csv').replace("\\", "/")
+        xlsx_folder = os.path.join(timestamped_output_folder, 'xlsx').replace("\\", "/")
+        os.makedirs(csv_folder, exist_ok=True)
+        os.makedirs(xlsx_folder, exist_ok=True)
+
+        output_files = []
+        manifest_parts = {}
+        unique_doc_ids = df[CNST.DOC_ID].unique() if not df.empty else []
+
+        for i in range(0, len(unique_doc_ids), CNST.MAX_DOCS):
+            doc_id_chunk = unique_doc_ids[i:i + CNST.MAX_DOCS]
+            chunk_df = df[df[CNST.DOC_ID].isin(doc_id_chunk)]
+
+            output_file_name_csv = f"{project_name}_{formatted_datetime}_{name_flag}_part{i//CNST.MAX_DOCS+1}.csv"
+            output_file_name_excel = f"{project_name}_{formatted_datetime}_{name_flag}_part{i//CNST.MAX_DOCS+1}.xlsx"
+
+            chunk_df.to_csv(f"{csv_folder}/{output_file_name_csv}", index=False, sep='|')
+            chunk_df.to_excel(f"{xlsx_folder}/{output_file_name_excel}", index=False)
+            output_files.append(os.path.join(xlsx_folder, output_file_name_excel))
+            manifest_parts[output_file_name_excel] = {"rows": len(chunk_df),
+                                                      "doc_ids": [str(doc_id) for doc_id in doc_id_chunk]}
+
+        # Indexing the annotations of the whole run so the viewer can filter across part files
+        try:
+            if not df.empty:
+                search_index.build_search_index(df, xlsx_folder)
+        except Exception as e:
+            self.logger.error(f"Could not build the search index: {e}")
 
-                    files_processed += 1
-                    if total_texts > 0:
-                        divisor = max(1, total_texts // 10)
+        # Writing a small manifest so the viewer can validate the output without re-reading every part file
+        try:
+            manifest.write_manifest(xlsx_folder, file_flag, the_input_path, input_files, df.columns,
+                                    manifest_parts, run_report, shard,
+                                    {str(col): str(dtype) for col, dtype in df.dtypes.items()})
+        except Exception as e:
+            self.logger.error(f"Could not write the run manifest: {e}")
 
-                        if (files_processed % divisor == 0 or files_processed == total_texts) and progress_callback:
-                            progress_percent = (files_processed / total_texts) * 100
-                            progress_callback(progress_percent, f"{files_processed}/{total_texts}")
-                        else:
-                            self.logger.info(f"Processed : {(files_processed / total_texts) * 100}% of files")
-                    else:
-                        self.logger.info("No files to process.")
-        else:
-            file_flag = "text"
-            self.logger.info(f"Processing the Text files input...")
-            files = os.listdir(the_input_path)
+        # The notes quarantined by the time limit are listed apart to be run again, e.g. with a larger limit
+        if run_report.get("notes_timed_out"):
+            with open(os.path.join(xlsx_folder, CNST.RETRY_LIST_FILE), "w", encoding="utf-8") as fh:
+                fh.writelines(f"{doc_id}\n" for doc_id in run_report["notes_timed_out"])
 
-            total_files = 0
-            for f in files:
-                if f.endswith('.txt'):
-                    total_files = total_files + 1
-        
-            for f in files:
-                if not f.endswith('.txt'):
+        return xlsx_folder
+
+    def merge_shards(self, shard_folders, tho_output_path, project_path):
+        """Merge the outputs of the shard runs of one corpus into the output of a single run.
+
+        The documents keep the order of their shard run, shard after shard, and the part files are numbered
+        across the whole corpus. The rows are read from the CSV parts with the column types recorded in the
+        manifests, so the merged output is written the same as the output of a single run.
+
+        Args:
+            shard_folders (list): The .xlsx output folders of the shard runs, see `helper.sharding`.
+            tho_output_path (str): Path to the output directory of the merged run.
+            project_path (str): Path to the project.
+
+        Raises:
+            ValueError: If the shard runs do not make up one complete run.
+
+        Returns:
+            str: The path to the folder containing the merged .xlsx output files, or "EMPTY".
+        """
+        shards = sharding.load_shard_manifests(shard_folders)
+
+        frames = []
+        input_files = {}
+        run_report = {}
+        for folder, run_manifest in shards:
+            self.logger.info(f"Merging the shard {run_manifest['shard']['index']} from {folder}")
+            for part in run_manifest["parts"]:
+                frames.append(sharding.read_shard_part(folder, part, run_manifest["dtypes"]))
+            input_files.update(run_manifest["input_files"])
+            for key, value in run_manifest["report"].items():
+                # the counts add up and the lists of notes (e.g. notes_timed_out) are joined
+                run_report[key] = run_report[key] + value if key in run_report else value
+
+        if not frames:
+            return "EMPTY"
+        df = pd.concat(frames, ignore_index=True)
+        first_manifest = shards[0][1]
+        return self.write_output(df, tho_output_path.replace("\\", "/"), project_path, first_manifest["input_kind"],
+                                 first_manifest["input_dir"], input_files, run_report)
+
+    def pack_input(self, input_dir, pack_path, csv_file_chk):
+        """
+        Packs the notes of an input folder into one packed corpus file, see `helper.packed`.
+
+        A folder holding packed corpora is processed from them, which avoids opening every note file.
+
+        Args:
+            input_dir (str): The folder of the notes.
+            pack_path (str): The packed corpus file to write, its name gets the CNST.PACKED_CORPUS_EXT extension.
+            csv_file_chk (bool): Whether the notes are in CSV files.
+
+        Returns:
+            str: The path of the packed corpus.
+        """
+        if not pack_path.endswith(CNST.PACKED_CORPUS_EXT):
+            pack_path += CNST.PACKED_CORPUS_EXT
+        pack_path = pack_path.replace("\\", "/")
+        note_count = packed.pack_folder(input_dir, pack_path, csv_file_chk)
+        self.logger.info(f"Packed {note_count} notes of {input_dir} into {pack_path}")
+        return pack_path
+
+    def watch_folder(self, input_dir, output_dir, project_path_resources, project_path, settings=None, stop_event=None):
+        """Watch a folder and annotate the text notes dropped or modified in it, on a warm pipeline, until stopped.
+
+        The notes already in the folder are processed first. Changes are gathered in micro-batches of up to
+        CNST.WATCH_BATCH_SECONDS and their annotations are appended to rolling part files in a timestamped folder
+        of the output directory, see `helper.watch.RollingParts`.
+
+        Args:
+            input_dir (str): The folder to watch.
+            output_dir (str): The directory to save the output files.
+            project_path_resources (str): Path to the project resources.
+            project_path (str): Path to the project.
+            settings (dict, optional): Run settings. Defaults to the project settings, see `load_settings`.
+            stop_event (threading.Event, optional): Stops watching when set. Otherwise runs until interrupted.
+
+        Returns:
+            str: The path to the folder containing the .xlsx output files.
+        """
+        if settings is None:
+            settings = self.load_settings(project_path_resources)
+        input_dir = input_dir.replace("\\", "/")
+        output_dir = output_dir.replace("\\", "/")
+
+        the_pipeline, inclusion_lexicon = self.init_nlp_pipeline(project_path_resources, settings)
+        prescreen = ConceptPrescreen(inclusion_lexicon) if settings["prescreen"] and inclusion_lexicon is not None else None
+        section_filter = self.section_filter(settings)
+
+        formatted_datetime = time.strftime("%Y-%m-%d_%H-%M-%S", time.localtime())
+        output_folder = f"{output_dir}/{formatted_datetime}"
+        rolling = watch.RollingParts(output_folder, os.path.basename(project_path), input_dir)
+        watcher = watch.FolderWatcher(input_dir)
+        self.logger.info(f"Watching {input_dir} ({'inotify' if watcher.inotify is not None else 'polling'}), writing to {output_folder}")
+
+        try:
+            while stop_event is None or not stop_event.is_set():
+                batch = watcher.changes(CNST.WATCH_POLL_SECONDS)
+                if not batch:
                     continue
-                note_txt = None
+                deadline = time.monotonic() + CNST.WATCH_BATCH_SECONDS
+                while len(batch) < CNST.WATCH_BATCH_FILES and time.monotonic() < deadline:
+                    batch |= watcher.changes(min(CNST.WATCH_POLL_SECONDS, max(0, deadline - time.monotonic())))
 
-                with open(os.path.join(the_input_path, f),  'r', encoding='utf-8') as fh:
+                notes = []
+                for f in sorted(batch):
                     try:
-                        note_txt = fh.read()
+                        with open(os.path.join(input_dir, f), 'r', encoding='utf-8') as fh:
+                            note_txt = fh.read()
                     except Exception as e:
                         self.logger.error(f"The program was not able to process the following file:{f} with errror: {e}")
                         continue
-                
-                if not note_txt:
-                    #print(f + ' has empty text!')
-                    continue
-                doc = the_pipeline(note_txt)
-                for ent in doc.ents:
-                    
-                    results.append({"doc_name": f,
-                                    "concept":ent.label_,
-                                    "matched_text": ent.text,
-                                    "concept_start": ent.start_char,
-                                    "concept_end": ent.end_char,
-                                    "sentence": ent.sent.text,
-                                    "sentence_start": ent.sent.start_char,
-                                    "sentence_end" : ent.sent.end_char,
-                                    "section_id": "" if pd.isna(ent._.section_category) else ent._.section_category,
-                                    "matched_section_header" : ent._.section_title,
-                                    "is_negated": ent._.is_negated,
-                                    "is_family": ent._.is_family,
-                                    "is_uncertain": ent._.is_uncertain,
-                                    "is_historical": ent._.is_historical,
-                                    "is_hypothetical": ent._.is_hypothetical})
-                files_processed += 1
-
-                if total_files > 0:
-                    divisor = max(1, total_files // 10)
-
-                    if (files_processed % divisor == 0 or files_processed == total_files) and progress_callback:
-                        progress_percent = (files_processed / total_files) * 100
-                        progress_callback(progress_percent, f"{files_processed}/{total_files}")
-                    else:
-                        self.logger.info(f"Processed : {(files_processed / total_files) * 100}% of files")
-                else:
-                    self.logger.info("No files to process.")
-
-                
-                
-        df = pd.DataFrame(results)
-        if df.empty:
-            return "EMPTY"
+                    notes.append((f, note_txt))
+
+                results = EntityBuffer()
+                for rows in self.annotated_rows(the_pipeline, [note for note in notes if note[1]], prescreen, None, settings, section_filter):
+                    if rows:
+                        results.add_rows(rows)
+                rolling.write(results.to_dataframe(), [f for f, _ in notes])
+                self.logger.info(f"Annotated {len(notes)} new or modified notes, {len(results)} entities")
+        except KeyboardInterrupt:
+            pass
+
+        return rolling.xlsx_folder
+
+    def input_inventory(self, the_input_path, csv_file_chk, settings):
+        """List the notes of an input with their length, without running them through the pipeline.
+
+        The notes are those `process_notes_on_disk` would process, in the shard of a shard run. Their stratum is
+        the value of the settings' sample_stratify column, which the text notes do not have.
+
+        Args:
+            the_input_path (str): Path to the input directory or database, see `process_notes_on_disk`.
+            csv_file_chk (bool): Flag to indicate whether CSV files are being processed.
+            settings (dict): Run settings, see `load_settings`.
+
+        Returns:
+            list: (doc_name, characters, stratum) of every note.
+        """
+        stratum_col = settings["sample_stratify"] or None
+        inventory = []
+        packs = packed.pack_files(the_input_path)
+        if packs:
+            for pack_path in packs:
+                with packed.PackedCorpus(pack_path) as corpus:
+                    # the size is in bytes, close enough to the length to weigh the notes
+                    inventory.extend((corpus.doc_name(position), corpus.size(position),
+                                      corpus.metadata(position).get(stratum_col) if stratum_col and corpus.metadata(position) else None)
+                                     for position in range(len(corpus)) if corpus.size(position) > 0)
+        elif database.is_database(the_input_path):
+            source = database.DatabaseSource(database.sqlite_connect(the_input_path), settings["db_table"], settings["db_key"])
+            try:
+                inventory = source.inventory(stratum_col)
+            finally:
+                source.close()
+        elif csv_file_chk:
+            for csv_file in [f for f in os.listdir(the_input_path) if f.endswith('.csv')]:
+                columns = ["doc_name", "note_text"] + ([stratum_col] if stratum_col else [])
+                notes = pd.read_csv(os.path.join(the_input_path, csv_file), usecols=columns)
+                for row in notes.itertuples(index=False):
+                    if isinstance(row.note_text, str) and row.note_text.strip() != "":
+                        inventory.append((row.doc_name, len(row.note_text), getattr(row, stratum_col) if stratum_col else None))
         else:
+            if stratum_col:
+                self.logger.warning(f"The text notes have no {stratum_col} column, drawing a simple random sample")
+            inventory = [(f, os.path.getsize(os.path.join(the_input_path, f)), None) for f in scan_notes(the_input_path)]
+            inventory = [note for note in inventory if note[1] > 0]
 
-            project_name = os.path.basename(project_path)
-            
-            # Get the current date and time
-            current_datetime = time.localtime()
-            
-            # Format the current date and time as desired
-            formatted_datetime = time.strftime("%Y-%m-%d_%H-%M-%S", current_datetime)
-            timestamped_output_folder = f"{tho_output_path}/{formatted_datetime}"
-            csv_folder = os.path.join(timestamped_output_folder, 'csv').replace("\\", "/")
-            xlsx_folder = os.path.join(timestamped_output_folder, 'xlsx').replace("\\", "/")
-            os.makedirs(csv_folder, exist_ok=True)
-            os.makedirs(xlsx_folder, exist_ok=True)
-
-            output_files = []
-            unique_doc_ids = df[CNST.DOC_ID].unique()
-            
-            for i in range(0, len(unique_doc_ids), CNST.MAX_DOCS):
-                doc_id_chunk = unique_doc_ids[i:i + CNST.MAX_DOCS]
-                chunk_df = df[df[CNST.DOC_ID].isin(doc_id_chunk)]
-                
-                output_file_name_csv = f"{project_name}_{formatted_datetime}_{file_flag}_part{i//CNST.MAX_DOCS+1}.csv"
-                output_file_name_excel = f"{project_name}_{formatted_datetime}_{file_flag}_part{i//CNST.MAX_DOCS+1}.xlsx"
-                
-                chunk_df.to_csv(f"{csv_folder}/{output_file_name_csv}", index=False, sep='|')
-                chunk_df.to_excel(f"{xlsx_folder}/{output_file_name_excel}", index=False)
-                output_files.append(os.path.join(xlsx_folder, output_file_name_excel))
-            
-            return xlsx_folder
+        if settings["shard_count"] > 1:
+            inventory = [note for note in inventory if sharding.shard_of(note[0], settings["shard_count"]) == settings["shard_index"]]
+        return inventory
+
+    def sample_run(self, the_pipeline, the_input_path, project_path_resources, inclusion_concepts, project_path, csv_file_chk, progress_callback=None, settings=None, executor=None):
+        """Process a reproducible sample of the input and project the yield and runtime of the full run.
 
-    def perform_nlp(self,input_dir, output_dir, project_path_resources, project_path, input_mode, csv_file_chk, progress_callback=None):
+        The sample is drawn from the settings' sample_notes (or sample_percent), sample_seed and sample_stratify,
+        see `helper.sampling.choose_sample`. Only the sampled notes are read where the input allows it (text files,
+        packed corpora and databases) and only the pipeline time is projected. Nothing is written: the stage cache
+        and the result database are not used, and no output folder is created.
+
+        Args:
+            the_pipeline (object): The NLP pipeline.
+            the_input_path (str): Path to the input directory or database, see `process_notes_on_disk`.
+            project_path_resources (str): Path to the project resources.
+            inclusion_concepts (pandas.DataFrame): The inclusion concepts, see `load_lexicon`.
+            project_path (str): Path to the project.
+            csv_file_chk (bool): Flag to indicate whether CSV files are being processed.
+            progress_callback (function, optional): Callback function to update the progress. Defaults to None.
+            settings (dict, optional): Run settings, see `load_settings`. Defaults to CNST.DEFAULT_SETTINGS.
+            executor (ProcessPoolExecutor, optional): Worker pool of a parallel run, see `start_workers`.
+
+        Returns:
+            dict: The sample statistics and projections, see `helper.sampling.project_run`.
+        """
+        if settings is None:
+            settings = dict(CNST.DEFAULT_SETTINGS)
+        the_input_path = the_input_path.replace("\\", "/")
+
+        inventory = self.input_inventory(the_input_path, csv_file_chk, settings)
+        sample = sampling.choose_sample(inventory, settings["sample_notes"], settings["sample_percent"], settings["sample_seed"])
+        self.logger.info(f"Processing a sample of {len(sample)} of {len(inventory)} notes")
+
+        sample_settings = dict(settings, stage_cache=False, result_db="")
+        df, run_report = self.process_notes_on_disk(the_pipeline, the_input_path, "", project_path_resources, inclusion_concepts,
+                                                    project_path, csv_file_chk, progress_callback, sample_settings, executor, sample)
+        report = sampling.project_run(inventory, sample, df, run_report, run_report.pop("pipeline_seconds"))
+
+        self.logger.info(f"Sample run: {report['entities_per_note']:.2f} entities per note, {report['docs_per_second']:.1f} notes/s, "
+                         f"projected {report['projected_entities']} entities in {report['projected_seconds']:.0f} s "
+                         f"and {report['projected_csv_bytes']} bytes of CSV output")
+        return report
+
+    def perform_nlp(self,input_dir, output_dir, project_path_resources, project_path, input_mode, csv_file_chk, progress_callback=None, settings=None):
         """Performs the NLP pipeline on the input files or directories.
 
         Args:
@@ -348,21 +1283,34 @@ class Model:
             input_mode (str): The mode of input ('files' for processing files).
             csv_file_chk (bool): Flag to check if CSV files should be processed.
             progress_callback (function, optional): Callback function to update the progress. Defaults to None.
+            settings (dict, optional): Run settings. Defaults to the project settings, see `load_settings`.
 
         Returns:
-            str: The path to the output folder containing processed files.
+            str: The path to the output folder containing processed files, or the report of a sample run when
+                the settings ask for one, see `sample_run`.
         """
     
         old_stdout = sys.stdout
         self.logger.info(f"input_dir, output_dir,project_path_resources, project_path, input_mode,{input_dir}, {output_dir},{project_path_resources}, {project_path}, {input_mode}\n")
 
-        nlp, inclusion_lexicon = self.init_nlp_pipeline(project_path_resources)
+        if settings is None:
+            settings = self.load_settings(project_path_resources)
+
+        nlp, inclusion_lexicon = self.warm_pipeline(project_path_resources, settings)
         
         if input_mode == 'files':
             try:
                 self.logger.info("I'm going to files on dist\d")
                 entity_types_to_print = ['RARE_DZ'] # customize for use case!
-                output_file=self.process_notes_on_disk(nlp, input_dir,output_dir, project_path_resources, inclusion_lexicon, project_path, csv_file_chk, progress_callback)  
+                executor = self.start_workers(project_path_resources, settings)
+                try:
+                    if settings["sample_notes"] > 0 or settings["sample_percent"] > 0:
+                        output_file=self.sample_run(nlp, input_dir, project_path_resources, inclusion_lexicon, project_path, csv_file_chk, progress_callback, settings, executor)
+                    else:
+                        output_file=self.process_notes_on_disk(nlp, input_dir,output_dir, project_path_resources, inclusion_lexicon, project_path, csv_file_chk, progress_callback, settings, executor)
+                finally:
+                    if executor is not None:
+                        executor.shutdown(cancel_futures=True)
             
                 self.logger.info("NLP process finished.\n")
                 self.logger.info(f"outputfile {output_file}")
@@ -373,15 +1321,20 @@ class Model:
         else: 
             self.logger.error(f"input_file is not file {input_mode}")
     
-    def init_nlp_pipeline(self, project_path_resources):
+    def init_nlp_pipeline(self, project_path_resources, settings=None):
         """Initializes the NLP pipeline by adding components like tokenizers, sentence splitters, and sectionizers.
 
         Args:
             project_path_resources (str): Path to the project resources containing custom configuration files.
+            settings (dict, optional): Run settings, see `load_settings`. Defaults to CNST.DEFAULT_SETTINGS.
 
         Returns:
             tuple: A tuple containing the initialized NLP pipeline and the inclusion lexicon.
         """
+        # The rules are tracked so that changes to the resource files can be applied in place, see `update_rules`
+        loaded_rules = rule_diff.LoadedRules(rule_diff.file_hash(f"{project_path_resources}/{CNST.RESOURCE_SENTENCE_RULE}"))
+        tracked = True
+
         # Create Pipeline
         nlp = medspacy.load(medspacy_enable=['medspacy_tokenizer']) # add the tokenizer first; should be just symbolic as it's loaded by default.
         self.logger.info("Loaded medspacy tokenizer\n")
@@ -399,12 +1352,13 @@ class Model:
         try:    
             path_of_resource=f"{project_path_resources}/{CNST.RESOURCE_SECTIONS_RULE}"
             
-            sectionizer = nlp.add_pipe('medspacy_sectionizer', config={'rules': None,
-                                                                        'require_start_line': True})
-            self.load_sections(path_of_resource, sectionizer)
+            sectionizer_config = {'rules': None, 'require_start_line': True}
+            sectionizer = nlp.add_pipe('medspacy_sectionizer', config=sectionizer_config)
+            loaded_rules.track('medspacy_sectionizer', self.load_sections(path_of_resource, sectionizer), sectionizer_config)
         except Exception as e:
             self.logger.error(f"Exception adding custom sectionizer: {e}")
             sectionizer = nlp.add_pipe('medspacy_sectionizer') # load the default           
+            tracked = False
     
         concept_matcher = nlp.add_pipe('medspacy_target_matcher') # add an empty matcher
         concept_rules = list()
@@ -413,7 +1367,7 @@ class Model:
         try:
             
             inclusion_lexicon = None
-            path_of_resource = f"{project_path_resources}/{CNST.RESOURCE_CONCEPTS}"
+            path_of_resource = lexicon.find_lexicon(project_path_resources)
 
             inclusion_lexicon = self.load_lexicon(path_of_resource)
 
@@ -422,28 +1376,110 @@ class Model:
             self.logger.error(f"Exception loading concept matcher rules: {e}")
 
         concept_matcher.add(concept_rules) # fill attach the rules to the matcher
+        if inclusion_lexicon is not None and len(concept_rules) == len(inclusion_lexicon):
+            concept_keys = [rule_diff.concept_key(row) for row in inclusion_lexicon.itertuples(index=False, name=None)]
+            loaded_rules.track('medspacy_target_matcher', zip(concept_keys, concept_rules), {})
+        else:
+            tracked = False
 
         #Load general context       
         
-        context_classifier = nlp.add_pipe('medspacy_context', config={"rules": None})  # load the default context component
+        # the lazy component only scans the sentences holding entities for modifiers
+        context_factory = CNST.LAZY_CONTEXT_FACTORY if settings and settings["lazy_context"] else 'medspacy_context'
+        context_classifier = nlp.add_pipe(context_factory, config={"rules": None})  # load the default context component
         try:
             # Attempting to use a custom path for context rules
             path_of_resource = f"{project_path_resources}/{CNST.RESOURCE_CONTEXT_RULES}"
             
             # Loading custom rules from the JSON file
-            rules = ConTextRule.from_json(path_of_resource)
+            context_rules = rule_diff.read_context_rules(path_of_resource)
             # Adding the custom rules to the context classifier
-            context_classifier.add(rules)
+            context_classifier.add([rule for _, rule in context_rules])
+            loaded_rules.track(context_factory, context_rules, {"rules": None})
             
         except Exception as e:
             self.logger.error(f"Exception loading custom context rules: {e}")
             # Fallback to default context rules
             context_classifier = ConText(nlp, rules='default')
+            tracked = False
 
+        if tracked:
+            self.loaded_rules[nlp] = loaded_rules
+        return nlp, inclusion_lexicon
+
+    def update_rules(self, the_pipeline, project_path_resources):
+        """Apply the changes of the concept, section and ConText rule files to a pipeline built by `init_nlp_pipeline`.
+
+        The new rule files are compared to the rules loaded in the pipeline and only the components whose rules
+        changed are replaced (see `helper.rule_diff.replace_component`): an edit of the concepts does not load
+        the sentence splitter, sectionizer and ConText again. The updated pipeline gives the entities of a
+        pipeline built from the new files.
+
+        Args:
+            the_pipeline (object): The NLP pipeline.
+            project_path_resources (str): Path to the project resources.
+
+        Returns:
+            tuple or None: (changes, inclusion lexicon), changes giving the number of rules added and removed per
+                component; None if the pipeline has to be rebuilt, because its sentence rules changed or it was
+                built with default rules.
+        """
+        loaded_rules = self.loaded_rules.get(the_pipeline)
+        if loaded_rules is None:
+            return None
+        if rule_diff.file_hash(f"{project_path_resources}/{CNST.RESOURCE_SENTENCE_RULE}") != loaded_rules.sentence_rules_hash:
+            self.logger.info("The sentence rules changed, the pipeline has to be rebuilt")
+            return None
+
+        inclusion_lexicon = self.load_lexicon(lexicon.find_lexicon(project_path_resources))
+        concept_rules = self.load_concept_rules(inclusion_lexicon)
+        concept_keys = [rule_diff.concept_key(row) for row in inclusion_lexicon.itertuples(index=False, name=None)]
+        new_rules = {
+            'medspacy_sectionizer': self.read_section_rules(f"{project_path_resources}/{CNST.RESOURCE_SECTIONS_RULE}"),
+            'medspacy_target_matcher': list(zip(concept_keys, concept_rules)),
+        }
+        context_name = next(name for name in loaded_rules.keys if name not in new_rules)
+        new_rules[context_name] = rule_diff.read_context_rules(f"{project_path_resources}/{CNST.RESOURCE_CONTEXT_RULES}")
+
+        changes = {}
+        for component_name, keyed_rules in new_rules.items():
+            new_keys = [key for key, _ in keyed_rules]
+            changes[component_name] = rule_diff.rule_changes(loaded_rules.keys[component_name], new_keys)
+            if new_keys != loaded_rules.keys[component_name]:
+                config = loaded_rules.configs[component_name]
+                rule_diff.replace_component(the_pipeline, component_name, config, [rule for _, rule in keyed_rules])
+                loaded_rules.track(component_name, keyed_rules, config)
+        self.logger.info(f"Updated the pipeline rules: {changes}")
+        return changes, inclusion_lexicon
+
+    def warm_pipeline(self, project_path_resources, settings):
+        """Return the pipeline of the previous run updated to the current rule files, or a new pipeline.
+
+        Args:
+            project_path_resources (str): Path to the project resources.
+            settings (dict): Run settings, see `load_settings`.
+
+        Returns:
+            tuple: The NLP pipeline and the inclusion lexicon, as `init_nlp_pipeline`.
+        """
+        key = (project_path_resources, settings["lazy_context"])
+        if self.last_pipeline is not None and self.last_pipeline[0] == key:
+            try:
+                updated = self.update_rules(self.last_pipeline[1], project_path_resources)
+            except Exception as e:
+                self.logger.error(f"Exception updating the pipeline rules, rebuilding it: {e}")
+                updated = None
+            if updated is not None:
+                return self.last_pipeline[1], updated[1]
+
+        nlp, inclusion_lexicon = self.init_nlp_pipeline(project_path_resources, settings)
+        self.last_pipeline = (key, nlp)
         return nlp, inclusion_lexicon
 
 # Example usage of the Model class
 if __name__ == "__main__":
+    # the worker processes of a frozen build run the worker instead of this script
+    multiprocessing.freeze_support()
 
     # argparse to accept command-line arguments
     parser = argparse.ArgumentParser(description="Run the NLP processing with specified directories and project settings.")
@@ -455,18 +1491,93 @@ if __name__ == "__main__":
     parser.add_argument('--project_path', type=str, help="Path to the project directory (default from CNST).")
     parser.add_argument('--input_mode', type=str, default=CNST.INPUT_MODE, choices=['files', 'csv'], help="Input mode (either 'files' or 'csv').")
     parser.add_argument('--csv_file_chk', type=bool, default=True, help="Flag to check for CSV files in input.")
+    parser.add_argument('--emit_offsets', action='store_true', help="Add the Tk line/column coordinates of every entity to the output.")
+    parser.add_argument('--compact_sentences', action='store_true', help="Leave the sentence text out of the output, keeping its offsets.")
+    parser.add_argument('--prescreen', action='store_true', help="Skip the notes that contain no candidate concept term before the NLP pipeline.")
+    parser.add_argument('--stage_cache', action='store_true', help="Reuse the tokenized, sentence-split and sectionized docs of earlier runs when only the concepts changed.")
+    parser.add_argument('--long_note_chars', type=int, help="Process the notes longer than this many characters in chunks (0 disables it).")
+    parser.add_argument('--shard_index', '--shard-index', type=int, help="Index of the shard to process, from 0 to shard_count - 1.")
+    parser.add_argument('--shard_count', '--shard-count', type=int, help="Number of shards the input is split into by a hash of doc_name.")
+    parser.add_argument('--merge', nargs='+', metavar='SHARD_XLSX_DIR', help="Merge the .xlsx output folders of the shard runs into output_dir instead of processing notes.")
+    parser.add_argument('--pack', metavar='PACK_FILE', help="Pack the notes of input_dir into one packed corpus file instead of processing them.")
+    parser.add_argument('--serve', action='store_true', help="Run the local annotation service on a warm pipeline instead of processing a folder.")
+    parser.add_argument('--watch', action='store_true', help="Keep annotating the .txt notes dropped or modified in input_dir instead of processing it once.")
+    parser.add_argument('--port', type=int, default=CNST.SERVICE_PORT, help="Port of the annotation service on localhost.")
+    parser.add_argument('--workers', type=int, help="Number of worker processes, notes are processed in parallel when above 1.")
+    parser.add_argument('--doc_time_limit', type=float, metavar='SECONDS', help="Quarantine the notes still running after this many seconds, processing them on killable worker processes.")
+    parser.add_argument('--lazy_context', action='store_true', help="Run ConText only on the sentences holding entities.")
+    parser.add_argument('--db_table', type=str, help="Table of the notes when input_dir is a SQLite database.")
+    parser.add_argument('--db_key', type=str, help="Unique column of the notes table the database is read in pages by.")
+    parser.add_argument('--result_db', type=str, help="SQLite database to also load the annotations into, replacing those of the same documents.")
+    parser.add_argument('--sample', type=int, metavar='N', help="Process a reproducible sample of N notes and report the projected yield and runtime instead of writing output.")
+    parser.add_argument('--sample_percent', type=float, metavar='X', help="Sample X%% of the notes instead of a number of notes.")
+    parser.add_argument('--sample_seed', type=int, help="Seed of the sample, another seed draws another sample.")
+    parser.add_argument('--sample_stratify', type=str, metavar='COLUMN', help="Draw the sample in proportion to the values of this column of the notes.")
+    parser.add_argument('--include_sections', nargs='+', help="Search the concepts only in these section ids.")
+    parser.add_argument('--exclude_sections', nargs='+', help="Do not search the concepts in these section ids.")
     
     args = parser.parse_args()
 
     model = Model()
-    
-    output_file = model.perform_nlp(args.input_dir,
-                                     args.output_dir, 
-                                     args.project_resources_dir, 
-                                     args.project_path, 
-                                     args.input_mode, 
-                                     args.csv_file_chk)
-    print(output_file)
 
-if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # command-line flags override the project settings
+    settings = model.load_settings(args.project_resources_dir)
+    if args.emit_offsets:
+        settings["emit_offsets"] = True
+    if args.compact_sentences:
+        settings["compact_sentences"] = True
+    if args.prescreen:
+        settings["prescreen"] = True
+    if args.stage_cache:
+        settings["stage_cache"] = True
+    if args.long_note_chars is not None:
+        settings["long_note_chars"] = args.long_note_chars
+    if args.shard_index is not None:
+        settings["shard_index"] = args.shard_index
+    if args.shard_count is not None:
+        settings["shard_count"] = args.shard_count
+    if args.workers is not None:
+        settings["workers"] = args.workers
+    if args.doc_time_limit is not None:
+        settings["doc_time_limit"] = args.doc_time_limit
+    if args.lazy_context:
+        settings["lazy_context"] = True
+    if args.db_table:
+        settings["db_table"] = args.db_table
+    if args.db_key:
+        settings["db_key"] = args.db_key
+    if args.result_db:
+        settings["result_db"] = args.result_db
+    if args.sample is not None:
+        settings["sample_notes"] = args.sample
+    if args.sample_percent is not None:
+        settings["sample_percent"] = args.sample_percent
+    if args.sample_seed is not None:
+        settings["sample_seed"] = args.sample_seed
+    if args.sample_stratify:
+        settings["sample_stratify"] = args.sample_stratify
+    if args.include_sections:
+        settings["include_sections"] = args.include_sections
+    if args.exclude_sections:
+        settings["exclude_sections"] = args.exclude_sections
+    
+    if args.serve:
+        import helper.service as service
+        service.serve(model, args.project_resources_dir, settings, args.port)
+        sys.exit(0)
+
+    if args.watch:
+        output_file = model.watch_folder(args.input_dir, args.output_dir, args.project_resources_dir, args.project_path, settings)
+    elif args.pack:
+        output_file = model.pack_input(args.input_dir, args.pack, args.csv_file_chk)
+    elif args.merge:
+        output_file = model.merge_shards(args.merge, args.output_dir, args.project_path)
+    else:
+        output_file = model.perform_nlp(args.input_dir,
+                                         args.output_dir, 
+                                         args.project_resources_dir, 
+                                         args.project_path, 
+                                         args.input_mode, 
+                                         args.csv_file_chk,
+                                         settings=settings)
+    print(json.dumps(output_file, indent=2) if isinstance(output_file, dict) else output_file)
@@ -0,0 +1,109 @@
+import os
+import sys
+import shutil
+import logging
+
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+# The modules are imported from the root of the repository, like controller.py does
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, REPO_DIR)
+
+import helper.constants as CNST
+import helper.lexicon as lexicon
+from model import Model
+
+TXT_INPUT = os.path.join(REPO_DIR, "notes", "test_input_txt")
+CSV_INPUT = os.path.join(REPO_DIR, "notes", "test_input_csv")
+
+
+@pytest.fixture(scope="session", autouse=True)
+def quiet_logs():
+    # the pipeline components log every token at the DEBUG level
+    logging.disable(logging.INFO)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def user_cache(tmp_path_factory):
+    """Keeps the caches of the user (e.g. the parsed lexicons) out of the real cache folder."""
+    cache_root = str(tmp_path_factory.mktemp("user_cache"))
+    saved = {name: os.environ.get(name) for name in ("LOCALAPPDATA", "XDG_CACHE_HOME")}
+    os.environ["LOCALAPPDATA"] = os.environ["XDG_CACHE_HOME"] = cache_root
+    yield cache_root
+    for name, value in saved.items():
+        if value is None:
+            os.environ.pop(name, None)
+        else:
+            os.environ[name] = value
+
+
+@pytest.fixture(scope="session")
+def model():
+    return Model()
+
+
+@pytest.fixture
+def resources(tmp_path):
+    """A copy of the default project resources, which a test may edit."""
+    folder = tmp_path / "resources"
+    shutil.copytree(os.path.join(REPO_DIR, "resources"), folder)
+    return str(folder).replace("\\", "/")
+
+
+@pytest.fixture
+def settings():
+    return dict(CNST.DEFAULT_SETTINGS)
+
+
+@pytest.fixture(scope="session")
+def notes():
+    """(doc_name, note text) of the sample notes of the repository, text files and CSV rows."""
+    notes = []
+    for file_name in sorted(os.listdir(TXT_INPUT)):
+        with open(os.path.join(TXT_INPUT, file_name), "r", encoding="utf-8") as fh:
+            notes.append((file_name, fh.read()))
+    for csv_file in sorted(os.listdir(CSV_INPUT)):
+        csv_notes = pd.read_csv(os.path.join(CSV_INPUT, csv_file))
+        notes.extend(zip(csv_notes["doc_name"], csv_notes["note_text"]))
+    return notes
+
+
+def comparable(rows):
+    """Output rows with the section header spans as text, as written to the output files."""
+    if rows is None:
+        return None
+    return [{col: value if value is None or isinstance(value, (str, int, float, bool)) else str(value)
+             for col, value in row.items()} for row in rows]
+
+
+def note_rows(model, the_pipeline, notes, settings):
+    """The output rows of notes processed through the pipeline, see `comparable`."""
+    section_filter = model.section_filter(settings)
+    return [comparable(rows) for rows in model.annotated_rows(the_pipeline, notes, None, None, settings, section_filter)]
+
+
+def run_notes(model, input_dir, output_dir, resources, settings, csv_input, the_pipeline=None, executor=None):
+    """Processes an input folder like a run of the application, returning its .xlsx output folder."""
+    if the_pipeline is None:
+        the_pipeline, _ = model.init_nlp_pipeline(resources, settings)
+    inclusion_lexicon = model.load_lexicon(lexicon.find_lexicon(resources))
+    project_path = os.path.dirname(resources)
+    return model.process_notes_on_disk(the_pipeline, str(input_dir), str(output_dir), resources, inclusion_lexicon,
+                                       project_path, csv_input, settings=settings, executor=executor)
+
+
+def output_parts(xlsx_folder):
+    """The CSV text and the .xlsx cell values and types of the part files of a run, in part order."""
+    parts = []
+    for xlsx_file in sorted(f for f in os.listdir(xlsx_folder) if f.endswith(".xlsx")):
+        csv_file = os.path.join(os.path.dirname(xlsx_folder), "csv", xlsx_file[:-5] + ".csv")
+        with open(csv_file, "r", encoding="utf-8") as fh:
+            csv_text = fh.read()
+        sheet = load_workbook(os.path.join(xlsx_folder, xlsx_file), read_only=True).active
+        cells = [[(cell.value, cell.data_type) for cell in row] for row in sheet.iter_rows()]
+        parts.append((csv_text, cells))
+    return parts
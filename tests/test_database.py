@@ -0,0 +1,66 @@
+import sqlite3
+
+import pytest
+
+import helper.constants as CNST
+import helper.database as database
+
+
+@pytest.fixture
+def notes_db(tmp_path):
+    db_path = str(tmp_path / "notes.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE notes (doc_name, note_text, ward)")
+    rows = [(f"doc{i}", f"Note {i} with pain", "A" if i % 3 else "B") for i in range(25)]
+    rows += [("blank", " \t\r\n", "A"), ("spaces", "   ", "B"), ("null", None, "A"), ("number", 12, "A")]
+    conn.executemany("INSERT INTO notes VALUES (?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def test_pages_read_every_note_once(notes_db, monkeypatch):
+    monkeypatch.setattr(CNST, "DB_PAGE_ROWS", 7)
+    source = database.DatabaseSource(database.sqlite_connect(notes_db), "notes", "rowid")
+    try:
+        assert source.count() == 29
+        pages = list(source.pages())
+    finally:
+        source.close()
+    assert [len(page) for page in pages] == [7, 7, 7, 7, 1]
+    assert [note[0] for page in pages for note in page][:3] == ["doc0", "doc1", "doc2"]
+    assert pages[0][0][2] == {"ward": "B"}
+
+
+def test_pages_of_named_notes(notes_db, monkeypatch):
+    monkeypatch.setattr(CNST, "DB_SELECT_ROWS", 3)
+    source = database.DatabaseSource(database.sqlite_connect(notes_db), "notes", "rowid")
+    try:
+        pages = list(source.pages({"doc3", "doc12", "doc7", "doc20", "missing"}))
+    finally:
+        source.close()
+    assert sorted(note[0] for page in pages for note in page) == ["doc12", "doc20", "doc3", "doc7"]
+    assert len(pages) == 2
+
+
+@pytest.mark.parametrize("paramstyle, marks", [("qmark", "?, ?"), ("numeric", ":1, :2"), ("format", "%s, %s"),
+                                               ("named", ":value0, :value1"), ("pyformat", "%(value0)s, %(value1)s")])
+def test_placeholders(paramstyle, marks):
+    source = database.DatabaseSource(None, "notes", "rowid", paramstyle)
+    assert source.placeholders(["a", "b"])[0] == marks
+
+
+def test_inventory_skips_the_notes_a_run_skips(notes_db):
+    source = database.DatabaseSource(database.sqlite_connect(notes_db), "notes", "rowid")
+    try:
+        inventory = source.inventory("ward")
+    finally:
+        source.close()
+    assert [doc_name for doc_name, _, _ in inventory] == [f"doc{i}" for i in range(25)]
+    assert inventory[0] == ("doc0", len("Note 0 with pain"), "B")
+
+
+@pytest.mark.parametrize("table, key", [("notes; DROP TABLE notes", "rowid"), ("notes", "rowid--")])
+def test_identifiers_are_checked(notes_db, table, key):
+    with pytest.raises(ValueError):
+        database.DatabaseSource(database.sqlite_connect(notes_db), table, key)
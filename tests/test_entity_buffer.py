@@ -0,0 +1,58 @@
+import pandas as pd
+import pytest
+
+import helper.constants as CNST
+from helper.entity_buffer import EntityBuffer
+from conftest import CSV_INPUT
+
+
+def buffered(model, the_pipeline, notes, settings, metadata):
+    """The rows of the notes in an EntityBuffer and as plain rows joined with their metadata."""
+    buffer = EntityBuffer()
+    plain = []
+    for rows, note_metadata in zip(model.annotated_rows(the_pipeline, notes, None, None, settings, None), metadata):
+        buffer.add_rows(rows, note_metadata)
+        plain.extend(dict(row, **(note_metadata or {})) for row in rows or [])
+    return buffer, plain
+
+
+@pytest.mark.parametrize("emit_offsets", [False, True])
+def test_buffer_matches_the_plain_rows(model, resources, settings, notes, emit_offsets):
+    settings["emit_offsets"] = emit_offsets
+    the_pipeline, _ = model.init_nlp_pipeline(resources, settings)
+    buffer, plain = buffered(model, the_pipeline, notes, settings, [None] * len(notes))
+
+    expected = pd.DataFrame(plain)
+    expected["matched_section_header"] = [None if header is None else str(header) for header in expected["matched_section_header"]]
+    df = buffer.to_dataframe()
+    pd.testing.assert_frame_equal(df, expected)
+    assert all(df[flag].dtype == bool for flag in CNST.CONTEXT_FLAGS)
+    assert (set(CNST.OUTPUT_OFFSET_HEADERS) <= set(df.columns)) == emit_offsets
+
+
+def test_buffer_joins_the_metadata_of_each_document(model, resources, settings):
+    csv_notes = pd.read_csv(f"{CSV_INPUT}/Synthetic_cases.csv")
+    end_columns = list(csv_notes.columns[csv_notes.columns.get_loc("note_text") + 1:])
+    notes = list(zip(csv_notes["doc_name"], csv_notes["note_text"]))
+    metadata = [{col: row[col] for col in end_columns} for _, row in csv_notes.iterrows()]
+    the_pipeline, _ = model.init_nlp_pipeline(resources, settings)
+    buffer, plain = buffered(model, the_pipeline, notes, settings, metadata)
+
+    expected = pd.DataFrame(plain)
+    expected["matched_section_header"] = [None if header is None else str(header) for header in expected["matched_section_header"]]
+    assert end_columns
+    pd.testing.assert_frame_equal(buffer.to_dataframe(), expected)
+
+
+def test_rows_without_headers_and_empty_buffers():
+    row = {"doc_name": "a.txt", "concept": "Pain", "matched_text": "pain", "concept_start": 0, "concept_end": 4,
+           "sentence": "", "sentence_start": 0, "sentence_end": 10, "section_id": "", "matched_section_header": None,
+           "is_negated": True, "is_family": False, "is_uncertain": False, "is_historical": True, "is_hypothetical": False}
+    buffer = EntityBuffer()
+    assert buffer.to_dataframe().empty
+    buffer.add_rows([])
+    rows = [row, dict(row, concept="Ache", matched_section_header="HISTORY", is_negated=False)]
+    buffer.add_rows(rows)
+
+    pd.testing.assert_frame_equal(buffer.to_dataframe(), pd.DataFrame(rows))
+    assert buffer.to_dataframe()["matched_section_header"].tolist() == [None, "HISTORY"]
@@ -0,0 +1,53 @@
+import json
+import random
+
+import pytest
+
+import helper.constants as CNST
+from conftest import note_rows
+
+# Notes where a modifier closes a sentence with an entity and the next sentence with an entity comes after
+# sentences without any, which lazy ConText leaves out
+CRAFTED_NOTES = [
+    ("seam_negation", "The nerves were examined, no\nThe weather was fine today.\nPain in the left jaw."),
+    ("seam_history", "Trigeminal neuralgia, history of\nShe lives alone.\nNerve pain since then."),
+    ("seam_family", "Pain reported by the patient. Mother has\nNo other complaints noted.\nGanglion involvement is unclear."),
+    ("adjacent", "No pain today. Possible trigeminal neuralgia. Father had nerve pain."),
+    ("no_entities", "Nothing of interest in this note."),
+]
+
+
+
+
+def random_notes(resources, count=150, seed=0):
+    """Notes mixing sentences with entities and ConText modifiers and sentences without entities."""
+    with open(f"{resources}/{CNST.RESOURCE_CONTEXT_RULES}", "r") as fh:
+        literals = [rule["literal"] for rule in json.load(fh)["context_rules"]]
+    terms = ["pain", "nerve", "trigeminal neuralgia", "ganglion"]
+    rng = random.Random(seed)
+    notes = []
+    for i in range(count):
+        sentences = []
+        for _ in range(rng.randint(2, 6)):
+            if rng.random() < 0.5:
+                sentences.append(f"{rng.choice(literals).capitalize()} {rng.choice(terms)} {rng.choice(literals)}")
+            else:
+                sentences.append(f"The room is {rng.choice(literals)}")
+        notes.append((f"random_{i}", rng.choice([". ", ".\n", "\n"]).join(sentences) + "."))
+    return notes
+
+
+@pytest.fixture
+def pipelines(model, resources, settings):
+    eager, _ = model.init_nlp_pipeline(resources, settings)
+    lazy, _ = model.init_nlp_pipeline(resources, dict(settings, lazy_context=True))
+    assert "medspacy_lazy_context" in lazy.pipe_names
+    return eager, lazy
+
+
+def test_lazy_context_flags_match_full_context(model, resources, pipelines, settings, notes):
+    eager, lazy = pipelines
+    all_notes = notes + CRAFTED_NOTES + random_notes(resources)
+    expected = note_rows(model, eager, all_notes, settings)
+    assert sum(len(rows) for rows in expected) > 0
+    assert note_rows(model, lazy, all_notes, settings) == expected
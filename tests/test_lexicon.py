@@ -0,0 +1,55 @@
+import os
+import pickle
+
+import pandas as pd
+
+import helper.constants as CNST
+import helper.lexicon as lexicon
+
+
+def test_cached_lexicon_matches_the_file(resources):
+    lex_file = lexicon.find_lexicon(resources)
+    parsed = lexicon.parse_lexicon(lex_file)
+    pd.testing.assert_frame_equal(lexicon.read_lexicon(lex_file), parsed)
+    assert os.path.exists(lexicon.cache_file_of(lex_file))
+    # read from the cache the second time
+    pd.testing.assert_frame_equal(lexicon.read_lexicon(lex_file), parsed)
+
+
+def test_cache_is_kept_out_of_the_project(resources, user_cache):
+    lex_file = lexicon.find_lexicon(resources)
+    lexicon.read_lexicon(lex_file)
+    assert lexicon.cache_file_of(lex_file).startswith(user_cache)
+    assert sorted(os.listdir(resources)) == sorted(os.listdir(os.path.join(os.path.dirname(__file__), os.pardir, "resources")))
+
+
+def test_edited_lexicon_is_parsed_again(resources):
+    lex_file = lexicon.find_lexicon(resources)
+    lexicon.read_lexicon(lex_file)
+    edited = lexicon.parse_lexicon(lex_file).iloc[:1]
+    edited.to_excel(lex_file, index=False)
+    pd.testing.assert_frame_equal(lexicon.read_lexicon(lex_file), lexicon.parse_lexicon(lex_file))
+    assert len(lexicon.read_lexicon(lex_file)) == 1
+
+
+def test_unusable_cache_falls_back_to_parsing(resources):
+    lex_file = lexicon.find_lexicon(resources)
+    parsed = lexicon.parse_lexicon(lex_file)
+    cache_file = lexicon.cache_file_of(lex_file)
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+
+    stat = os.stat(lex_file)
+    stale = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha1": "", "pandas_version": "0.0",
+             "lexicon": parsed.iloc[:0]}
+    for content in (b"not a pickle", pickle.dumps(stale), pickle.dumps({"lexicon": None})):
+        with open(cache_file, "wb") as fh:
+            fh.write(content)
+        pd.testing.assert_frame_equal(lexicon.read_lexicon(lex_file), parsed)
+
+
+def test_csv_and_tsv_lexicons(resources):
+    parsed = lexicon.parse_lexicon(lexicon.find_lexicon(resources))
+    os.remove(f"{resources}/{CNST.RESOURCE_CONCEPTS}")
+    parsed.to_csv(f"{resources}/concepts.tsv", sep="\t", index=False)
+    assert lexicon.find_lexicon(resources) == f"{resources}/concepts.tsv"
+    pd.testing.assert_frame_equal(lexicon.read_lexicon(lexicon.find_lexicon(resources)), parsed)
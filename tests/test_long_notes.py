@@ -0,0 +1,44 @@
+import pytest
+
+import helper.long_notes as long_notes
+from conftest import note_rows
+
+SECTION_SETTINGS = [{}, {"include_sections": ["history_of_present_illness", "observation_and_plan"]},
+                    {"exclude_sections": ["physical_exam"]}]
+
+
+@pytest.fixture(scope="module")
+def long_note(notes):
+    """The sample text notes as the paragraphs of a single note."""
+    return "long_note", "\n\n".join(text for doc_name, text in notes if doc_name.endswith(".txt"))
+
+
+@pytest.mark.parametrize("max_chars", [50, 300, 1000])
+def test_chunks_cover_the_note(long_note, max_chars):
+    _, text = long_note
+    chunks = long_notes.split_note(text, max_chars)
+    assert "".join(chunk for _, chunk in chunks) == text
+    assert all(len(chunk) <= max_chars for _, chunk in chunks)
+    assert [start for start, _ in chunks] == long_notes.chunk_starts(text, max_chars)
+
+
+@pytest.mark.parametrize("section_settings", SECTION_SETTINGS)
+@pytest.mark.parametrize("max_chars", [300, 1000])
+def test_chunked_note_rows_match_whole_note(model, resources, settings, long_note, max_chars, section_settings):
+    settings.update(section_settings)
+    the_pipeline, _ = model.init_nlp_pipeline(resources, settings)
+    [whole] = note_rows(model, the_pipeline, [long_note], settings)
+    [chunked] = note_rows(model, the_pipeline, [long_note], dict(settings, long_note_chars=max_chars))
+    assert whole
+    assert chunked == whole
+
+
+def test_chunk_offsets_point_into_the_note(model, resources, settings, long_note):
+    # a single line cut at the sentence ends, not at the paragraphs
+    doc_name, text = long_note
+    one_line = (doc_name, " ".join(text.split()))
+    the_pipeline, _ = model.init_nlp_pipeline(resources, settings)
+    [rows] = note_rows(model, the_pipeline, [one_line], dict(settings, long_note_chars=200))
+    assert rows
+    for row in rows:
+        assert one_line[1][row["concept_start"]:row["concept_end"]] == row["matched_text"]
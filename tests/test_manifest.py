@@ -0,0 +1,59 @@
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+import helper.constants as CNST
+import helper.manifest as manifest
+from conftest import CSV_INPUT, TXT_INPUT, run_notes
+
+
+def xlsx_files(xlsx_folder):
+    return sorted(f for f in os.listdir(xlsx_folder) if f.endswith(".xlsx"))
+
+
+@pytest.mark.parametrize("input_dir, csv_input", [(TXT_INPUT, False), (CSV_INPUT, True)])
+def test_manifest_and_streamed_parts_match_the_part_files(model, resources, settings, tmp_path, monkeypatch,
+                                                            input_dir, csv_input):
+    monkeypatch.setattr(CNST, "MAX_DOCS", 2)
+    run = run_notes(model, input_dir, tmp_path / "run", resources, settings, csv_input)
+    run_manifest = manifest.load_manifest(run, xlsx_files(run))
+    assert run_manifest["input_kind"] == ("csv" if csv_input else "text")
+    assert len(xlsx_files(run)) > 1
+
+    for file in xlsx_files(run):
+        part = pd.read_excel(os.path.join(run, file))
+        doc_ids = set(part[CNST.DOC_ID].astype(str))
+        assert run_manifest["columns"] == list(part.columns)
+        assert set(run_manifest["parts"][file]["doc_ids"]) == doc_ids
+        assert run_manifest["parts"][file]["rows"] == len(part)
+        assert manifest.read_xlsx_header_and_doc_ids(os.path.join(run, file)) == (list(part.columns), doc_ids)
+
+
+def test_stale_manifest_is_ignored(model, resources, settings, tmp_path, monkeypatch):
+    monkeypatch.setattr(CNST, "MAX_DOCS", 2)
+    run = run_notes(model, TXT_INPUT, tmp_path / "run", resources, settings, False)
+    files = xlsx_files(run)
+    assert manifest.load_manifest(run, files[1:]) is None
+    assert manifest.load_manifest(run, files + ["other.xlsx"]) is None
+    os.remove(os.path.join(run, CNST.OUTPUT_MANIFEST))
+    assert manifest.load_manifest(run, files) is None
+
+
+def test_input_files_unchanged(model, resources, settings, tmp_path):
+    input_dir = tmp_path / "input"
+    shutil.copytree(CSV_INPUT, input_dir)
+    run = run_notes(model, input_dir, tmp_path / "run", resources, settings, True)
+    run_manifest = manifest.load_manifest(run, xlsx_files(run))
+
+    assert manifest.input_files_unchanged(run_manifest, str(input_dir), ".csv")
+    assert manifest.input_files_unchanged(run_manifest, os.path.join(str(input_dir), "..", "input", ""), ".csv")
+    # the same files in another folder are not the input of the run
+    shutil.copytree(input_dir, tmp_path / "copy", copy_function=shutil.copy2)
+    assert not manifest.input_files_unchanged(run_manifest, str(tmp_path / "copy"), ".csv")
+
+    csv_file = os.path.join(input_dir, os.listdir(input_dir)[0])
+    with open(csv_file, "a", encoding="utf-8") as fh:
+        fh.write("\n")
+    assert not manifest.input_files_unchanged(run_manifest, str(input_dir), ".csv")
@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+import helper.constants as CNST
+import helper.packed as packed
+from conftest import CSV_INPUT, TXT_INPUT, run_notes, output_parts
+
+
+def test_pack_round_trip(tmp_path):
+    notes = [("a.txt", "First note\nwith two lines", None), ("b.txt", "Ünïcödé — note", None),
+             ("a.txt", "A second note named a.txt", None), ("empty.txt", "", None)]
+    pack_path = str(tmp_path / f"notes{CNST.PACKED_CORPUS_EXT}")
+    packed.pack_notes(notes, pack_path, "text")
+
+    with packed.PackedCorpus(pack_path) as corpus:
+        assert corpus.kind == "text"
+        assert len(corpus) == len(notes)
+        assert [(corpus.doc_name(i), corpus.text(i)) for i in range(len(corpus))] == [note[:2] for note in notes]
+        assert corpus.size(1) == len(notes[1][1].encode("utf-8"))
+        # the first note of a name is the one looked up
+        assert corpus.note_text("a.txt") == notes[0][1]
+        assert corpus.note_text("missing.txt") is None
+
+
+def test_closed_corpus_releases_the_file(tmp_path):
+    pack_path = str(tmp_path / f"notes{CNST.PACKED_CORPUS_EXT}")
+    packed.pack_notes([("a.txt", "note", None)], pack_path, "text")
+    corpus = packed.PackedCorpus(pack_path)
+    corpus.close()
+    corpus.close()
+    assert corpus.data.closed and corpus.fh.closed
+    os.remove(pack_path)
+
+
+def test_not_a_corpus(tmp_path):
+    path = tmp_path / f"notes{CNST.PACKED_CORPUS_EXT}"
+    path.write_bytes(b"x" * 64)
+    with pytest.raises(ValueError):
+        packed.PackedCorpus(str(path))
+
+
+@pytest.mark.parametrize("input_dir, csv_input", [(TXT_INPUT, False), (CSV_INPUT, True)])
+def test_packed_input_matches_plain_input(model, resources, settings, tmp_path, input_dir, csv_input):
+    pack_dir = tmp_path / "packed"
+    pack_dir.mkdir()
+    packed.pack_folder(input_dir, str(pack_dir / f"notes{CNST.PACKED_CORPUS_EXT}"), csv_input)
+
+    the_pipeline, _ = model.init_nlp_pipeline(resources, settings)
+    plain = run_notes(model, input_dir, tmp_path / "plain", resources, settings, csv_input, the_pipeline)
+    from_pack = run_notes(model, pack_dir, tmp_path / "from_pack", resources, settings, csv_input, the_pipeline)
+    assert output_parts(from_pack) == output_parts(plain)
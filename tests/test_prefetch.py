@@ -0,0 +1,71 @@
+import os
+import logging
+import threading
+from types import SimpleNamespace
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+import helper.constants as CNST
+import helper.packed as packed
+from helper.annotations import AnnotationViewer
+from conftest import CSV_INPUT, TXT_INPUT, run_notes
+
+
+def headless_viewer(xlsx_folder, notes_dir, csv_file_chk):
+    """An annotation viewer with the state the document preparation and prefetching use, without its widgets."""
+    viewer = AnnotationViewer.__new__(AnnotationViewer)
+    viewer.master = object()
+    viewer.logger = logging.getLogger(AnnotationViewer.__module__)
+    viewer.notes_dir = notes_dir
+    viewer.csv_file_chk = csv_file_chk
+    viewer.packed_notes = [packed.PackedCorpus(pack_path) for pack_path in packed.pack_files(notes_dir)]
+    viewer.annotation_data = pd.concat([pd.read_excel(os.path.join(xlsx_folder, f))
+                                        for f in os.listdir(xlsx_folder) if f.endswith(".xlsx")], ignore_index=True)
+    viewer.search_index_path = None
+    viewer.prefetch_cache = OrderedDict()
+    viewer.prefetch_futures = {}
+    viewer.prefetch_lock = threading.Lock()
+    viewer.prefetch_executor = ThreadPoolExecutor(max_workers=CNST.PREFETCH_WORKERS)
+    viewer.csv_notes = None
+    viewer.csv_notes_lock = threading.Lock()
+    return viewer
+
+
+def assert_same_document(prepared, expected):
+    assert prepared[0] == expected[0]
+    pd.testing.assert_frame_equal(prepared[1], expected[1])
+
+
+@pytest.mark.parametrize("input_dir, csv_input", [(TXT_INPUT, False), (CSV_INPUT, True), ("packed", False)])
+def test_prefetched_documents_match_documents_loaded_on_the_spot(model, resources, settings, tmp_path, monkeypatch,
+                                                                 input_dir, csv_input):
+    if input_dir == "packed":
+        input_dir = str(tmp_path / "packed")
+        os.makedirs(input_dir)
+        packed.pack_folder(TXT_INPUT, os.path.join(input_dir, f"notes{CNST.PACKED_CORPUS_EXT}"), False)
+    monkeypatch.setattr(CNST, "PREFETCH_CACHE_SIZE", 2)
+    run = run_notes(model, input_dir, tmp_path / "run", resources, settings, csv_input)
+    viewer = headless_viewer(run, input_dir, csv_input)
+    doc_names = list(viewer.annotation_data["doc_name"].unique())
+    assert len(doc_names) > CNST.PREFETCH_CACHE_SIZE
+
+    for doc_name in doc_names:
+        viewer.prefetch_document(doc_name)
+    prepared = {doc_name: viewer.get_prepared_document(doc_name) for doc_name in doc_names}
+    assert len(viewer.prefetch_cache) <= CNST.PREFETCH_CACHE_SIZE
+
+    on_the_spot = headless_viewer(run, input_dir, csv_input)
+    for doc_name in doc_names:
+        assert_same_document(prepared[doc_name], on_the_spot.prepare_document(doc_name))
+
+    # closing the viewer waits for the prefetching and closes the corpora
+    viewer.prefetch_document(doc_names[0])
+    corpora = viewer.packed_notes
+    viewer.stop_prefetching(SimpleNamespace(widget=viewer.master))
+    assert all(future.done() for future in viewer.prefetch_futures.values())
+    assert all(corpus.data.closed for corpus in corpora)
+    viewer.prefetch_document(doc_names[-1])
+    on_the_spot.stop_prefetching(SimpleNamespace(widget=on_the_spot.master))
@@ -0,0 +1,65 @@
+import pandas as pd
+import pytest
+
+import helper.lexicon as lexicon
+from helper.prescreen import ConceptPrescreen
+from conftest import run_notes, output_parts
+
+CRAFTED = {
+    "dose.txt": "Took 5mg daily.\n",
+    "illness.txt": "Recovering from a long illness.\n",
+    "nothing.txt": "Seen today, no complaints.\n",
+}
+# a case sensitive term with word boundaries, and a term referring to its own group
+DOSE_ROW = [10, "Dose", r"\bmg\b", "YES", "YES"]
+DOUBLED_ROW = [11, "Doubled", r"\w*(\w)\1ness", "NO", "YES"]
+
+
+def add_rows(resources, rows):
+    lex_file = lexicon.find_lexicon(resources)
+    lex = lexicon.parse_lexicon(lex_file)
+    for row in rows:
+        lex.loc[len(lex)] = row
+    lex.to_excel(lex_file, index=False)
+    return lexicon.parse_lexicon(lex_file)
+
+
+@pytest.fixture
+def note_folder(tmp_path, notes):
+    folder = tmp_path / "notes"
+    folder.mkdir()
+    for doc_name, text in list(CRAFTED.items()) + [note for note in notes if note[0].endswith(".txt")]:
+        (folder / doc_name).write_text(text, encoding="utf-8")
+    return folder
+
+
+@pytest.mark.parametrize("rows", [[DOSE_ROW], [DOUBLED_ROW], [DOSE_ROW, DOUBLED_ROW]])
+def test_prescreened_run_matches_full_run(model, resources, settings, tmp_path, note_folder, rows):
+    add_rows(resources, rows)
+    full = run_notes(model, note_folder, tmp_path / "full", resources, settings, False)
+    screened = run_notes(model, note_folder, tmp_path / "screened", resources, dict(settings, prescreen=True), False)
+    full_parts = output_parts(full)
+    assert output_parts(screened) == full_parts
+    for row in rows:
+        assert f"|{row[1]}|" in full_parts[0][0]
+
+
+def test_terms_screened_on_the_note(resources):
+    prescreen = ConceptPrescreen(add_rows(resources, [DOUBLED_ROW]))
+    assert not prescreen.always_match
+    assert prescreen.may_match(CRAFTED["illness.txt"])
+    assert not prescreen.may_match(CRAFTED["nothing.txt"])
+    assert prescreen.may_match("Pain.") and prescreen.may_match("the trigeminal ganglion")
+
+
+def test_token_bound_terms_let_every_note_through(resources):
+    prescreen = ConceptPrescreen(add_rows(resources, [DOSE_ROW]))
+    assert prescreen.always_match
+    assert prescreen.may_match(CRAFTED["dose.txt"])
+
+
+def test_terms_compiling_only_on_their_own(resources):
+    lex = add_rows(resources, [[12, "Left", "(?P<side>left)", "NO", "YES"], [13, "Right", "(?P<side>right)", "NO", "YES"]])
+    prescreen = ConceptPrescreen(lex)
+    assert not prescreen.always_match
+    assert prescreen.may_match("right knee") and not prescreen.may_match(CRAFTED["nothing.txt"])
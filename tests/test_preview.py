@@ -0,0 +1,132 @@
+import json
+import queue
+import time
+
+import pandas as pd
+import pytest
+
+import helper.constants as CNST
+import helper.lexicon as lexicon
+from helper.preview import RulePreview
+from conftest import comparable, note_rows
+
+TEXT = "ALLERGIES: pain after penicillin.\nHISTORY: Patient has pain and trigeminal neuralgia, no aching.\n"
+
+
+@pytest.fixture
+def preview(model, resources, settings):
+    preview = RulePreview(model, resources, settings)
+    yield preview
+    preview.close()
+    preview.worker.join(timeout=30)
+
+
+def wait_for(preview, kind, text=""):
+    """Returns the first message of the given kind, and containing the text, posted by the preview."""
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            message = preview.results.get(timeout=1)
+        except queue.Empty:
+            continue
+        if message[0] == kind and text in str(message[-1]):
+            return message
+    pytest.fail(f"no {kind} message from the preview")
+
+
+def preview_rows(preview, request_id):
+    preview.submit(request_id, TEXT)
+    message = wait_for(preview, "result")
+    while message[1] != request_id:
+        message = wait_for(preview, "result")
+    return comparable(message[2])
+
+
+def fresh_rows(model, resources, settings):
+    the_pipeline, _ = model.init_nlp_pipeline(resources, settings)
+    return note_rows(model, the_pipeline, [("preview", TEXT)], settings)[0]
+
+
+def add_concept(resources):
+    lex_file = lexicon.find_lexicon(resources)
+    lex = lexicon.parse_lexicon(lex_file)
+    row = pd.DataFrame([[10, "Ache", "aching", "NO", "NO"]], columns=lex.columns).astype(lex.dtypes)
+    pd.concat([lex, row], ignore_index=True).to_excel(lex_file, index=False)
+
+
+def write_file(path, text):
+    with open(path, "w") as fh:
+        fh.write(text)
+
+
+def test_rule_edits_are_applied(preview, model, resources, settings):
+    wait_for(preview, "status", "Pipeline ready")
+    assert preview_rows(preview, 1) == fresh_rows(model, resources, settings)
+
+    add_concept(resources)
+    wait_for(preview, "status", "Rules reloaded: 1 added")
+    # the last text is annotated again with the new rules
+    assert comparable(wait_for(preview, "result")[2]) == fresh_rows(model, resources, settings)
+
+
+def test_unreadable_rules_are_reported(preview, model, resources, settings):
+    wait_for(preview, "status", "Pipeline ready")
+    preview_rows(preview, 1)
+    context_file = f"{resources}/{CNST.RESOURCE_CONTEXT_RULES}"
+    with open(context_file, "r") as fh:
+        context_rules = fh.read()
+
+    write_file(context_file, context_rules[:-10])
+    wait_for(preview, "error", "Could not apply the rule changes")
+    wait_for(preview, "error", "default rules")
+    wait_for(preview, "result")
+
+    write_file(context_file, context_rules)
+    wait_for(preview, "status", "Pipeline rebuilt")
+    assert comparable(wait_for(preview, "result")[2]) == fresh_rows(model, resources, settings)
+
+
+def test_failed_loads_are_retried_when_the_rules_are_saved(model, resources, settings, monkeypatch):
+    init_nlp_pipeline = model.init_nlp_pipeline
+    broken = [True]
+
+    def failing_init(*args):
+        if broken[0]:
+            raise ValueError("broken rules")
+        return init_nlp_pipeline(*args)
+
+    monkeypatch.setattr(model, "init_nlp_pipeline", failing_init)
+    preview = RulePreview(model, resources, settings)
+    try:
+        wait_for(preview, "error", "Could not load the pipeline: broken rules")
+        preview.submit(1, TEXT)
+        # the files that failed are not loaded again on every poll
+        time.sleep(CNST.PREVIEW_RULE_POLL_SECONDS * 3)
+        assert preview.results.empty()
+        assert preview.worker.is_alive()
+
+        broken[0] = False
+        add_concept(resources)
+        wait_for(preview, "status", "Pipeline rebuilt")
+        assert comparable(wait_for(preview, "result")[2]) == fresh_rows(model, resources, settings)
+    finally:
+        preview.close()
+        preview.worker.join(timeout=30)
+
+
+def test_settings_are_reloaded(preview, model, resources, settings):
+    wait_for(preview, "status", "Pipeline ready")
+    preview_rows(preview, 1)
+
+    settings_file = f"{resources}/{CNST.RESOURCE_SETTINGS}"
+    with open(settings_file, "r") as fh:
+        saved = json.load(fh)
+    saved["exclude_sections"] = ["allergies"]
+    write_file(settings_file, json.dumps(saved))
+    wait_for(preview, "status", "Pipeline rebuilt")
+
+    new_settings = model.load_settings(resources)
+    assert preview.settings == new_settings
+    rows = comparable(wait_for(preview, "result")[2])
+    assert rows == fresh_rows(model, resources, new_settings)
+    assert rows != fresh_rows(model, resources, settings)
@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+from helper.reader import prefetch_notes, read_note, scan_notes
+
+
+@pytest.fixture
+def note_folder(tmp_path):
+    """Text notes, one of them not UTF-8, and a folder named like a note."""
+    folder = tmp_path / "notes"
+    folder.mkdir()
+    for i in range(20):
+        with open(folder / f"note_{i}.txt", "w", encoding="utf-8") as fh:
+            fh.write(f"Note {i}: patient has pain. " * i)
+    with open(folder / "latin1.txt", "wb") as fh:
+        fh.write("Douleur à l'épaule.".encode("latin-1"))
+    (folder / "folder.txt").mkdir()
+    return str(folder)
+
+
+def sequential_reads(folder, file_names):
+    return [(name, *read_note(os.path.join(folder, name))) for name in file_names]
+
+
+def comparable(reads):
+    return [(name, text, None if error is None else (type(error), str(error))) for name, text, error in reads]
+
+
+@pytest.mark.parametrize("threads, depth", [(1, 1), (3, 2), (4, 100)])
+def test_prefetched_reads_match_sequential_reads(note_folder, threads, depth):
+    # the files of the folder, a folder and a file that does not exist
+    file_names = scan_notes(note_folder) + ["folder.txt", "missing.txt"]
+    prefetched = list(prefetch_notes(note_folder, file_names, threads, depth))
+    sequential = sequential_reads(note_folder, file_names)
+
+    assert comparable(prefetched) == comparable(sequential)
+    errors = {name for name, _, error in prefetched if error is not None}
+    assert errors == {"latin1.txt", "folder.txt", "missing.txt"}
+
+
+def test_scan_lists_the_note_files(note_folder):
+    file_names = scan_notes(note_folder)
+    assert sorted(file_names) == sorted([f"note_{i}.txt" for i in range(20)] + ["latin1.txt"])
@@ -0,0 +1,63 @@
+import os
+import shutil
+import sqlite3
+
+import pandas as pd
+
+import helper.constants as CNST
+from conftest import TXT_INPUT, run_notes
+
+
+def stored_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return pd.read_sql(f"SELECT * FROM {CNST.RESULT_SINK_TABLE}", conn)
+    finally:
+        conn.close()
+
+
+def run_rows(xlsx_folder):
+    """The rows of the csv parts of a run, in part order."""
+    csv_folder = os.path.join(os.path.dirname(xlsx_folder), "csv")
+    parts = sorted(os.listdir(csv_folder), key=lambda f: int(f.rsplit("part", 1)[1].split(".")[0]))
+    return pd.concat([pd.read_csv(os.path.join(csv_folder, f), sep="|") for f in parts], ignore_index=True)
+
+
+def doc_counts(df):
+    return df.groupby(CNST.DOC_ID).size().to_dict()
+
+
+def test_a_run_again_replaces_its_rows(model, resources, settings, tmp_path):
+    settings["result_db"] = str(tmp_path / "results.db")
+    first = run_notes(model, TXT_INPUT, tmp_path / "first", resources, settings, False)
+    once = stored_rows(settings["result_db"])
+    assert doc_counts(once) == doc_counts(run_rows(first))
+
+    run_notes(model, TXT_INPUT, tmp_path / "second", resources, settings, False)
+    twice = stored_rows(settings["result_db"])
+    assert len(twice) == len(once)
+    assert doc_counts(twice) == doc_counts(once)
+
+
+def test_a_later_run_adds_its_columns(model, resources, settings, tmp_path):
+    settings["result_db"] = str(tmp_path / "results.db")
+    run_notes(model, TXT_INPUT, tmp_path / "first", resources, settings, False)
+    assert not set(CNST.OUTPUT_OFFSET_HEADERS) & set(stored_rows(settings["result_db"]).columns)
+
+    # the second run only holds part of the notes, with the offsets
+    input_dir = tmp_path / "notes"
+    input_dir.mkdir()
+    rerun_note = sorted(os.listdir(TXT_INPUT))[0]
+    shutil.copy(os.path.join(TXT_INPUT, rerun_note), input_dir / rerun_note)
+    settings["emit_offsets"] = True
+    second = run_rows(run_notes(model, input_dir, tmp_path / "second", resources, settings, False))
+
+    stored = stored_rows(settings["result_db"])
+    assert set(CNST.OUTPUT_OFFSET_HEADERS) <= set(stored.columns)
+    rerun = stored[stored[CNST.DOC_ID] == rerun_note]
+    assert len(rerun) == len(second)
+    assert rerun[CNST.OUTPUT_OFFSET_HEADERS].notna().all().all()
+    # the rows of the other notes are kept, without offsets
+    others = stored[stored[CNST.DOC_ID] != rerun_note]
+    assert len(others) > 0
+    assert others[CNST.OUTPUT_OFFSET_HEADERS].isna().all().all()
@@ -0,0 +1,97 @@
+import json
+
+import pandas as pd
+import pytest
+
+import helper.constants as CNST
+import helper.lexicon as lexicon
+from conftest import note_rows
+
+CRAFTED = [
+    ("crafted_1", "HISTORY: Patient has PAIN and trigeminal neuralgia. No pain in the nerves.\n"
+                  "ALLERGIES: none. Denies ganglion pain or aching.\n"),
+    ("crafted_2", "Impression: pain of the ganglion, possible neuralgia. Family history of Pain.\n"),
+]
+
+
+def edit_lexicon(resources, edit):
+    lex_file = lexicon.find_lexicon(resources)
+    edit(lexicon.parse_lexicon(lex_file)).to_excel(lex_file, index=False)
+
+
+def edit_lines(path, edit):
+    with open(path, "r") as fh:
+        lines = fh.read().splitlines()
+    with open(path, "w") as fh:
+        fh.write("\n".join(edit(lines)) + "\n")
+
+
+def edit_context(resources, edit):
+    path = f"{resources}/{CNST.RESOURCE_CONTEXT_RULES}"
+    with open(path, "r") as fh:
+        data = json.load(fh)
+    data["context_rules"] = edit(data["context_rules"])
+    with open(path, "w") as fh:
+        json.dump(data, fh)
+
+
+def concept_row(lex, concept_id, category, term, case_sensitive="NO", regex="NO"):
+    return pd.DataFrame([[concept_id, category, term, case_sensitive, regex]], columns=lex.columns).astype(lex.dtypes)
+
+
+def assert_same_as_fresh(model, the_pipeline, resources, settings, notes):
+    assert model.update_rules(the_pipeline, resources) is not None
+    fresh, _ = model.init_nlp_pipeline(resources, settings)
+    assert note_rows(model, the_pipeline, notes + CRAFTED, settings) == note_rows(model, fresh, notes + CRAFTED, settings)
+
+
+def test_overlapping_concept_added_first(model, resources, settings, notes):
+    the_pipeline, _ = model.init_nlp_pipeline(resources, settings)
+    # the new rules match the same text as the loaded ones: the first rule of the file wins the tie
+    edit_lexicon(resources, lambda lex: pd.concat([concept_row(lex, 10, "Ache", "pain"),
+                                                   concept_row(lex, 11, "Nerve", "nerves?", regex="YES"), lex],
+                                                  ignore_index=True))
+    assert_same_as_fresh(model, the_pipeline, resources, settings, notes)
+
+
+def test_concepts_removed_and_reordered(model, resources, settings, notes):
+    the_pipeline, _ = model.init_nlp_pipeline(resources, settings)
+    edit_lexicon(resources, lambda lex: pd.concat([lex, concept_row(lex, 10, "Ache", "pain")], ignore_index=True))
+    assert_same_as_fresh(model, the_pipeline, resources, settings, notes)
+    edit_lexicon(resources, lambda lex: lex.iloc[[3, 2, 0]].reset_index(drop=True))
+    assert_same_as_fresh(model, the_pipeline, resources, settings, notes)
+
+
+@pytest.mark.parametrize("lazy_context", [False, True])
+def test_section_and_context_rules_edited(model, resources, settings, notes, lazy_context):
+    settings["lazy_context"] = lazy_context
+    the_pipeline, _ = model.init_nlp_pipeline(resources, settings)
+    edit_lines(f"{resources}/{CNST.RESOURCE_SECTIONS_RULE}",
+               lambda lines: [line for line in lines if "ALLERGIES" not in line] + ["impression\tImpression\ttest\t"])
+    edit_context(resources, lambda rules: [{"category": "NEGATED_EXISTENCE", "literal": "denies",
+                                            "direction": "FORWARD"}] + rules[5:] + rules[:2])
+    assert_same_as_fresh(model, the_pipeline, resources, settings, notes)
+
+
+def test_unchanged_files_change_nothing(model, resources, settings):
+    the_pipeline, _ = model.init_nlp_pipeline(resources, settings)
+    changes, _ = model.update_rules(the_pipeline, resources)
+    assert all(change == {"added": 0, "removed": 0} for change in changes.values())
+
+
+def test_only_the_changed_component_is_replaced(model, resources, settings):
+    the_pipeline, _ = model.init_nlp_pipeline(resources, settings)
+    components = dict(the_pipeline.pipeline)
+    edit_lexicon(resources, lambda lex: lex.iloc[:2])
+    changes, _ = model.update_rules(the_pipeline, resources)
+    assert changes["medspacy_target_matcher"] == {"added": 0, "removed": 1}
+    assert the_pipeline.pipe_names == list(components)
+    for name, component in the_pipeline.pipeline:
+        assert (component is components[name]) == (name != "medspacy_target_matcher")
+
+
+def test_sentence_rules_change_forces_a_rebuild(model, resources, settings):
+    the_pipeline, _ = model.init_nlp_pipeline(resources, settings)
+    with open(f"{resources}/{CNST.RESOURCE_SENTENCE_RULE}", "a") as fh:
+        fh.write("\n")
+    assert model.update_rules(the_pipeline, resources) is None
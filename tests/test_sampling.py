@@ -0,0 +1,93 @@
+import os
+import sqlite3
+import random
+
+import pandas as pd
+import pytest
+
+import helper.constants as CNST
+import helper.lexicon as lexicon
+import helper.database as database
+import helper.sampling as sampling
+from conftest import CSV_INPUT, TXT_INPUT
+
+
+def make_inventory(count, strata=None):
+    return [(f"note_{i}.txt", 100 + i, strata[i % len(strata)] if strata else None) for i in range(count)]
+
+
+def test_sample_depends_on_the_names_and_seed_only():
+    inventory = make_inventory(200)
+    sample = sampling.choose_sample(inventory, sample_notes=20, seed=7)
+    shuffled = random.Random(1).sample(inventory, len(inventory))
+    assert len(sample) == 20
+    assert sampling.choose_sample(shuffled, sample_notes=20, seed=7) == sample
+    assert sampling.choose_sample(inventory, sample_notes=20, seed=8) != sample
+    # a larger sample holds the smaller one
+    assert sample < sampling.choose_sample(inventory, sample_percent=25, seed=7)
+
+
+def test_strata_get_their_share_of_the_sample():
+    inventory = make_inventory(90, strata=["A", "A", "B"]) + [("rare.txt", 10, "C")]
+    sample = sampling.choose_sample(inventory, sample_notes=31, seed=3)
+    stratum_of = {doc_name: stratum for doc_name, _, stratum in inventory}
+    counts = {stratum: sum(stratum_of[doc_name] == stratum for doc_name in sample) for stratum in "ABC"}
+    assert len(sample) == 31
+    # shares of 20.44, 10.22 and 0.34 notes, the largest remainder goes to A
+    assert counts == {"A": 21, "B": 10, "C": 0}
+
+
+@pytest.mark.parametrize("total, notes, percent, size", [(10, 3, 0, 3), (10, 30, 0, 10), (10, 0, 25, 2),
+                                                         (10, 0, 1, 1), (0, 0, 50, 0), (10, 0, 0, 0)])
+def test_sample_size(total, notes, percent, size):
+    assert sampling.sample_size(total, notes, percent) == size
+
+
+def test_projection_scales_the_sample():
+    inventory = make_inventory(10)
+    sample = {"note_0.txt", "note_1.txt"}
+    df = pd.DataFrame({CNST.DOC_ID: ["note_0.txt", "note_0.txt", "note_1.txt"], "concept": ["Pain", "Pain", "Nerve"]})
+    report = sampling.project_run(inventory, sample, df, {"notes_processed": 2, "notes_skipped_by_prescreen": 0}, 2.0)
+    assert report["entities_per_note"] == 1.5
+    assert report["notes_with_entities"] == 2
+    assert report["projected_entities"] == 15
+    assert report["projected_concept_counts"] == {"Pain": 10, "Nerve": 5}
+    assert report["projected_seconds"] == pytest.approx(2.0 * sum(range(100, 110)) / 201)
+    assert report["projected_csv_bytes"] == round(len(df.to_csv(index=False, sep="|").encode("utf-8")) * 5)
+    assert report["notes_skipped_by_prescreen"] == 0 and "notes_processed" not in report
+
+
+@pytest.fixture
+def notes_db(tmp_path, notes):
+    db_path = str(tmp_path / "notes.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE notes (doc_name, note_text, ward)")
+    conn.executemany("INSERT INTO notes VALUES (?, ?, ?)",
+                     [(doc_name, text, "A" if i % 2 else "B") for i, (doc_name, text) in enumerate(notes)])
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+@pytest.mark.parametrize("input_dir, csv_input", [(TXT_INPUT, False), (CSV_INPUT, True), ("database", True)])
+def test_sample_run_processes_the_sample_only(model, resources, settings, tmp_path, request, monkeypatch,
+                                              input_dir, csv_input):
+    if input_dir == "database":
+        input_dir = request.getfixturevalue("notes_db")
+        # the sample is fetched by name, not by scanning the table
+        monkeypatch.setattr(database.DatabaseSource, "fetch_page", None)
+    the_pipeline, inclusion_lexicon = model.init_nlp_pipeline(resources, settings)
+    settings.update(sample_notes=2, sample_seed=5)
+    inventory = model.input_inventory(input_dir, csv_input, settings)
+    sample = sampling.choose_sample(inventory, 2, 0, 5)
+
+    report = model.sample_run(the_pipeline, input_dir, resources, inclusion_lexicon, os.path.dirname(resources),
+                              csv_input, settings=settings)
+    assert report["notes_total"] == len(inventory) and report["notes_sampled"] == 2
+    assert 0 < report["seconds"] and report["projected_seconds"] > report["seconds"]
+
+    df, run_report = model.process_notes_on_disk(the_pipeline, input_dir, "", resources, inclusion_lexicon,
+                                                 os.path.dirname(resources), csv_input, settings=settings, sample=sample)
+    assert run_report["notes_processed"] == 2
+    assert set(df[CNST.DOC_ID]) <= sample
+    assert report["entities"] == len(df)
@@ -0,0 +1,84 @@
+import os
+from concurrent.futures import Future
+
+import pytest
+
+import helper.constants as CNST
+import helper.scheduler as scheduler
+from helper.reader import scan_notes
+from conftest import CSV_INPUT, TXT_INPUT, run_notes, output_parts
+
+
+def test_batches_cover_every_note_once():
+    lengths = [5, 120, 30, 30, 0, 80, 200, 10]
+    batches = scheduler.plan_batches(lengths, 100)
+    assert sorted(index for batch in batches for index in batch) == list(range(len(lengths)))
+    sizes = [sum(lengths[index] for index in batch) for batch in batches]
+    assert all(size <= 100 or len(batch) == 1 for size, batch in zip(sizes, batches))
+    assert sizes == sorted(sizes, reverse=True)
+
+
+@pytest.mark.parametrize("input_dir, csv_input", [(TXT_INPUT, False), (CSV_INPUT, True)])
+def test_parallel_run_matches_single_process_run(model, resources, settings, tmp_path, input_dir, csv_input):
+    single = run_notes(model, input_dir, tmp_path / "single", resources, settings, csv_input)
+    # small batches, so that they finish out of order
+    parallel = run_notes(model, input_dir, tmp_path / "parallel", resources, dict(settings, workers=2, batch_chars=500),
+                         csv_input)
+    assert output_parts(parallel) == output_parts(single)
+
+
+class RecordingFuture(Future):
+    """A finished batch that records when its rows are collected."""
+
+    def __init__(self, events, doc_ids, result):
+        super().__init__()
+        self.events = events
+        self.doc_ids = doc_ids
+        self.set_result(result)
+
+    def result(self, timeout=None):
+        self.events.append(("collect", self.doc_ids))
+        return super().result(timeout)
+
+
+class InlineExecutor:
+    """Runs the batches in this process as they are submitted, recording the order of the batches."""
+
+    def __init__(self):
+        self.events = []
+
+    def submit(self, fn, batch):
+        doc_ids = [doc_id for _, doc_id, _ in batch]
+        self.events.append(("submit", doc_ids))
+        return RecordingFuture(self.events, doc_ids, fn(batch))
+
+
+def test_shards_are_queued_longest_first_without_waiting(model, resources, settings, notes, tmp_path, monkeypatch):
+    input_dir = tmp_path / "notes"
+    input_dir.mkdir()
+    for i in range(9):
+        with open(input_dir / f"note_{i}.txt", "w", encoding="utf-8") as fh:
+            fh.write(notes[i % len(notes)][1] * (i % 4 + 1))
+    monkeypatch.setattr(CNST, "TXT_SHARD_FILES", 3)
+    monkeypatch.setattr(scheduler, "_worker", {})
+    settings["batch_chars"] = 1
+    scheduler.init_worker(resources, settings)
+    executor = InlineExecutor()
+
+    single = run_notes(model, input_dir, tmp_path / "single", resources, settings, False)
+    parallel = run_notes(model, input_dir, tmp_path / "parallel", resources, settings, False, executor=executor)
+    assert output_parts(parallel) == output_parts(single)
+
+    lengths = {f: os.path.getsize(input_dir / f) for f in os.listdir(input_dir)}
+    shard_of = {f: position // 3 for position, f in enumerate(scan_notes(str(input_dir)))}
+    submitted = [doc_ids[0] for event, doc_ids in executor.events if event == "submit"]
+    for shard in range(3):
+        shard_lengths = [lengths[f] for f in submitted if shard_of[f] == shard]
+        assert len(shard_lengths) == 3
+        assert shard_lengths == sorted(shard_lengths, reverse=True)
+
+    # the next shard is in the pool before the rows of a shard are all collected
+    position = lambda event, shard, last: [i for i, (kind, doc_ids) in enumerate(executor.events)
+                                           if kind == event and shard_of[doc_ids[0]] == shard][-1 if last else 0]
+    for shard in range(2):
+        assert position("submit", shard + 1, False) < position("collect", shard, True)
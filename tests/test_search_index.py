@@ -0,0 +1,47 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import helper.constants as CNST
+import helper.search_index as search_index
+
+
+@pytest.fixture
+def annotations():
+    rows = [("doc1", "Pain", "chest pain", True), ("doc2", "Pain", "Painful", False),
+            ("doc3", "NeuralStuff", "nerves", False), ("doc4", "Pain", "50%_pain", True)]
+    df = pd.DataFrame(rows, columns=[CNST.DOC_ID, "concept", "matched_text", "is_negated"])
+    for flag in CNST.CONTEXT_FLAGS[1:]:
+        df[flag] = False
+    df["section_id"] = ""
+    return df
+
+
+def without_fts(index_path):
+    conn = sqlite3.connect(index_path)
+    conn.execute(f"DROP TABLE {search_index.FTS_TABLE}")
+    conn.commit()
+    conn.close()
+
+
+@pytest.mark.parametrize("text", ["pain", "ain", "PAIN", "st p", "pa", "%_p", "nerve"])
+def test_text_search_matches_fallback(tmp_path, annotations, text):
+    fts_folder, like_folder = tmp_path / "fts", tmp_path / "like"
+    fts_folder.mkdir()
+    like_folder.mkdir()
+    fts_index = search_index.build_search_index(annotations, str(fts_folder))
+    like_index = search_index.build_search_index(annotations, str(like_folder))
+    without_fts(like_index)
+
+    expected = sorted(doc for doc, matched in zip(annotations[CNST.DOC_ID], annotations["matched_text"])
+                      if text.lower() in matched.lower())
+    assert search_index.query_documents(like_index, text=text) == expected
+    assert search_index.query_documents(fts_index, text=text) == expected
+
+
+def test_fetch_annotations_returns_boolean_flags(tmp_path, annotations):
+    index_path = search_index.build_search_index(annotations, str(tmp_path))
+    rows = search_index.fetch_annotations(index_path, "doc1")
+    assert rows["is_negated"].tolist() == [True]
+    assert all(rows[flag].dtype == bool for flag in CNST.CONTEXT_FLAGS)
@@ -0,0 +1,23 @@
+import pytest
+
+from conftest import note_rows
+
+SECTIONS = ["history_of_present_illness", "observation_and_plan", ""]
+
+
+@pytest.mark.parametrize("section_settings, kept", [
+    ({"include_sections": SECTIONS}, lambda section: section in SECTIONS),
+    ({"exclude_sections": SECTIONS}, lambda section: section not in SECTIONS),
+    ({"include_sections": SECTIONS, "exclude_sections": [""]}, lambda section: section in SECTIONS[:2]),
+])
+def test_filtered_rows_are_the_rows_of_the_kept_sections(model, resources, settings, notes, section_settings, kept):
+    the_pipeline, _ = model.init_nlp_pipeline(resources, settings)
+    all_rows = note_rows(model, the_pipeline, notes, settings)
+    settings.update(section_settings)
+    filtered = note_rows(model, the_pipeline, notes, settings)
+    assert filtered == [[row for row in rows if kept(row["section_id"])] for rows in all_rows]
+    assert any(filtered) and filtered != all_rows
+
+
+def test_no_filter_without_sections(model, settings):
+    assert model.section_filter(settings) is None
@@ -0,0 +1,44 @@
+import pytest
+
+from helper.sentences import entity_sentences
+from conftest import note_rows
+
+MULTI_SENTENCE = ("multi_sentence", "Patient has pain. No neuralgia.\nHISTORY: trigeminal neuralgia and pain, pain again.\n\n"
+                                    "Pain. Pain! Denies pain? Nerve pain\nin the face.")
+
+
+@pytest.fixture(scope="module")
+def long_note(notes):
+    """The sample text notes as the paragraphs of a single note."""
+    return "long_note", "\n\n".join(text for doc_name, text in notes if doc_name.endswith(".txt"))
+
+
+@pytest.mark.parametrize("long_note_chars", [0, 300])
+def test_compact_offsets_slice_the_sentences(model, resources, settings, notes, long_note, long_note_chars):
+    settings["long_note_chars"] = long_note_chars
+    the_pipeline, _ = model.init_nlp_pipeline(resources, settings)
+    all_notes = notes + [long_note]
+    full = note_rows(model, the_pipeline, all_notes, settings)
+    compact = note_rows(model, the_pipeline, all_notes, dict(settings, compact_sentences=True))
+
+    assert any(full)
+    for (_, text), full_rows, compact_rows in zip(all_notes, full, compact):
+        assert len(compact_rows) == len(full_rows)
+        for full_row, compact_row in zip(full_rows, compact_rows):
+            assert compact_row["sentence"] == ""
+            assert text[compact_row["sentence_start"]:compact_row["sentence_end"]] == full_row["sentence"]
+            assert dict(compact_row, sentence=full_row["sentence"]) == full_row
+
+
+def test_single_pass_matches_the_entity_sentences(model, resources, settings, notes):
+    the_pipeline, _ = model.init_nlp_pipeline(resources, settings)
+    texts = [text for _, text in notes + [MULTI_SENTENCE]]
+    docs = list(model.annotate_notes(the_pipeline, texts))
+    assert len(list(docs[-1].sents)) > 3 and len(docs[-1].ents) > 3
+
+    for doc in docs:
+        sentences, ent_sentences = entity_sentences(doc)
+        assert len(ent_sentences) == len(doc.ents)
+        for ent, (first, last) in zip(doc.ents, ent_sentences):
+            assert (sentences[first].start, sentences[first].end) == (ent.sent.start, ent.sent.end)
+            assert sentences[last].start <= ent.end - 1 < sentences[last].end
@@ -0,0 +1,66 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import helper.constants as CNST
+import helper.lexicon as lexicon
+from helper.service import NoteService, ServiceRequestHandler
+from conftest import comparable, note_rows
+
+
+@pytest.fixture
+def service(model, resources, settings):
+    return NoteService(model, resources, settings)
+
+
+def expected_rows(model, the_pipeline, notes, settings):
+    return [row for rows in note_rows(model, the_pipeline, notes, settings) if rows for row in rows]
+
+
+def test_concurrent_requests_get_the_rows_of_their_notes(model, service, resources, settings, notes):
+    the_pipeline, _ = model.init_nlp_pipeline(resources, settings)
+    requests = [notes[i:i + 2] for i in range(len(notes))] * 3
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(service.annotate, requests))
+    assert [comparable(rows) for rows in results] == [expected_rows(model, the_pipeline, request, settings)
+                                                      for request in requests]
+    metrics = service.metrics()
+    assert metrics["requests"] == len(requests)
+    assert metrics["batches"] <= len(requests)
+
+
+def test_reloaded_rules_match_a_new_pipeline(model, service, resources, settings, notes):
+    lex_file = lexicon.find_lexicon(resources)
+    lexicon.parse_lexicon(lex_file).iloc[1:].to_excel(lex_file, index=False)
+    assert "rebuilt" not in service.reload_rules()
+    the_pipeline, _ = model.init_nlp_pipeline(resources, settings)
+    assert comparable(service.annotate(notes)) == expected_rows(model, the_pipeline, notes, settings)
+
+
+def test_http_interface(model, service, resources, settings, notes):
+    ServiceRequestHandler.service = service
+    server = ThreadingHTTPServer((CNST.SERVICE_HOST, 0), ServiceRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://{CNST.SERVICE_HOST}:{server.server_address[1]}"
+    try:
+        payload = {"notes": [{CNST.DOC_ID: doc_name, "note_text": text} for doc_name, text in notes]}
+        request = urllib.request.Request(f"{url}/annotate", json.dumps(payload).encode("utf-8"), method="POST")
+        with urllib.request.urlopen(request) as response:
+            rows = json.load(response)["rows"]
+        the_pipeline, _ = model.init_nlp_pipeline(resources, settings)
+        assert rows == json.loads(json.dumps(expected_rows(model, the_pipeline, notes, settings), default=str))
+
+        with urllib.request.urlopen(f"{url}/health") as response:
+            assert json.load(response) == {"status": "ok"}
+        bad_request = urllib.request.Request(f"{url}/annotate", b'{"text": 1}', method="POST")
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(bad_request)
+        assert error.value.code == 400
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,109 @@
+import os
+import re
+
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+import helper.constants as CNST
+import helper.sharding as sharding
+from conftest import CSV_INPUT, TXT_INPUT, run_notes, output_parts
+
+
+@pytest.fixture
+def csv_with_gaps(tmp_path):
+    """The sample CSV input with a missing value in an extra column, which makes it a float column."""
+    folder = tmp_path / "csv_with_gaps"
+    folder.mkdir()
+    for csv_file in os.listdir(CSV_INPUT):
+        notes = pd.read_csv(os.path.join(CSV_INPUT, csv_file))
+        notes.loc[0, "patient_age"] = None
+        notes.to_csv(folder / csv_file, index=False)
+    return str(folder)
+
+
+@pytest.mark.parametrize("input_dir, csv_input", [(TXT_INPUT, False), (CSV_INPUT, True), ("csv_with_gaps", True)])
+def test_merged_shards_match_single_run(model, resources, settings, tmp_path, request, input_dir, csv_input):
+    if input_dir == "csv_with_gaps":
+        input_dir = request.getfixturevalue("csv_with_gaps")
+    settings["emit_offsets"] = True
+    the_pipeline, _ = model.init_nlp_pipeline(resources, settings)
+    single = run_notes(model, input_dir, tmp_path / "single", resources, settings, csv_input, the_pipeline)
+
+    shard_count = 2
+    shard_folders = [run_notes(model, input_dir, tmp_path / f"shard{index}", resources,
+                               dict(settings, shard_index=index, shard_count=shard_count), csv_input, the_pipeline)
+                     for index in range(shard_count)]
+    merged = model.merge_shards(shard_folders, str(tmp_path / "merged"), os.path.dirname(resources))
+
+    # The merged documents come shard after shard
+    single_parts, merged_parts = output_parts(single), output_parts(merged)
+    assert len(single_parts) == len(merged_parts) == 1
+    single_lines, merged_lines = single_parts[0][0].splitlines(), merged_parts[0][0].splitlines()
+    assert merged_lines[0] == single_lines[0]
+    assert sorted(merged_lines) == sorted(single_lines)
+    single_rows = {repr(row) for row in single_parts[0][1]}
+    assert {repr(row) for row in merged_parts[0][1]} == single_rows
+
+
+@pytest.fixture
+def many_notes(tmp_path, notes):
+    """The sample notes, repeated under new names, as a folder of text files and a folder with a CSV file."""
+    txt_folder, csv_folder = tmp_path / "many_txt", tmp_path / "many_csv"
+    txt_folder.mkdir()
+    csv_folder.mkdir()
+    doc_names = [f"note_{i}.txt" for i in range(12)]
+    for i, doc_name in enumerate(doc_names):
+        with open(txt_folder / doc_name, "w", encoding="utf-8") as fh:
+            fh.write(notes[i % len(notes)][1])
+    sample = pd.read_csv(os.path.join(CSV_INPUT, os.listdir(CSV_INPUT)[0]))
+    rows = sample.iloc[[i % len(sample) for i in range(len(doc_names))]].reset_index(drop=True)
+    rows["doc_name"] = doc_names
+    rows.to_csv(csv_folder / "notes.csv", index=False)
+    return {False: str(txt_folder), True: str(csv_folder)}
+
+
+def numbered_parts(xlsx_folder):
+    """The document names of every part file of a run, by part number."""
+    parts = {}
+    for xlsx_file in os.listdir(xlsx_folder):
+        number = re.search(r"_part(\d+)\.xlsx$", xlsx_file)
+        if number:
+            sheet = load_workbook(os.path.join(xlsx_folder, xlsx_file), read_only=True).active
+            doc_names = [row[0] for row in sheet.iter_rows(min_row=2, values_only=True)]
+            parts[int(number.group(1))] = list(dict.fromkeys(doc_names))
+    return [parts[number] for number in sorted(parts)]
+
+
+@pytest.mark.parametrize("csv_input", [False, True])
+def test_merged_parts_are_numbered_across_shards(model, resources, settings, tmp_path, monkeypatch, many_notes, csv_input):
+    monkeypatch.setattr(CNST, "MAX_DOCS", 2)
+    input_dir = many_notes[csv_input]
+    the_pipeline, _ = model.init_nlp_pipeline(resources, settings)
+    single = run_notes(model, input_dir, tmp_path / "single", resources, settings, csv_input, the_pipeline)
+
+    shard_count = 2
+    shard_folders = [run_notes(model, input_dir, tmp_path / f"shard{index}", resources,
+                               dict(settings, shard_index=index, shard_count=shard_count), csv_input, the_pipeline)
+                     for index in range(shard_count)]
+    merged = model.merge_shards(shard_folders, str(tmp_path / "merged"), os.path.dirname(resources))
+
+    shard_parts = [numbered_parts(folder) for folder in shard_folders]
+    assert all(len(parts) > 1 for parts in shard_parts)
+    merged_parts = numbered_parts(merged)
+    # the parts are numbered from 1 without gaps, as in a single run
+    assert len(merged_parts) == len(numbered_parts(single))
+    assert all(len(doc_names) <= CNST.MAX_DOCS for doc_names in merged_parts)
+    # the documents come shard after shard, each shard in the order of its run
+    merged_docs = [doc_name for doc_names in merged_parts for doc_name in doc_names]
+    assert merged_docs == [doc_name for parts in shard_parts for doc_names in parts for doc_name in doc_names]
+
+    single_rows = sorted(repr(row) for _, cells in output_parts(single) for row in cells[1:])
+    assert sorted(repr(row) for _, cells in output_parts(merged) for row in cells[1:]) == single_rows
+
+
+def test_shards_split_documents_once(settings):
+    doc_names = [f"note_{i}.txt" for i in range(200)]
+    shards = [sharding.shard_of(doc_name, 3) for doc_name in doc_names]
+    assert shards == [sharding.shard_of(doc_name, 3) for doc_name in doc_names]
+    assert set(shards) == {0, 1, 2}
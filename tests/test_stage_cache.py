@@ -0,0 +1,68 @@
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+import helper.constants as CNST
+import helper.lexicon as lexicon
+from conftest import CSV_INPUT, TXT_INPUT, run_notes, output_parts
+
+
+def cache_files(resources):
+    cache_root = os.path.join(os.path.dirname(resources), CNST.STAGE_CACHE_DIR)
+    return sorted(os.path.relpath(os.path.join(folder, name), cache_root)
+                  for folder, _, names in os.walk(cache_root) for name in names)
+
+
+def assert_same_as_uncached(model, input_dir, tmp_path, resources, settings, csv_input, run_name):
+    cached = run_notes(model, input_dir, tmp_path / f"{run_name}_cached", resources, settings, csv_input)
+    uncached = run_notes(model, input_dir, tmp_path / f"{run_name}_uncached", resources,
+                         dict(settings, stage_cache=False), csv_input)
+    assert output_parts(cached) == output_parts(uncached)
+
+
+@pytest.mark.parametrize("source_dir, csv_input", [(TXT_INPUT, False), (CSV_INPUT, True)])
+def test_cached_runs_match_uncached_runs(model, resources, settings, tmp_path, source_dir, csv_input):
+    input_dir = tmp_path / "input"
+    shutil.copytree(source_dir, input_dir)
+    settings["stage_cache"] = True
+
+    assert_same_as_uncached(model, input_dir, tmp_path, resources, settings, csv_input, "cold")
+    cached = cache_files(resources)
+    assert cached
+    assert_same_as_uncached(model, input_dir, tmp_path, resources, settings, csv_input, "warm")
+    assert cache_files(resources) == cached
+
+    # the concepts are not part of the cache
+    lex_file = lexicon.find_lexicon(resources)
+    lexicon.parse_lexicon(lex_file).iloc[1:].to_excel(lex_file, index=False)
+    assert_same_as_uncached(model, input_dir, tmp_path, resources, settings, csv_input, "concepts")
+    assert cache_files(resources) == cached
+
+    # an edited input file is processed again
+    edited = os.path.join(input_dir, sorted(os.listdir(input_dir))[0])
+    if csv_input:
+        notes = pd.read_csv(edited)
+        notes.loc[0, "note_text"] = "Pain. " + notes.loc[0, "note_text"]
+        notes.to_csv(edited, index=False)
+    else:
+        with open(edited, "r", encoding="utf-8") as fh:
+            text = fh.read()
+        with open(edited, "w", encoding="utf-8") as fh:
+            fh.write("Pain. " + text)
+    assert_same_as_uncached(model, input_dir, tmp_path, resources, settings, csv_input, "input")
+
+
+def test_section_rules_change_invalidates_the_cache(model, resources, settings, tmp_path):
+    settings["stage_cache"] = True
+    run_notes(model, TXT_INPUT, tmp_path / "first", resources, settings, False)
+    first_cache = cache_files(resources)
+
+    with open(f"{resources}/{CNST.RESOURCE_SECTIONS_RULE}", "r") as fh:
+        lines = fh.read().splitlines()
+    with open(f"{resources}/{CNST.RESOURCE_SECTIONS_RULE}", "w") as fh:
+        fh.write("\n".join(line for line in lines if not line.startswith("history_of_present_illness")) + "\n")
+    assert_same_as_uncached(model, TXT_INPUT, tmp_path, resources, settings, False, "sections")
+    # the cache of the old rules is removed
+    assert not set(first_cache) & set(cache_files(resources))
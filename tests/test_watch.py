@@ -0,0 +1,129 @@
+import os
+
+import pytest
+
+import helper.constants as CNST
+import helper.manifest as manifest
+from helper.entity_buffer import EntityBuffer
+from helper.reader import scan_notes
+from helper.watch import RollingParts
+from conftest import run_notes, output_parts
+
+
+@pytest.fixture
+def note_folder(tmp_path, notes):
+    """The sample notes, text files and CSV rows, as the text files of a folder."""
+    folder = tmp_path / "notes"
+    folder.mkdir()
+    for doc_name, text in notes:
+        with open(folder / (doc_name if doc_name.endswith(".txt") else f"{doc_name}.txt"), "w", encoding="utf-8") as fh:
+            fh.write(text)
+    return folder
+
+
+def read_notes(folder, file_names):
+    notes = []
+    for file_name in file_names:
+        with open(os.path.join(folder, file_name), "r", encoding="utf-8") as fh:
+            notes.append((file_name, fh.read()))
+    return notes
+
+
+def write_batch(model, the_pipeline, rolling, notes, settings):
+    """Adds a batch of notes to the rolling parts the way `Model.watch_folder` does."""
+    results = EntityBuffer()
+    for rows in model.annotated_rows(the_pipeline, notes, None, None, settings, model.section_filter(settings)):
+        if rows:
+            results.add_rows(rows)
+    rolling.write(results.to_dataframe(), [doc_name for doc_name, _ in notes])
+
+
+def watch_session(model, the_pipeline, note_folder, output_folder, settings, batch_size):
+    # the notes are taken in the order of a run, so that the parts hold the same documents
+    rolling = RollingParts(str(output_folder), "project", str(note_folder))
+    file_names = scan_notes(str(note_folder))
+    for start in range(0, len(file_names), batch_size):
+        write_batch(model, the_pipeline, rolling, read_notes(note_folder, file_names[start:start + batch_size]), settings)
+    return rolling
+
+
+def load_manifest(xlsx_folder):
+    return manifest.load_manifest(xlsx_folder, [f for f in os.listdir(xlsx_folder) if f.endswith(".xlsx")])
+
+
+def doc_rows(xlsx_folder):
+    """The .xlsx rows of every document of the part files."""
+    rows = {}
+    for _, cells in output_parts(xlsx_folder):
+        for row in cells[1:]:
+            rows.setdefault(row[0][0], []).append(row)
+    return rows
+
+
+@pytest.mark.parametrize("batch_size", [1, 2, 5])
+def test_rolling_parts_match_a_run(model, resources, settings, note_folder, tmp_path, monkeypatch, batch_size):
+    monkeypatch.setattr(CNST, "MAX_DOCS", 2)
+    the_pipeline, _ = model.init_nlp_pipeline(resources, settings)
+    run = run_notes(model, note_folder, tmp_path / "run", resources, settings, False, the_pipeline)
+    rolling = watch_session(model, the_pipeline, note_folder, tmp_path / "watch", settings, batch_size)
+
+    assert len(output_parts(rolling.xlsx_folder)) > 1
+    assert output_parts(rolling.xlsx_folder) == output_parts(run)
+    session, run_manifest = load_manifest(rolling.xlsx_folder), load_manifest(run)
+    assert list(session["parts"].values()) == list(run_manifest["parts"].values())
+    assert session["report"]["notes_processed"] == len(os.listdir(note_folder))
+
+
+def test_edited_notes_replace_their_rows(model, resources, settings, note_folder, tmp_path, monkeypatch):
+    monkeypatch.setattr(CNST, "MAX_DOCS", 2)
+    the_pipeline, _ = model.init_nlp_pipeline(resources, settings)
+    rolling = watch_session(model, the_pipeline, note_folder, tmp_path / "watch", settings, 2)
+    first_note, emptied_note = rolling.parts[0]
+
+    # a note of an earlier part gets new rows, another one loses all of them
+    with open(note_folder / first_note, "r", encoding="utf-8") as fh:
+        text = fh.read()
+    with open(note_folder / first_note, "w", encoding="utf-8") as fh:
+        fh.write("Pain. " + text)
+    with open(note_folder / emptied_note, "w", encoding="utf-8") as fh:
+        fh.write("Nothing to see.")
+    write_batch(model, the_pipeline, rolling, read_notes(note_folder, [first_note, emptied_note]), settings)
+    assert rolling.parts[0] == [first_note]
+
+    os.remove(note_folder / emptied_note)
+    run = run_notes(model, note_folder, tmp_path / "run", resources, settings, False, the_pipeline)
+    assert doc_rows(rolling.xlsx_folder) == doc_rows(run)
+    assert emptied_note not in doc_rows(rolling.xlsx_folder)
+
+
+def test_emptied_parts_are_dropped(model, resources, settings, note_folder, tmp_path, monkeypatch):
+    monkeypatch.setattr(CNST, "MAX_DOCS", 2)
+    the_pipeline, _ = model.init_nlp_pipeline(resources, settings)
+    rolling = watch_session(model, the_pipeline, note_folder, tmp_path / "watch", settings, 2)
+    part_count = len(rolling.parts)
+    emptied_notes = rolling.parts[0]
+
+    # every note of the first part loses its rows
+    for file_name in emptied_notes:
+        with open(note_folder / file_name, "w", encoding="utf-8") as fh:
+            fh.write("Nothing to see.")
+    write_batch(model, the_pipeline, rolling, read_notes(note_folder, emptied_notes), settings)
+
+    assert len(rolling.parts) == part_count - 1
+    xlsx_files = sorted(f for f in os.listdir(rolling.xlsx_folder) if f.endswith(".xlsx"))
+    assert xlsx_files == sorted(rolling.part_name(part, ".xlsx") for part in range(part_count - 1))
+    assert sorted(os.listdir(rolling.csv_folder)) == sorted(rolling.part_name(part, ".csv") for part in range(part_count - 1))
+    assert all(len(cells) > 1 for _, cells in output_parts(rolling.xlsx_folder))
+    assert load_manifest(rolling.xlsx_folder) is not None
+
+    for file_name in emptied_notes:
+        os.remove(note_folder / file_name)
+    run = run_notes(model, note_folder, tmp_path / "run", resources, settings, False, the_pipeline)
+    assert doc_rows(rolling.xlsx_folder) == doc_rows(run)
+
+    # the next notes still go to the last part
+    with open(note_folder / "new.txt", "w", encoding="utf-8") as fh:
+        fh.write("The patient has pain.")
+    write_batch(model, the_pipeline, rolling, read_notes(note_folder, ["new.txt"]), settings)
+    assert "new.txt" in rolling.parts[-1]
+    assert load_manifest(rolling.xlsx_folder) is not None
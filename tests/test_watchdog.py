@@ -0,0 +1,32 @@
+import helper.lexicon as lexicon
+from helper.watchdog import GuardedWorkers
+from conftest import comparable, note_rows
+
+# a regex backtracking for ever on a run of 'a's not followed by 'b'
+SLOW_RULE = [4, "Slow", "(a+)+b", "NO", "YES"]
+HANGING_NOTE = ("hanging", "Patient has pain. " + "a" * 34 + "c and more pain.")
+
+
+def test_hanging_note_is_quarantined(model, resources, settings, notes):
+    lex_file = lexicon.find_lexicon(resources)
+    lex = lexicon.parse_lexicon(lex_file)
+    lex.loc[len(lex)] = SLOW_RULE
+    lex.to_excel(lex_file, index=False)
+    settings.update(workers=1, doc_time_limit=3)
+    run_notes = notes[:2] + [HANGING_NOTE] + notes[2:]
+
+    workers = GuardedWorkers(resources, settings)
+    try:
+        first_worker = workers.slots[0]["process"]
+        rows = [comparable(rows) for rows in
+                model.annotated_rows(None, run_notes, None, None, settings, model.section_filter(settings), workers)]
+        assert workers.take_quarantined() == ["hanging"]
+        assert workers.take_quarantined() == []
+        assert not first_worker.is_alive()
+        assert workers.slots[0]["process"] is not first_worker
+    finally:
+        workers.shutdown()
+
+    the_pipeline, _ = model.init_nlp_pipeline(resources, settings)
+    expected = note_rows(model, the_pipeline, notes, settings)
+    assert rows == expected[:2] + [[]] + expected[2:]
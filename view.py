@@ -10,12 +10,16 @@ import base64
 from PIL import Image, ImageTk
 from io import BytesIO
 import subprocess
+import queue
 import shutil
 from datetime import datetime
 
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 from helper.annotations import AnnotationViewer
 import helper.constants as CNST
+import helper.manifest as manifest
+import helper.packed as packed
+import helper.lexicon as lexicon
 
 # Setting up logging
 logging.basicConfig(level=logging.DEBUG,
@@ -41,10 +45,14 @@ class View(tk.Tk):
 
         tab_control = ttk.Notebook(self)
         self.tab1 = ttk.Frame(tab_control)
+        self.tab2 = ttk.Frame(tab_control)
         self.tab3 = ttk.Frame(tab_control)
         tab_control.add(self.tab1, text="Configure and Run the Pipeline")
+        tab_control.add(self.tab2, text="Preview Rules")
         tab_control.add(self.tab3, text="About")
         tab_control.pack(expand=1, fill="both")
+        tab_control.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+        self.tab_control = tab_control
 
         self.project_path = ""
         self.project_resources_dir = ""
@@ -58,6 +66,7 @@ class View(tk.Tk):
         self.use_existing_output = tk.BooleanVar()
         self.csv_file_check = tk.BooleanVar()
         self.create_tab1_contents()
+        self.create_tab2()
         self.create_tab3()
 
         self.logger = logging.getLogger(__name__)
@@ -281,6 +290,46 @@ class View(tk.Tk):
                 self.output_dir_initial = ""
                 self.output_dir_entry.delete(0, tk.END)
 
+    def create_tab2(self):
+        """Creates the 'Preview Rules' tab in the user interface.
+
+        A note pasted or loaded in this tab is annotated with the rules of the project on a pipeline
+        kept warm in the background, again as it is edited and whenever a rule file is saved.
+        """
+        font_size = 12
+        self.preview = None
+        self.preview_request_id = 0
+        self.preview_pending = None
+        self.preview_colors = {}
+
+        label_preview = tk.Label(self.tab2, text="Paste a note or load one: it is annotated with the rules of the project as you type and whenever a rule file is saved.",
+                                 font=("Helvetica", font_size), anchor="w")
+        label_preview.grid(row=0, column=0, columnspan=2, sticky="w", padx=15, pady=5)
+        btn_load_note = tk.Button(self.tab2, text="Load a Note", font=("Helvetica", font_size), command=self.load_preview_note)
+        btn_load_note.grid(row=0, column=2, sticky="e", padx=15, pady=5)
+
+        self.preview_text = tk.Text(self.tab2, wrap="word", undo=True, font=("Helvetica", font_size - 1))
+        self.preview_text.grid(row=1, column=0, sticky="nsew", padx=(15, 0), pady=5)
+        preview_scrollbar = tk.Scrollbar(self.tab2, command=self.preview_text.yview)
+        preview_scrollbar.grid(row=1, column=1, sticky="ns", pady=5)
+        self.preview_text.config(yscrollcommand=preview_scrollbar.set)
+        self.preview_text.tag_configure("preview_negated", overstrike=True)
+        self.preview_text.bind("<<Modified>>", self.on_preview_text_modified)
+
+        columns = ("concept", "matched_text", "section_id", "context")
+        self.preview_entities = ttk.Treeview(self.tab2, columns=columns, show="headings")
+        for column, heading, width in zip(columns, ("Concept", "Matched Text", "Section", "Context"), (120, 160, 100, 160)):
+            self.preview_entities.heading(column, text=heading)
+            self.preview_entities.column(column, width=width)
+        self.preview_entities.grid(row=1, column=2, sticky="nsew", padx=15, pady=5)
+
+        self.preview_status = tk.Label(self.tab2, text="Select a project to start the preview.", font=("Helvetica", font_size - 2), fg="gray", anchor="w")
+        self.preview_status.grid(row=2, column=0, columnspan=3, sticky="w", padx=15, pady=5)
+
+        self.tab2.grid_rowconfigure(1, weight=1)
+        self.tab2.grid_columnconfigure(0, weight=3)
+        self.tab2.grid_columnconfigure(2, weight=1)
+
     def create_tab3(self):
         """Creates the 'About' tab in the user interface.
 
@@ -303,6 +352,113 @@ class View(tk.Tk):
         self.about_label.grid(column=2, row=1, columnspan=5, sticky='n', padx=20, pady=20)
 
 
+    # Tab2 Commands
+    def on_tab_changed(self, event):
+        """Starts the rule preview the first time its tab is shown for a project.
+
+        Args:
+            event (tk.Event): The tab change event.
+        """
+        if self.tab_control.select() == str(self.tab2):
+            self.start_preview()
+
+    def start_preview(self):
+        """Starts the warm preview pipeline of the current project, replacing the one of another project."""
+        if not self.project_resources_dir:
+            self.preview_status.config(text="Select a project to start the preview.")
+            return
+        if self.preview is not None and self.preview.project_path_resources == self.project_resources_dir:
+            return
+        if self.preview is not None:
+            self.preview.close()
+
+        self.preview = self.controller.start_rule_preview(self.project_resources_dir)
+        self.after(CNST.PREVIEW_POLL_MS, self.poll_preview, self.preview)
+        self.submit_preview()
+
+    def load_preview_note(self):
+        """Loads a .txt note in the preview text box."""
+        note_file = filedialog.askopenfilename(title="Select a note", filetypes=[("Text files", "*.txt"), ("All files", "*.*")])
+        if not note_file:
+            return
+        with open(note_file, 'r', encoding='utf-8') as fh:
+            note_text = fh.read()
+        self.preview_text.delete("1.0", tk.END)
+        self.preview_text.insert("1.0", note_text)
+
+    def on_preview_text_modified(self, event):
+        """Re-annotates the preview text shortly after the user stops typing.
+
+        Args:
+            event (tk.Event): The modified event of the text box.
+        """
+        if not self.preview_text.edit_modified():
+            return
+        self.preview_text.edit_modified(False)
+        if self.preview_pending is not None:
+            self.after_cancel(self.preview_pending)
+        self.preview_pending = self.after(CNST.PREVIEW_DEBOUNCE_MS, self.submit_preview)
+
+    def submit_preview(self):
+        """Sends the current preview text to the preview pipeline."""
+        self.preview_pending = None
+        if self.preview is None:
+            return
+        self.preview_request_id += 1
+        self.preview.submit(self.preview_request_id, self.preview_text.get("1.0", "end-1c"))
+
+    def poll_preview(self, preview):
+        """Shows the messages and results of the preview pipeline, then polls it again.
+
+        Args:
+            preview (RulePreview): The preview polled, polling stops once it is replaced or closed.
+        """
+        if preview is not self.preview:
+            return
+        while True:
+            try:
+                message = preview.results.get_nowait()
+            except queue.Empty:
+                break
+            if message[0] == "result":
+                _, request_id, rows, milliseconds = message
+                # results of texts edited since are dropped, a newer request is on its way
+                if request_id == self.preview_request_id:
+                    self.show_preview_rows(rows)
+                    self.preview_status.config(text=f"{len(rows)} entities, annotated in {milliseconds:.0f} ms", fg="gray")
+            else:
+                self.preview_status.config(text=message[1], fg="red" if message[0] == "error" else "gray")
+        self.after(CNST.PREVIEW_POLL_MS, self.poll_preview, preview)
+
+    def show_preview_rows(self, rows):
+        """Highlights the preview entities.
+
+        The text may have been edited since the last result, which moves the highlights with it, so all of them
+        are removed and the current entities highlighted again.
+
+        Args:
+            rows (list): Output rows of the preview text, see `Model.extract_entity_rows`.
+        """
+        char_index = lambda offset: f"1.0+{offset}c"
+        for concept in self.preview_colors:
+            self.preview_text.tag_remove(f"preview_{concept}", "1.0", tk.END)
+        self.preview_text.tag_remove("preview_negated", "1.0", tk.END)
+
+        for row in rows:
+            concept = row["concept"]
+            tag = f"preview_{concept}"
+            if concept not in self.preview_colors:
+                self.preview_colors[concept] = CNST.COLOR_LIST[len(self.preview_colors) % len(CNST.COLOR_LIST)]
+                self.preview_text.tag_configure(tag, background=self.preview_colors[concept])
+            self.preview_text.tag_add(tag, char_index(row["concept_start"]), char_index(row["concept_end"]))
+            if row["is_negated"]:
+                self.preview_text.tag_add("preview_negated", char_index(row["concept_start"]), char_index(row["concept_end"]))
+
+        self.preview_entities.delete(*self.preview_entities.get_children())
+        for row in sorted(rows, key=lambda row: row["concept_start"]):
+            context = ", ".join(flag[3:] for flag in CNST.CONTEXT_FLAGS if row[flag])
+            self.preview_entities.insert("", tk.END, values=(row["concept"], row["matched_text"], row["section_id"], context))
+
     # Tab1 Commands
     def create_or_open_project(self):
         """Opens a project directory or creates a new one.
@@ -340,6 +496,11 @@ class View(tk.Tk):
                     messagebox.showerror("Error", f"Failed to copy resource files for your project: {e}") 
                     self.log_error("Issues with selecting directory", f"Failed to copy resource files for your project: {e}") 
         self.update_rule_file_paths()
+        if self.preview is not None and self.preview.project_path_resources != self.project_resources_dir:
+            self.preview.close()
+            self.preview = None
+            if self.tab_control.select() == str(self.tab2):
+                self.start_preview()
         self.output_dir_entry.delete(0, tk.END)        
         self.output_dir_entry.insert(0, self.project_path)  # Set default value 
 
@@ -447,7 +608,7 @@ class View(tk.Tk):
         sent_rules_file = os.path.join(self.project_resources_dir, CNST.RESOURCE_SENTENCE_RULE)
         section_rules_file = os.path.join(self.project_resources_dir, CNST.RESOURCE_SECTIONS_RULE)
         negation_rules_file = os.path.join(self.project_resources_dir, CNST.RESOURCE_CONTEXT_RULES)
-        concepts_file = os.path.join(self.project_resources_dir, CNST.RESOURCE_CONCEPTS)
+        concepts_file = lexicon.find_lexicon(self.project_resources_dir)
 
         concepts_file=concepts_file.replace('\\','/')
         sent_rules_file = sent_rules_file.replace('\\', '/')
@@ -549,22 +710,21 @@ class View(tk.Tk):
             self.log_error("Issues with selecting directory", "Project directory not selected!")
             return
 
-        concepts_file = os.path.join(self.project_resources_dir, CNST.RESOURCE_CONCEPTS)
+        concepts_file = lexicon.find_lexicon(self.project_resources_dir)
         if not os.path.exists(concepts_file):
-            messagebox.showerror("Error", f"Concepts file ({CNST.RESOURCE_CONCEPTS}) not found!")
-            self.log_error("Issues with the resources file", f"Concepts file ({CNST.RESOURCE_CONCEPTS}) not found!")
+            concepts_files = ", ".join(CNST.RESOURCE_CONCEPTS_FILES)
+            messagebox.showerror("Error", f"Concepts file not found! The resources folder needs one of: {concepts_files}")
+            self.log_error("Issues with the resources file", f"Concepts file not found! The resources folder needs one of: {concepts_files}")
             return
 
-        df = pd.read_excel(concepts_file)
-        df.columns = df.columns.str.strip()
-        df = df.iloc[:, :5]
-        df.columns=['CONCEPT_ID', 	'CONCEPT_CATEGORY',	'TERM_OR_REGEX','CASE_SENSITIVITY',"REGULAR_EXPRESSION"]
+        # parsed once here, the model reads it from the lexicon cache
+        df = lexicon.read_lexicon(concepts_file)
         
         df = df.dropna(subset=['CONCEPT_ID', 'CONCEPT_CATEGORY']).drop_duplicates()
 
         if df.empty:
-            messagebox.showerror("Error", f"Concepts file ({CNST.RESOURCE_CONCEPTS}) is empty!")
-            self.log_error("Issues with the resources file", f"Concepts file ({CNST.RESOURCE_CONCEPTS}) is empty!")
+            messagebox.showerror("Error", f"Concepts file ({os.path.basename(concepts_file)}) is empty!")
+            self.log_error("Issues with the resources file", f"Concepts file ({os.path.basename(concepts_file)}) is empty!")
             return
 
         self.input_dir = self.input_dir_entry.get().replace('\\', '/')
@@ -576,7 +736,9 @@ class View(tk.Tk):
             return
         
         
-        if self.csv_file_check.get():
+        # A folder of packed corpora is processed from them, whatever files sit next to them
+        has_packs = bool(packed.pack_files(self.input_dir))
+        if not has_packs and self.csv_file_check.get():
             csv_files = [f for f in os.listdir(self.input_dir) if f.endswith('.csv')]
             if not csv_files:
                 messagebox.showerror(
@@ -588,7 +750,7 @@ class View(tk.Tk):
                 self.log_error("There are no CSV file in the given input folder, since you checked the 'Use CSV as input' CSV files must be present in the input folder.",
                             "Please double-check your input path contains the exact CSV or TXT files used for generating the output XLSX.")
                 return
-        else:
+        elif not has_packs:
             txt_files = [f for f in os.listdir(self.input_dir) if f.lower().endswith('.txt')]
             if not txt_files:
                 messagebox.showerror(
@@ -668,27 +830,59 @@ class View(tk.Tk):
                     messagebox.showerror("Error", "Output Folder doesn't contain output files. Please see the debug.log file in the same folder as your Controller.exe of medspacyV for possible cause.")
                     self.log_error("Output Folder doesn't contain output files.","Missing .xlsx ouput files in the output, please provide the output folder with .xlsx output files in it.")
                     return
+                # The run manifest describes every part file, so the part files only need to be streamed without one
+                run_manifest = manifest.load_manifest(self.output_dir, xlsx_files)
                 for file in xlsx_files:
-                    file_path = os.path.normpath(os.path.join(self.output_dir, file))
-                    df = pd.read_excel(file_path)
-                    missing_columns = [col for col in CNST.OUTPUT_HEADERS if col not in df.columns]
+                    if run_manifest:
+                        columns = run_manifest["columns"]
+                        file_doc_ids = set(run_manifest["parts"][file]["doc_ids"])
+                    else:
+                        file_path = os.path.normpath(os.path.join(self.output_dir, file))
+                        columns, file_doc_ids = manifest.read_xlsx_header_and_doc_ids(file_path)
+                    missing_columns = [col for col in CNST.OUTPUT_HEADERS if col not in columns]
                     if len(missing_columns) > 0:
                         messagebox.showerror("Error", "The columns in the output XLSX don't look right, or there is no record in it. Please see the debug.log file in the same folder as your Controller.exe of medspacyV for possible cause.")
                         self.log_error("The columns in the output XLSX don't look right, or there is no record in it.", f"The headers of the output file doesn't match the original columns which are: \n{', '.join(CNST.OUTPUT_HEADERS)}")
                         return
                     
-                    if df["doc_name"].dropna().astype(str).str.strip().empty:
+                    if not file_doc_ids:
                         messagebox.showerror("Error", "The columns in the output XLSX don't look right, or there is no record in it. Please see the debug.log file in the same folder as your Controller.exe of medspacyV for possible cause.")
                         self.log_error("The columns in the output XLSX don't look right, or there is no record in it.","The output file is empty because no matches were found for the given concepts in the input notes. \nPlease review the concepts and input data or verify that you have selected the correct output folder.")
                         return
                         
 
-                    for doc_id in df["doc_name"].astype(str).unique():
-                        output_doc_ids.add(doc_id)
+                    output_doc_ids.update(file_doc_ids)
                     output_file.append(file)
 
-                if self.csv_file_check.get():
-                    if "csv" not in output_file[0].split(".")[0]:
+                if run_manifest:
+                    output_kind = run_manifest["input_kind"]
+                else:
+                    output_kind = output_file[0].split(".")[0]
+
+                pack_paths = packed.pack_files(self.input_dir)
+                if pack_paths:
+                    input_doc_ids = set()
+                    for pack_path in pack_paths:
+                        with packed.PackedCorpus(pack_path) as corpus:
+                            input_doc_ids.update(str(corpus.doc_name(position)) for position in range(len(corpus)))
+                    missing_files = output_doc_ids - input_doc_ids
+
+                    if missing_files:
+                        missing_list = list(missing_files)[:3]
+                        truncated_message = "\n... [truncated at top 3]" if len(missing_files) > 3 else ""
+                        messagebox.showerror(
+                            "Error",
+                            "The input and output files do not correspond correctly to each other. Please see the debug.log file in the same folder as your Controller.exe of medspacyV for possible cause."
+                        )
+                        self.log_error("The input and output files do not correspond correctly to each other.",
+                                    "Mismatch: Some documents of the output are not in the packed corpora of the input folder.\n" +
+                                    f"The following are not present in the input:\n\n" +
+                                    "\n".join(missing_list) + truncated_message +
+                                    "\nPlease double-check your input path contains the packed corpus used for generating the output XLSX.")
+                        return
+
+                elif self.csv_file_check.get():
+                    if "csv" not in output_kind:
                         messagebox.showerror("Error", "The input and output files do not correspond correctly to each other. Please double-check if the 'Use CSV as input' box is correctly (un)checked. \nPlease see the debug.log file in the same folder as your Controller.exe of medspacyV for possible cause.")
                         self.log_error("The input and output files do not correspond correctly to each other.","You have selected 'Use CSV as input', but the specified output folder corresponds to processed .TXT file inputs. \nPlease double-check your input path contains the exact CSV or TXT files used for generating the output XLSX.")
                         return
@@ -704,14 +898,18 @@ class View(tk.Tk):
                                     "\nPlease double-check your input path contains the exact CSV or TXT files used for generating the output XLSX.")
                         return
                     
-                    input_doc_ids = set()
-                    for csv_file in csv_files:
-                        input_csv_path = os.path.normpath(os.path.join(self.input_dir, csv_file))
-                        input_df = pd.read_csv(input_csv_path, usecols=["doc_name"])
-                        for doc_id in input_df["doc_name"].astype(str).unique():
-                            input_doc_ids.add(doc_id)
-
-                    missing_files = output_doc_ids - input_doc_ids
+                    # Unchanged input CSVs are the ones the output was produced from, so there is nothing to cross-check
+                    if run_manifest and manifest.input_files_unchanged(run_manifest, self.input_dir, ".csv"):
+                        missing_files = set()
+                    else:
+                        input_doc_ids = set()
+                        for csv_file in csv_files:
+                            input_csv_path = os.path.normpath(os.path.join(self.input_dir, csv_file))
+                            input_df = pd.read_csv(input_csv_path, usecols=["doc_name"])
+                            for doc_id in input_df["doc_name"].astype(str).unique():
+                                input_doc_ids.add(doc_id)
+
+                        missing_files = output_doc_ids - input_doc_ids
 
                     if missing_files:
                         missing_list = list(missing_files)[:3]
@@ -728,7 +926,7 @@ class View(tk.Tk):
                         return
                     
                 else:
-                    if "text" not in output_file[0].split(".")[0]:
+                    if "text" not in output_kind:
                         messagebox.showerror("Error", "The input and output files do not correspond correctly to each other. 'Use CSV as input' box is correctly (un)checked. \nPlease see the debug.log file in the same folder as your Controller.exe of medspacyV for possible cause.")
                         self.log_error("The input and output files do not correspond correctly to each other.",
                                     "You have not selected 'Use CSV as input' to process the .TXT files, but the specified output folder corresponds to processed .CSV file inputs." +
@@ -771,7 +969,8 @@ class View(tk.Tk):
                     messagebox.showerror("Error", "Please select an output directory first.")
                     return
 
-                if self.csv_file_check.get():
+                has_packs = bool(packed.pack_files(self.input_dir))
+                if not has_packs and self.csv_file_check.get():
                     csv_files = [f for f in os.listdir(self.input_dir) if f.endswith('.csv')]
                     if not csv_files:
                         messagebox.showerror(
@@ -783,7 +982,7 @@ class View(tk.Tk):
                         self.log_error("There are no CSV file in the given input folder, since you checked the 'Use CSV as input' CSV files must be present in the input folder.",
                                     "Please double-check your input path contains the exact CSV or TXT files used for generating the output XLSX.")
                         return
-                else:
+                elif not has_packs:
                     txt_files = [f for f in os.listdir(self.input_dir) if f.lower().endswith('.txt')]
                     if not txt_files:
                         messagebox.showerror(